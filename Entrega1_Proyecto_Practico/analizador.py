@@ -7,6 +7,7 @@
 #   (Desde la raíz del repo Proyecto-de-TLP)
 #       python Entrega1_Proyecto_Practico\analizador.py Entrega1_Proyecto_Practico\Snake.brik
 #       python Entrega1_Proyecto_Practico\analizador.py Entrega1_Proyecto_Practico\Tetris.brik
+#   --compacto: usa el AST en arenas (CompactAST); la salida es la misma
 # Genera: Snake.ast / Snake.json   Tetris.ast / Tetris.json
 # Si 'python' falla usa: py analizador.py Snake.brik
 # Autor: [Andres Rosero Toledo, Chris Ordoñez Alvarado, Edna Pamplona López]
@@ -18,6 +19,7 @@ import sys
 import os
 import json
 import io
+from array import array
 
 # Compatibilidad entre Py2 y Py3 para unicode
 if sys.version_info[0] >= 3:
@@ -43,6 +45,9 @@ TOKEN_SPECIFICATION = [
 
 TOKEN_REGEX = '|'.join('(?P<%s>%s)' % pair for pair in TOKEN_SPECIFICATION)
 
+# Directiva de inclusión: incluir('ruta.brik'). (ruta relativa al archivo que la contiene)
+INCLUDE_PREDICATE = 'incluir'
+
 class Token:
     def __init__(self, type_, value, line, column):
         self.type = type_
@@ -91,12 +96,123 @@ class ASTNode:
             return {'predicado': pred, 'args': args}
         if self.type in ('Numero', 'Cadena', 'ID'):
             return self.value
+        if self.type == 'Incluir':
+            return {'incluir': self.value}
         if self.type == 'Lista':
             return [c.to_dict() for c in self.children]
         if self.type == 'Programa':
             return [c.to_dict() for c in self.children]
         return {'type': self.type, 'value': self.value}
 
+# -----------------------------
+# AST compacto: arenas planas
+# -----------------------------
+# Códigos de tipo de nodo (CompactAST.kinds)
+KIND_NAMES = ('Programa', 'Hecho', 'Incluir', 'Lista', 'ID', 'Numero', 'Cadena')
+KIND_CODES = dict((nombre, i) for i, nombre in enumerate(KIND_NAMES))
+
+class CompactAST:
+    # Todos los nodos en arrays paralelos: tipo, índice del valor en la tabla de
+    # cadenas internadas (-1 sin valor) y rango [first, first+count) de sus hijos
+    # en child_ids. Un nodo es solo un entero; CompactNode da la API de ASTNode.
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = array('i')
+        self.first = array('i')
+        self.count = array('i')
+        self.child_ids = array('i')
+        self.strings = []
+        self._interned = {}
+        self.root = -1
+
+    def intern(self, texto):
+        i = self._interned.get(texto)
+        if i is None:
+            i = self._interned[texto] = len(self.strings)
+            self.strings.append(texto)
+        return i
+
+    def add(self, kind, children=(), value=None):
+        # Los hijos ya existen (el parser construye de abajo arriba): quedan contiguos
+        self.kinds.append(kind)
+        self.values.append(-1 if value is None else self.intern(value))
+        self.first.append(len(self.child_ids))
+        self.count.append(len(children))
+        self.child_ids.extend(children)
+        return len(self.kinds) - 1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def node(self, i):
+        return CompactNode(self, i)
+
+    def type_of(self, i):
+        return KIND_NAMES[self.kinds[i]]
+
+    def value_of(self, i):
+        v = self.values[i]
+        return None if v < 0 else self.strings[v]
+
+    def children_of(self, i):
+        inicio = self.first[i]
+        return self.child_ids[inicio:inicio + self.count[i]]
+
+    def to_dict(self, i):
+        # Mismo resultado que ASTNode.to_dict sin crear nodos intermedios
+        kind = KIND_NAMES[self.kinds[i]]
+        if kind == 'Hecho':
+            hijos = self.children_of(i)
+            return {'predicado': self.value_of(hijos[0]), 'args': [self.to_dict(c) for c in hijos[1:]]}
+        if kind in ('Numero', 'Cadena', 'ID'):
+            return self.value_of(i)
+        if kind == 'Incluir':
+            return {'incluir': self.value_of(i)}
+        if kind in ('Lista', 'Programa'):
+            return [self.to_dict(c) for c in self.children_of(i)]
+        return {'type': kind, 'value': self.value_of(i)}
+
+class CompactNode:
+    # Vista ligera (arena, índice) con la misma interfaz de lectura que ASTNode
+    __slots__ = ('ast', 'id')
+
+    def __init__(self, ast, id_):
+        self.ast = ast
+        self.id = id_
+
+    @property
+    def type(self):
+        return KIND_NAMES[self.ast.kinds[self.id]]
+
+    @property
+    def value(self):
+        return self.ast.value_of(self.id)
+
+    @property
+    def children(self):
+        ast = self.ast
+        return [CompactNode(ast, c) for c in ast.children_of(self.id)]
+
+    def __eq__(self, other):
+        return isinstance(other, CompactNode) and other.ast is self.ast and other.id == self.id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self.ast), self.id))
+
+    def __repr__(self, level=0):
+        indent = '  ' * level
+        value = self.value
+        s = "{0}{1}: {2}\n".format(indent, self.type, value if value else '')
+        for child in self.children:
+            s += child.__repr__(level+1)
+        return s
+
+    def to_dict(self):
+        return self.ast.to_dict(self.id)
+
 def _convert_atom(v):
     if isinstance(v, str):
         if len(v) >= 2 and v.startswith("'") and v.endswith("'"):
@@ -154,6 +270,10 @@ class Parser:
         self.tokens = tokens
         self.pos = 0
 
+    def node(self, type_, children=None, value=None):
+        # Único punto de creación de nodos (CompactParser lo redefine)
+        return ASTNode(type_, children, value)
+
     # Utilidades básicas
     def current(self):
         if self.pos < len(self.tokens):
@@ -178,24 +298,30 @@ class Parser:
         return None
 
     # Gramática:
-    # Programa -> Hecho*
+    # Programa -> (Hecho | Incluir)*
     def parse(self):
         hechos = []
         while self.current().type not in ('EOF',):
             hechos.append(self.parse_hecho())
-        return ASTNode('Programa', hechos)
+        return self.node('Programa', hechos)
 
     # Hecho -> ID '(' ArgList? ')' '.'
+    # Incluir -> 'incluir' '(' STRING ')' '.'
     def parse_hecho(self):
         pred_tok = self.expect('ID')
         self.expect('LPAREN')
+        if pred_tok.value == INCLUDE_PREDICATE:
+            ruta = self.expect('STRING')
+            self.expect('RPAREN')
+            self.expect('DOT')
+            return self.node('Incluir', value=ruta.value[1:-1])
         args = []
         if self.current().type != 'RPAREN':
             args = self.parse_arg_list()
         self.expect('RPAREN')
         self.expect('DOT')
         # Nodo Hecho: primer hijo el predicado como ID, luego argumentos
-        return ASTNode('Hecho', [ASTNode('ID', value=pred_tok.value)] + args)
+        return self.node('Hecho', [self.node('ID', value=pred_tok.value)] + args)
 
     # ArgList -> Elemento (',' Elemento)*
     def parse_arg_list(self):
@@ -220,30 +346,137 @@ class Parser:
             while self.match('COMMA'):
                 items.append(self.parse_elemento())
         self.expect('RBRACKET')
-        return ASTNode('Lista', items)
+        return self.node('Lista', items)
 
     # Atom -> NUMBER | STRING | ID
     def parse_atom(self):
         tok = self.current()
         if tok.type == 'NUMBER':
             self.advance()
-            return ASTNode('Numero', value=tok.value)
+            return self.node('Numero', value=tok.value)
         if tok.type == 'STRING':
             self.advance()
-            return ASTNode('Cadena', value=tok.value)
+            return self.node('Cadena', value=tok.value)
         if tok.type == 'ID':
             self.advance()
-            return ASTNode('ID', value=tok.value)
+            return self.node('ID', value=tok.value)
         raise SyntaxError("Token inesperado {0} en línea {1}, col {2}".format(tok.type, tok.line, tok.column))
 
-__all__ = ['Token', 'lexer', 'ASTNode', 'Parser', 'build_symbol_tables', 'parse_code']
+class CompactParser(Parser):
+    # Misma gramática y errores; los nodos son índices en un CompactAST
+    def __init__(self, tokens):
+        Parser.__init__(self, tokens)
+        self.arena = CompactAST()
+
+    def node(self, type_, children=None, value=None):
+        return self.arena.add(KIND_CODES[type_], children or (), value)
+
+    def parse(self):
+        self.arena.root = Parser.parse(self)
+        return self.arena.node(self.arena.root)
+
+# -----------------------------
+# Compilador de hechos en una pasada (sin AST)
+# -----------------------------
+_EOF = ('EOF', '', -1, -1)
+
+def _scan(code):
+    # Mismos tokens que lexer() como tuplas (tipo, valor, línea, columna), bajo demanda
+    line_num = 1
+    line_start = 0
+    for mo in re.finditer(TOKEN_REGEX, code):
+        kind = mo.lastgroup
+        if kind == 'WS':
+            value = mo.group()
+            if '\n' in value:
+                line_num += value.count('\n')
+                line_start = mo.end()
+            continue
+        if kind == 'COMMENT':
+            continue
+        yield kind, mo.group(), line_num, mo.start() - line_start
+
+class FactCompiler:
+    # Misma gramática y mismos SyntaxError que Parser, pero cada token se convierte
+    # al valor final en cuanto se lee: predicado -> [[args]] e inclusiones, sin nodos
+    def __init__(self, code):
+        self._tokens = _scan(code)
+        self.tok = None
+        self._advance()
 
-def parse_code(code):
-    """Conveniencia: devuelve AST directamente desde el texto."""
+    def _advance(self):
+        self.tok = next(self._tokens, _EOF)
+
+    def _expect(self, type_):
+        tok = self.tok
+        if tok[0] != type_:
+            raise SyntaxError("Se esperaba {0} y se encontró {1} en línea {2}, col {3}".format(type_, tok[0], tok[2], tok[3]))
+        self._advance()
+        return tok[1]
+
+    def compile(self):
+        facts = {}
+        incluidos = []
+        while self.tok[0] != 'EOF':
+            pred = self._expect('ID')
+            self._expect('LPAREN')
+            if pred == INCLUDE_PREDICATE:
+                ruta = self._expect('STRING')
+                self._expect('RPAREN')
+                self._expect('DOT')
+                incluidos.append(ruta[1:-1])
+                continue
+            args = []
+            if self.tok[0] != 'RPAREN':
+                args.append(self._elemento())
+                while self.tok[0] == 'COMMA':
+                    self._advance()
+                    args.append(self._elemento())
+            self._expect('RPAREN')
+            self._expect('DOT')
+            facts.setdefault(pred, []).append(args)
+        return facts, incluidos
+
+    def _elemento(self):
+        kind, value, line, column = self.tok
+        if kind == 'LBRACKET':
+            self._advance()
+            items = []
+            if self.tok[0] != 'RBRACKET':
+                items.append(self._elemento())
+                while self.tok[0] == 'COMMA':
+                    self._advance()
+                    items.append(self._elemento())
+            self._expect('RBRACKET')
+            return items
+        if kind == 'NUMBER':
+            self._advance()
+            return float(value) if '.' in value else int(value)
+        if kind == 'STRING':
+            self._advance()
+            return value[1:-1]
+        if kind == 'ID':
+            self._advance()
+            return value
+        raise SyntaxError("Token inesperado {0} en línea {1}, col {2}".format(kind, line, column))
+
+def compile_facts(code):
+    """Hechos (predicado -> lista de argumentos ya convertidos) y rutas de incluir(...), sin AST."""
+    return FactCompiler(code).compile()
+
+__all__ = ['Token', 'lexer', 'ASTNode', 'Parser', 'CompactAST', 'CompactNode', 'CompactParser',
+           'FactCompiler', 'build_symbol_tables', 'parse_code', 'compile_facts', 'includes']
+
+def parse_code(code, compact=False):
+    """Conveniencia: devuelve AST directamente desde el texto (compact=True -> CompactNode raíz)."""
     tokens = lexer(code)
-    parser = Parser(tokens)
+    parser = CompactParser(tokens) if compact else Parser(tokens)
     return parser.parse()
 
+def includes(ast):
+    """Rutas de las directivas incluir(...) del programa, en orden."""
+    return [n.value for n in ast.children if n.type == 'Incluir']
+
 def write_outputs(ast, raw, nested, src_path):
     base = os.path.splitext(os.path.basename(src_path))[0]
     out_dir = os.path.dirname(os.path.abspath(src_path))
@@ -279,13 +512,15 @@ def main():
     if not tokens:
         print('Archivo vacío o sin tokens válidos.')
         return
-    parser = Parser(tokens)
+    parser = CompactParser(tokens) if '--compacto' in sys.argv else Parser(tokens)
     try:
         ast = parser.parse()
     except Exception as e:
         print('Error de sintaxis:', e)
         return
     raw, nested = build_symbol_tables(ast)
+    for ruta in includes(ast):
+        print('Incluye: {0} (sus hechos no se copian en la salida)'.format(ruta))
     if not raw:
         print('Advertencia: no se reconocieron hechos. ¿Faltan puntos finales "."?')
     write_outputs(ast, raw, nested, archivo)
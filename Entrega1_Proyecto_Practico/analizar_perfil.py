@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Lista las funciones más costosas de un perfil guardado con PROFILE_KEY (F3) en motor.py
+# Uso:
+#   (Dentro de la carpeta Entrega1_Proyecto_Practico)
+#       python analizar_perfil.py perfiles/perfil_Tetris_f120-840.pstats
+#       python analizar_perfil.py perfiles/perfil_Tetris_f120-840.pstats 30 cumulative
+# El orden puede ser tottime (tiempo propio, por defecto), cumulative o ncalls.
+import sys
+import os
+import io
+import json
+import pstats
+
+def top_funciones(path, n=20, orden='tottime'):
+    stats = pstats.Stats(path)
+    stats.sort_stats(orden)
+    filas = []
+    for func in stats.fcn_list[:n]:
+        _cc, llamadas, propio, acumulado, _callers = stats.stats[func]
+        archivo, linea, nombre = func
+        filas.append({
+            'funcion': '{0}:{1}({2})'.format(os.path.basename(archivo), linea, nombre) if linea else nombre,
+            'llamadas': llamadas,
+            'propio_ms': 1000.0 * propio,
+            'acumulado_ms': 1000.0 * acumulado,
+        })
+    return filas
+
+def resumen_frames(path):
+    # .json que FrameProfiler guarda junto al .pstats (None si no existe)
+    ruta = os.path.splitext(path)[0] + '.json'
+    if not os.path.exists(ruta):
+        return None
+    with io.open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    if len(sys.argv) < 2:
+        print('Uso: python analizar_perfil.py ARCHIVO.pstats [n] [orden]')
+        return
+    path = sys.argv[1]
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    orden = sys.argv[3] if len(sys.argv) > 3 else 'tottime'
+    resumen = resumen_frames(path)
+    if resumen:
+        ur = resumen.get('update_render', {})
+        print("{0}: frames {1}-{2}, update+render media {3:.2f} ms, p95 {4:.2f} ms, max {5:.2f} ms".format(
+            resumen['juego'], resumen['frames'][0], resumen['frames'][1],
+            ur.get('media_ms', 0.0), ur.get('p95_ms', 0.0), ur.get('max_ms', 0.0)))
+    print("{0:>10} {1:>12} {2:>12}  {3}".format('llamadas', 'propio ms', 'acum. ms', 'funcion'))
+    for fila in top_funciones(path, n, orden):
+        print("{0:>10} {1:>12.2f} {2:>12.2f}  {3}".format(
+            fila['llamadas'], fila['propio_ms'], fila['acumulado_ms'], fila['funcion']))
+
+if __name__ == '__main__':
+    main()
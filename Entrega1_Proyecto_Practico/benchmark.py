@@ -0,0 +1,588 @@
+# -*- coding: utf-8 -*-
+# Benchmarks sin ventana para el motor de juegos .brik
+# Uso:
+#   (Dentro de la carpeta Entrega1_Proyecto_Practico)
+#       python benchmark.py                 -> ejecuta todos los escenarios
+#       python benchmark.py gravedad        -> solo el escenario indicado
+# No necesita Tk visible: los juegos se construyen y actualizan sin Renderer.
+import sys
+import os
+import io
+import time
+import random
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+if BENCH_DIR not in sys.path:
+    sys.path.insert(0, BENCH_DIR)
+
+import motor
+
+TETRIS_BRIK = os.path.join(BENCH_DIR, 'Tetris.brik')
+SNAKE_BRIK = os.path.join(BENCH_DIR, 'Snake.brik')
+
+# ---------- Utilidades ----------
+def _datos_con_dimensiones(data, w, h):
+    # Copia superficial de los hechos cambiando solo tablero(dimensiones, ...)
+    copia = dict(data)
+    copia['tablero'] = [['dimensiones', [w, h]]]
+    return copia
+
+def _resumen(tiempos):
+    tiempos = sorted(tiempos)
+    return {
+        'media_ms': 1000.0 * sum(tiempos) / len(tiempos),
+        'mediana_ms': 1000.0 * tiempos[len(tiempos)//2],
+        'max_ms': 1000.0 * tiempos[-1],
+    }
+
+def _imprimir(titulo, fila):
+    print("{0:<48} media {1:8.3f} ms  mediana {2:8.3f} ms  max {3:8.3f} ms".format(
+        titulo, fila['media_ms'], fila['mediana_ms'], fila['max_ms']))
+
+# ---------- Escenario: gravedad tras bomba ----------
+def _settle_gravity_barrido(game, columns=None):
+    # Implementación anterior (barridos completos hasta que nada se mueve), solo como referencia
+    moved = True
+    while moved:
+        moved = False
+        for y in range(game.grid_h-2, -1, -1):
+            for x in range(game.grid_w):
+                if game.board[y][x] is not None and game.board[y+1][x] is None:
+                    game.board[y+1][x] = game.board[y][x]
+                    game.board[y][x] = None
+                    moved = True
+
+def _tablero_con_huecos(game, rng, densidad=0.55):
+    # Rellena el 75% inferior con celdas dispersas (sin filas completas)
+    tope = game.grid_h // 4
+    for y in range(tope, game.grid_h):
+        fila = [(1, (120, 120, 120)) if rng.random() < densidad else None for _ in range(game.grid_w)]
+        fila[rng.randrange(game.grid_w)] = None
+        game.board[y] = fila
+    game._rebuild_skyline()
+
+def _preparar_bomba(game, rng):
+    _tablero_con_huecos(game, rng)
+    x = rng.randrange(game.grid_w)
+    y = game.grid_h // 4 - 1
+    game.current = {'name': 'bomba', 'color': (220, 40, 40), 'rots': [[[1]]], 'rot': 0, 'x': x, 'y': y}
+    game.bomba_radio = max(game.bomba_radio, 2)
+
+def bench_gravedad(repeticiones=200):
+    data = motor.BrikLoader.load(TETRIS_BRIK)
+    for (w, h) in [(10, 20), (10, 40), (20, 40), (40, 80)]:
+        for etiqueta, legado in (('barrido', True), ('columnas', False)):
+            rng = random.Random(1234)
+            game = motor.GameFactory.create(_datos_con_dimensiones(data, w, h), seed=1234)
+            if legado:
+                game._settle_gravity = lambda columns=None, g=game: _settle_gravity_barrido(g, columns)
+            tiempos = []
+            for _ in range(repeticiones):
+                game.game_over = False
+                _preparar_bomba(game, rng)
+                t0 = time.perf_counter()
+                game.lock_piece()
+                tiempos.append(time.perf_counter() - t0)
+            _imprimir("lock bomba {0}x{1} ({2})".format(w, h, etiqueta), _resumen(tiempos))
+
+# ---------- Escenario: fila de aterrizaje (caída instantánea / pieza fantasma) ----------
+def bench_aterrizaje(repeticiones=2000):
+    data = motor.BrikLoader.load(TETRIS_BRIK)
+    for (w, h) in [(10, 20), (10, 40), (40, 80)]:
+        rng = random.Random(99)
+        game = motor.GameFactory.create(_datos_con_dimensiones(data, w, h), seed=99)
+        _tablero_con_huecos(game, rng)
+        game.current['y'] = 0
+        for etiqueta, fn in (('paso a paso', game._landing_row_stepwise), ('skyline', game.landing_row)):
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                fn()
+                tiempos.append(time.perf_counter() - t0)
+            _imprimir("aterrizaje {0}x{1} ({2})".format(w, h, etiqueta), _resumen(tiempos))
+
+# ---------- Escenario: IA de colocación sin ventana ----------
+def bench_ia(piezas=300):
+    import ia_tetris
+    base = motor.BrikLoader.load(TETRIS_BRIK)
+    # Sin victoria por nivel para que la partida no termine por puntuación
+    base = dict(base)
+    base['regla'] = [r for r in base.get('regla', []) if r[0] != 'victoria']
+    # En 10x20 la búsqueda queda bajo ia_tetris.TRABAJO_MIN_PARALELO y el pool
+    # no se usa; el tablero ancho sí supera el umbral.
+    for (w, h, n) in [(10, 20, piezas), (60, 40, max(1, piezas // 10))]:
+        data = base if (w, h) == (10, 20) else _datos_con_dimensiones(base, w, h)
+        for workers in (0, 2, 4):
+            game = motor.GameFactory.create(data, seed=7)
+            bot = ia_tetris.TetrisBot(game, workers=workers)
+            t0 = time.perf_counter()
+            while not game.game_over and bot.piezas < n:
+                bot.play_piece()
+            total = time.perf_counter() - t0
+            bot.close()
+            _imprimir("ia {0}x{1} workers={2} ({3} piezas, {4:.0f} piezas/s)".format(
+                w, h, workers, bot.piezas, bot.piezas / max(total, 1e-9)), _resumen([t / 1000.0 for t in bot.search_times_ms]))
+
+# ---------- Escenario: reinicio desde plantilla ----------
+def _datos_con_reglas_extra(data, n):
+    # Simula un .brik grande: n reglas adicionales que el motor no usa
+    copia = dict(data)
+    copia['regla'] = list(data.get('regla', [])) + [['relleno_{0}'.format(i), 'valor', i] for i in range(n)]
+    return copia
+
+def bench_reinicio(repeticiones=300):
+    for brik in (SNAKE_BRIK, TETRIS_BRIK):
+        base = motor.BrikLoader.load(brik)
+        for extra in (0, 1000, 10000):
+            data = _datos_con_reglas_extra(base, extra)
+            template = motor.GameFactory.build_template(data)
+            for etiqueta, fn in (('constructor', lambda: motor.GameFactory.create(data, 1)),
+                                 ('plantilla', lambda: motor.GameFactory.create(data, 1, template))):
+                tiempos = []
+                for _ in range(repeticiones if extra < 10000 else repeticiones // 10):
+                    t0 = time.perf_counter()
+                    fn()
+                    tiempos.append(time.perf_counter() - t0)
+                _imprimir("reinicio {0} +{1} reglas ({2})".format(os.path.basename(brik), extra, etiqueta), _resumen(tiempos))
+
+# ---------- Escenario: catálogo de juegos al arrancar ----------
+def bench_catalogo(archivos=(10, 50)):
+    import shutil
+    import tempfile
+    import tracemalloc
+    with io.open(TETRIS_BRIK, 'r', encoding='utf-8') as f:
+        codigo = f.read()
+    # Archivos grandes: el mismo Tetris con muchas reglas de relleno al final
+    relleno = ''.join("regla(relleno_{0}, valor, {0}).\n".format(i) for i in range(500))
+    carpeta = tempfile.mkdtemp(prefix='brik_bench_')
+    try:
+        for n in archivos:
+            rutas = []
+            for i in range(n):
+                ruta = os.path.join(carpeta, 'juego_{0}.brik'.format(i))
+                if not os.path.exists(ruta):
+                    with io.open(ruta, 'w', encoding='utf-8') as f:
+                        f.write(codigo + relleno)
+                rutas.append(ruta)
+            for etiqueta, fn in (('carga completa', motor.BrikLoader.load), ('cabeceras', motor.scan_brik_header)):
+                tracemalloc.start()
+                t0 = time.perf_counter()
+                listado = [fn(r) for r in rutas]
+                total = time.perf_counter() - t0
+                actual, _pico = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                del listado
+                print("catalogo {0:>4} archivos {1:<16} {2:9.1f} ms  retenido {3:9.1f} KiB".format(
+                    n, etiqueta, 1000.0 * total, actual / 1024.0))
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+# ---------- Escenario: paquete de niveles con incluir(...) ----------
+def bench_inclusiones(niveles=200):
+    import shutil
+    import tempfile
+    with io.open(TETRIS_BRIK, 'r', encoding='utf-8') as f:
+        codigo = f.read()
+    relleno = ''.join("regla(relleno_{0}, valor, {0}).\n".format(i) for i in range(500))
+    carpeta = tempfile.mkdtemp(prefix='brik_pack_')
+    try:
+        # Paquete copiado: cada nivel repite piezas y reglas; paquete con inclusión: un módulo común
+        with io.open(os.path.join(carpeta, '_comun.brik'), 'w', encoding='utf-8') as f:
+            f.write(codigo + relleno)
+        for i in range(niveles):
+            propio = "juego(nombre, 'Nivel {0}').\nvictoria(puntos, {1}).\n".format(i, 100 * (i + 1))
+            with io.open(os.path.join(carpeta, 'copia_{0}.brik'.format(i)), 'w', encoding='utf-8') as f:
+                f.write(propio + codigo + relleno)
+            with io.open(os.path.join(carpeta, 'nivel_{0}.brik'.format(i)), 'w', encoding='utf-8') as f:
+                f.write(propio + "incluir('_comun.brik').\n")
+        for etiqueta, prefijo in (('copiado', 'copia_'), ('con incluir', 'nivel_')):
+            motor._BRIK_CACHE.clear()
+            t0 = time.perf_counter()
+            for i in range(niveles):
+                motor.BrikLoader.load(os.path.join(carpeta, '{0}{1}.brik'.format(prefijo, i)))
+            total = time.perf_counter() - t0
+            print("inclusiones {0} niveles {1:<12} {2:9.1f} ms  módulos en caché {3}".format(
+                niveles, etiqueta, 1000.0 * total, len(motor._BRIK_CACHE)))
+    finally:
+        motor._BRIK_CACHE.clear()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+# ---------- Escenario: AST de objetos vs AST compacto ----------
+def bench_ast(copias=20, repeticiones=10):
+    import gc
+    import tracemalloc
+    import analizador
+    with io.open(TETRIS_BRIK, 'r', encoding='utf-8') as f:
+        codigo = f.read() * copias
+    for etiqueta, compacto in (('ASTNode', False), ('compacto', True)):
+        gc.collect()
+        objetos = len(gc.get_objects())
+        tracemalloc.start()
+        ast = analizador.parse_code(codigo, compact=compacto)
+        memoria = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        objetos = len(gc.get_objects()) - objetos
+        nodos = len(ast.ast) if compacto else _contar_nodos(ast)
+        tiempos = []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            analizador.build_symbol_tables(analizador.parse_code(codigo, compact=compacto))
+            tiempos.append(time.perf_counter() - t0)
+        _imprimir('ast {0} ({1} nodos) parse+tablas'.format(etiqueta, nodos), _resumen(tiempos))
+        print("ast {0:<10} {1:7.1f} B/nodo  objetos seguidos por el GC +{2}".format(
+            etiqueta, float(memoria) / nodos, objetos))
+        del ast
+
+def bench_hechos(copias=20, repeticiones=10):
+    # Camino de carga de BrikLoader: texto -> {predicado: [[args]]}
+    import analizador
+    with io.open(TETRIS_BRIK, 'r', encoding='utf-8') as f:
+        codigo = f.read() * copias
+    def con_ast(c):
+        facts = {}
+        for hecho in analizador.parse_code(c).children:
+            if hecho.type == 'Hecho':
+                facts.setdefault(hecho.children[0].value, []).append(
+                    [motor.BrikLoader.parse_arg(a) for a in hecho.children[1:]])
+        return facts
+    caminos = (
+        ('AST + parse_arg', con_ast),
+        ('compile_facts (una pasada)', analizador.compile_facts),
+    )
+    for etiqueta, fn in caminos:
+        tiempos = []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            fn(codigo)
+            tiempos.append(time.perf_counter() - t0)
+        _imprimir('hechos {0}'.format(etiqueta), _resumen(tiempos))
+
+def _contar_nodos(nodo):
+    return 1 + sum(_contar_nodos(c) for c in nodo.children)
+
+# ---------- Escenario: despacho de eventos de reglas ----------
+def _disparar_escaneando(game, evento):
+    # Referencia: buscar en regla(...) la acción del evento en cada disparo
+    for r in game.data.get('regla', []):
+        if len(r) >= 3 and r[1] == 'evento' and r[2] == evento:
+            for a in game.data['regla']:
+                if a[0] == r[0] and a[1] == 'accion':
+                    return getattr(game, game.ACTIONS[a[2]])({})
+
+def bench_reglas(repeticiones=2000):
+    base = motor.BrikLoader.load(SNAKE_BRIK)
+    for extra in (0, 1000, 10000):
+        # Relleno delante: el escaneo tiene que recorrerlo en cada evento
+        data = dict(base)
+        data['regla'] = [['relleno_{0}'.format(i), 'valor', i] for i in range(extra)] + list(base.get('regla', []))
+        t0 = time.perf_counter()
+        template = motor.GameFactory.build_template(data)
+        compilar = time.perf_counter() - t0
+        game = motor.GameFactory.create(data, 1, template)
+        for etiqueta, fn in (('escaneo', lambda: _disparar_escaneando(game, 'fruta_comida')),
+                             ('tabla', lambda: game.fire('fruta_comida'))):
+            tiempos = []
+            for _ in range(repeticiones if extra < 10000 else repeticiones // 10):
+                game.game_over = False
+                t0 = time.perf_counter()
+                fn()
+                tiempos.append(time.perf_counter() - t0)
+            _imprimir("evento fruta_comida +{0} reglas ({1})".format(extra, etiqueta), _resumen(tiempos))
+        print("{0:<48} {1:8.3f} ms".format("  compilar tabla +{0} reglas".format(extra), 1000.0 * compilar))
+
+# ---------- Escenario: varios tableros en pantalla (modo versus) ----------
+class _CanvasNulo:
+    # Sustituto de tk.Canvas cuando no hay display: cuenta los ítems creados y las
+    # llamadas al canvas (cada una es un viaje a Tcl con un canvas real)
+    def __init__(self):
+        self.items = 0
+        self.llamadas = 0
+    def _crear(self, *args, **kwargs):
+        self.items += 1
+        self.llamadas += 1
+        return self.items
+    create_rectangle = create_line = create_text = create_oval = create_polygon = _crear
+    def _llamada(self, *args, **kwargs):
+        self.llamadas += 1
+    delete = configure = itemconfigure = tag_lower = _llamada
+
+def _canvas_para_bench():
+    try:
+        root = motor.tk.Tk()
+    except Exception:
+        return None, _CanvasNulo(), 'canvas nulo, sin display'
+    canvas = motor.tk.Canvas(root, width=motor.WINDOW_SIZE[0], height=motor.WINDOW_SIZE[1])
+    canvas.pack()
+    return root, canvas, 'Tk'
+
+def bench_tableros(frames=120):
+    import ia_tetris
+    data = motor.BrikLoader.load(TETRIS_BRIK)
+    data = dict(data)
+    data['regla'] = [r for r in data.get('regla', []) if r[0] != 'victoria']
+    template = motor.GameFactory.build_template(data)
+    root, canvas, tipo = _canvas_para_bench()
+    print("({0})".format(tipo))
+    entrada = motor.InputManager()
+    for n in (1, 2, 4, 8):
+        for etiqueta, clase in (('inmediato', motor.Renderer), ('lotes', motor.BatchRenderer)):
+            renderer = clase(canvas)
+            vistas = motor.split_viewports(renderer, n)
+            partidas = []
+            for i in range(n):
+                game = motor.GameFactory.create(data, 11, template)
+                bot = ia_tetris.TetrisBot(game, piezas_por_segundo=30.0)
+                for _ in range(25):
+                    bot.play_piece()
+                partidas.append((game, bot, vistas[i]))
+            tiempos = []
+            creados = getattr(canvas, 'items', 0)
+            llamadas = getattr(canvas, 'llamadas', 0)
+            items = 0
+            for _ in range(frames):
+                for game, bot, _vista in partidas:
+                    bot.update(1.0 / motor.FPS)
+                    game.update(1.0 / motor.FPS, entrada)
+                # Solo el dibujo: la búsqueda de la IA no entra en la medida
+                t0 = time.perf_counter()
+                renderer.clear()
+                for game, _bot, vista in partidas:
+                    game.render(vista)
+                renderer.flush()
+                if root is not None:
+                    root.update_idletasks()
+                tiempos.append(time.perf_counter() - t0)
+                items += getattr(renderer, 'items_created', 0)
+            if isinstance(canvas, _CanvasNulo) and not items:
+                items = canvas.items - creados
+            detalle = "{0}, {1:.0f} ítems/frame".format(etiqueta, float(items) / frames)
+            if isinstance(canvas, _CanvasNulo):
+                detalle += ", {0:.0f} llamadas/frame".format(float(canvas.llamadas - llamadas) / frames)
+            _imprimir("render {0} tableros ({1})".format(n, detalle), _resumen(tiempos))
+    if root is not None:
+        root.destroy()
+
+# ---------- Escenario: cámara en tableros grandes ----------
+def _serpiente_larga(game, largo):
+    # Serpiente en zigzag por filas desde la cabeza; termina en la última fila
+    cuerpo = []
+    y = game.grid_h // 2
+    x0 = game.snake[0][0]
+    while len(cuerpo) < largo and y < game.grid_h:
+        xs = range(x0, -1, -1) if not cuerpo else (range(game.grid_w) if y % 2 else range(game.grid_w - 1, -1, -1))
+        cuerpo.extend((x, y) for x in xs)
+        y += 1
+    game.snake = cuerpo[:largo]
+    game.cuerpo = set(game.snake)
+    game.dir = (0, -1)
+
+def bench_camara(frames=60):
+    # Coste de render con tableros mayores que la ventana: solo cuenta lo visible
+    root, canvas, tipo = _canvas_para_bench()
+    print("({0})".format(tipo))
+    entrada = motor.InputManager()
+    casos = [(SNAKE_BRIK, lado, None) for lado in (20, 100, 1000)] + \
+            [(SNAKE_BRIK, 1000, largo) for largo in (1000, 100000)] + \
+            [(TETRIS_BRIK, lado, None) for lado in (20, 100, 1000)]
+    for brik, lado, largo in casos:
+        base = motor.BrikLoader.load(brik)
+        data = _datos_con_dimensiones(base, lado, lado)
+        game = motor.GameFactory.create(data, 5)
+        if largo:
+            _serpiente_larga(game, largo)
+        if isinstance(game, motor.TetrisGame):
+            # Tablero medio lleno para que haya celdas que dibujar
+            rng = random.Random(1)
+            for y in range(lado // 2, lado):
+                game.board[y] = [(1, (120, 120, 120)) if rng.random() < 0.6 else None for _ in range(lado)]
+        renderer = motor.BatchRenderer(canvas)
+        tiempos = []
+        items = 0
+        for _ in range(frames):
+            game.update(1.0 / motor.FPS, entrada)
+            t0 = time.perf_counter()
+            renderer.clear()
+            game.render(renderer)
+            renderer.flush()
+            if root is not None:
+                root.update_idletasks()
+            tiempos.append(time.perf_counter() - t0)
+            items += renderer.items_created
+        _imprimir("render {0} {1}x{1}{5} ({2}x{3} visibles, {4:.0f} ítems/frame)".format(
+            os.path.splitext(os.path.basename(brik))[0], lado, game.view_w, game.view_h,
+            float(items) / frames, ' largo {0}'.format(largo) if largo else ''), _resumen(tiempos))
+    if root is not None:
+        root.destroy()
+
+# ---------- Escenario: estadísticas y récords ----------
+def bench_records(filas=1000000, consultas=200):
+    import shutil
+    import tempfile
+    import estadisticas
+    carpeta = tempfile.mkdtemp(prefix='brik_stats_')
+    try:
+        ruta = os.path.join(carpeta, 'stats.sqlite3')
+        con = estadisticas.abrir(ruta)
+        rng = random.Random(3)
+        juegos = ('Snake', 'Tetris', 'Otro')
+        t0 = time.perf_counter()
+        with con:
+            con.executemany(estadisticas.INSERTAR, (
+                (juegos[i % 3], float(i), rng.randrange(100000), 1 + i % 20, 60.0, int(i % 7 == 0),
+                 3600, 2.0, 9.0, 0) for i in range(filas)))
+        print("records {0} filas insertadas en {1:.1f} s".format(filas, time.perf_counter() - t0))
+        tiempos = []
+        for i in range(consultas):
+            t0 = time.perf_counter()
+            estadisticas.top(con, juegos[i % 3], motor.MENU_RECORDS)
+            tiempos.append(time.perf_counter() - t0)
+        _imprimir('top {0} con indice'.format(motor.MENU_RECORDS), _resumen(tiempos))
+        con.close()
+        # Lado del motor: encolar una partida no toca el disco
+        store = estadisticas.StatsStore(ruta)
+        fila = ('Snake', time.time(), 10, 1, 1.0, 0, 60, 2.0, 3.0, 0)
+        tiempos = []
+        for i in range(2000):
+            t0 = time.perf_counter()
+            store.record(fila)
+            tiempos.append(time.perf_counter() - t0)
+        store.close(60.0)
+        _imprimir('record() desde el hilo de juego', _resumen(tiempos))
+        print("records {0} filas en {1} lotes".format(store.escritas, store.lotes))
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+# ---------- Escenario: sprites pre-rasterizados ----------
+class _ImagenNula:
+    # Sustituto de tk.PhotoImage: solo cuenta los put() del rasterizado
+    puts = 0
+    def __init__(self, width, height):
+        pass
+    def put(self, data, to):
+        _ImagenNula.puts += 1
+
+def bench_sprites(frames=600):
+    data = motor.BrikLoader.load(SNAKE_BRIK)
+    for etiqueta, atlas in (('primitivas', None), ('atlas', motor.SpriteAtlas(_ImagenNula))):
+        game = motor.GameFactory.create(data, 7)
+        im = motor.InputManager()
+        canvas = _CanvasNulo()
+        canvas.create_image = canvas._crear
+        renderer = motor.BatchRenderer(canvas, atlas)
+        frutas = ('dorada', 'explosiva', 'ralentizar', 'morada', None)
+        tiempos = []
+        items = 0
+        for f in range(frames):
+            game.update(1.0 / motor.FPS, im)
+            # Recorre todos los tipos de fruta para que cada sprite se use
+            game.fruit_type = frutas[(f // 60) % len(frutas)]
+            t0 = time.perf_counter()
+            renderer.clear()
+            game.render(renderer)
+            renderer.flush()
+            tiempos.append(time.perf_counter() - t0)
+            items += renderer.items_created
+        _imprimir('sprites snake {0} render+flush'.format(etiqueta), _resumen(tiempos))
+        print("sprites {0:<10} {1:6.1f} ítems/frame{2}".format(
+            etiqueta, float(items) / frames,
+            "  ({0} imágenes, {1} put al rasterizar)".format(len(atlas.images), _ImagenNula.puts) if atlas else ''))
+
+# ---------- Escenario: celdas cambiadas vs barrido completo ----------
+def bench_cambios(frames=600):
+    # Estado de celdas por frame como lo necesita espectador.py: barrido completo del
+    # tablero frente a aplicar solo las celdas del ChangeSet del juego
+    import espectador
+    for brik, (w, h) in ((SNAKE_BRIK, (200, 200)), (TETRIS_BRIK, (20, 20)), (TETRIS_BRIK, (100, 100))):
+        data = _datos_con_dimensiones(motor.BrikLoader.load(brik), w, h)
+        nombre = os.path.splitext(os.path.basename(brik))[0]
+        for modo in ('barrido', 'cambios'):
+            game = motor.GameFactory.create(data, 7)
+            im = motor.InputManager()
+            rng = random.Random(3)
+            celdas = espectador.estado_celdas(game)
+            game.take_changes()
+            tiempos = []
+            sucias = 0
+            for f in range(frames):
+                if f % 8 == 0:
+                    for tecla in list(im.keys_down):
+                        im.release(tecla)
+                    im.press(rng.choice(list(game.key_cache.values()) or ['x']) or 'x')
+                if game.game_over:
+                    game.reset(f)
+                game.update(1.0 / motor.FPS, im)
+                im.end_frame()
+                t0 = time.perf_counter()
+                if modo == 'barrido':
+                    celdas = espectador.estado_celdas(game)
+                else:
+                    cambios = game.take_changes()
+                    if cambios.full:
+                        celdas = espectador.estado_celdas(game)
+                    else:
+                        pos_sucias = cambios.dirty_cells(game.grid_w)
+                        sucias += len(pos_sucias)
+                        for pos in pos_sucias:
+                            color = espectador.color_celda(game, pos)
+                            if color is None:
+                                celdas.pop(pos, None)
+                            else:
+                                celdas[pos] = color
+                tiempos.append(time.perf_counter() - t0)
+            _imprimir('{0} {1}x{2} {3}'.format(nombre, w, h, modo), _resumen(tiempos))
+            if modo == 'cambios':
+                print("cambios {0} {1}x{2}: {3:.2f} celdas cambiadas/frame".format(nombre, w, h, float(sucias) / frames))
+        # Lo mismo en el canvas: redibujar todo cada frame frente a las capas de celdas
+        for etiqueta, clase in (('render inmediato', motor.Renderer), ('render capas', motor.BatchRenderer)):
+            game = motor.GameFactory.create(data, 7)
+            im = motor.InputManager()
+            rng = random.Random(3)
+            canvas = _CanvasNulo()
+            renderer = clase(canvas)
+            tiempos = []
+            for f in range(frames):
+                if f % 8 == 0:
+                    for tecla in list(im.keys_down):
+                        im.release(tecla)
+                    im.press(rng.choice(list(game.key_cache.values()) or ['x']) or 'x')
+                if game.game_over:
+                    game.reset(f)
+                game.update(1.0 / motor.FPS, im)
+                im.end_frame()
+                t0 = time.perf_counter()
+                renderer.clear()
+                game.render(renderer)
+                renderer.flush()
+                tiempos.append(time.perf_counter() - t0)
+            _imprimir('{0} {1}x{2} {3} ({4:.0f} llamadas/frame)'.format(
+                nombre, w, h, etiqueta, float(canvas.llamadas) / frames), _resumen(tiempos))
+
+ESCENARIOS = {
+    'gravedad': bench_gravedad,
+    'aterrizaje': bench_aterrizaje,
+    'ia': bench_ia,
+    'reinicio': bench_reinicio,
+    'catalogo': bench_catalogo,
+    'inclusiones': bench_inclusiones,
+    'ast': bench_ast,
+    'hechos': bench_hechos,
+    'reglas': bench_reglas,
+    'tableros': bench_tableros,
+    'camara': bench_camara,
+    'records': bench_records,
+    'sprites': bench_sprites,
+    'cambios': bench_cambios,
+}
+
+def main():
+    nombres = sys.argv[1:] or sorted(ESCENARIOS)
+    for nombre in nombres:
+        fn = ESCENARIOS.get(nombre)
+        if fn is None:
+            print('Escenario desconocido: {0} (disponibles: {1})'.format(nombre, ', '.join(sorted(ESCENARIOS))))
+            continue
+        print('== {0} =='.format(nombre))
+        fn()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+# Servidor de espectadores: transmite por TCP el estado de la partida en curso
+# como líneas JSON con solo lo que cambió en cada frame (celdas y marcadores),
+# más keyframes periódicos para que los clientes nuevos o atrasados se sincronicen.
+# Uso:
+#   (Dentro de la carpeta Entrega1_Proyecto_Practico)
+#       python motor.py --espectadores            -> servidor en el puerto 8765
+#       python espectador.py                      -> cliente con ventana (localhost:8765)
+#       python espectador.py otra-maquina 8765 --sin-ventana  -> solo estadísticas
+# Mensajes (una línea JSON cada uno):
+#   {"t": "k", "f": frame, "juego": ..., "w": .., "h": .., "c": [[x, y, "#rrggbb"], ...], "s": {...}}
+#   {"t": "d", "f": frame, "c": [[x, y, "#rrggbb" | null], ...], "s": {solo marcadores cambiados}}
+import sys
+import json
+import time
+import socket
+import threading
+
+PUERTO = 8765
+# Segundos entre keyframes y mensajes en cola por cliente antes de descartarlos
+KEYFRAME_SEGUNDOS = 2.0
+COLA_CLIENTE = 120
+
+COLORES_FRUTA = {
+    'dorada': (220, 180, 30),
+    'explosiva': (220, 40, 40),
+    'ralentizar': (60, 120, 220),
+    'morada': (128, 0, 128),
+}
+
+def _hex(rgb):
+    return '#%02x%02x%02x' % tuple(rgb)
+
+def estado_celdas(game):
+    # {(x, y): color} de lo que se ve en el tablero
+    celdas = {}
+    if hasattr(game, 'snake'):
+        for i, pos in enumerate(game.snake):
+            celdas[pos] = _hex((120, 220, 120) if i == 0 else (0, 160, 0))
+        if game.fruit is not None:
+            celdas[game.fruit] = _hex(COLORES_FRUTA.get(game.fruit_type, game.base_fruit_color))
+    elif hasattr(game, 'board'):
+        for y, fila in enumerate(game.board):
+            for x, val in enumerate(fila):
+                if val is not None:
+                    celdas[(x, y)] = _hex(val[1] if isinstance(val, tuple) and len(val) == 2 else game.neutral_color)
+        pieza = game.current
+        color = _hex(pieza.get('color') or game.neutral_color)
+        for j, fila in enumerate(pieza['rots'][pieza['rot']]):
+            for i, val in enumerate(fila):
+                if val:
+                    celdas[(pieza['x'] + i, pieza['y'] + j)] = color
+    return celdas
+
+def color_celda(game, pos):
+    # Color de una sola celda (o None si está vacía), igual que en estado_celdas
+    if hasattr(game, 'snake'):
+        if pos == game.snake[0]:
+            return _hex((120, 220, 120))
+        if pos in game.cuerpo:
+            return _hex((0, 160, 0))
+        if pos == game.fruit:
+            return _hex(COLORES_FRUTA.get(game.fruit_type, game.base_fruit_color))
+        return None
+    x, y = pos
+    pieza = game.current
+    if pos in game.piece_cells():
+        return _hex(pieza.get('color') or game.neutral_color)
+    if not (0 <= x < game.grid_w and 0 <= y < game.grid_h):
+        return None
+    val = game.board[y][x]
+    if val is None:
+        return None
+    return _hex(val[1] if isinstance(val, tuple) and len(val) == 2 else game.neutral_color)
+
+def estado_marcadores(game):
+    return {
+        'score': game.score,
+        'level': getattr(game, 'level', None),
+        'lives': getattr(game, 'lives', None),
+        'game_over': game.game_over,
+        'paused': game.paused,
+    }
+
+class SpectatorServer:
+    # Corre su propio bucle asyncio en un hilo aparte del de Tk. publish() se llama
+    # desde _tick: calcula el delta en el hilo de Tk y lo entrega al bucle ya serializado.
+    def __init__(self, host='0.0.0.0', port=PUERTO, keyframe_segundos=KEYFRAME_SEGUNDOS):
+        self.host = host
+        self.port = port
+        self.keyframe_segundos = keyframe_segundos
+        self.clientes = set()
+        self.loop = None
+        self._server = None
+        self._hilo = None
+        self._listo = threading.Event()
+        # Estado del último frame publicado (solo hilo de Tk)
+        self._game = None
+        self._celdas = {}
+        self._marcadores = {}
+        self._ultimo_keyframe = 0.0
+        # Lo activa el hilo asyncio (cliente nuevo o atrasado): el siguiente frame es keyframe
+        self.pedir_keyframe = False
+        self.bytes_enviados = 0
+        self.descartes = 0
+
+    def start(self):
+        self._hilo = threading.Thread(target=self._run, name='espectadores')
+        self._hilo.daemon = True
+        self._hilo.start()
+        self._listo.wait(5.0)
+        return self
+
+    def _run(self):
+        import asyncio
+        loop = self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(
+                asyncio.start_server(self._atender, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as e:
+            print("Espectadores: no se pudo abrir el puerto {0}: {1}".format(self.port, e))
+            self._listo.set()
+            return
+        print("Espectadores: escuchando en {0}:{1}".format(self.host, self.port))
+        self._listo.set()
+        try:
+            loop.run_forever()
+        finally:
+            # Cerrar conexiones pendientes antes de cerrar el bucle
+            pendientes = asyncio.all_tasks(loop)
+            for tarea in pendientes:
+                tarea.cancel()
+            loop.run_until_complete(asyncio.gather(*pendientes, return_exceptions=True))
+            loop.close()
+
+    async def _atender(self, reader, writer):
+        import asyncio
+        cliente = _Cliente(writer, asyncio.Queue(COLA_CLIENTE))
+        self.clientes.add(cliente)
+        self.pedir_keyframe = True
+        try:
+            while True:
+                datos = await cliente.cola.get()
+                writer.write(datos)
+                # Contrapresión: si el cliente no lee, drain() espera y su cola se llena
+                await writer.drain()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clientes.discard(cliente)
+            writer.close()
+
+    def _difundir(self, datos, keyframe):
+        for cliente in list(self.clientes):
+            if cliente.atrasado and not keyframe:
+                continue
+            try:
+                cliente.cola.put_nowait(datos)
+                cliente.atrasado = False
+            except Exception:
+                # Cola llena: se descartan sus deltas hasta el próximo keyframe
+                while not cliente.cola.empty():
+                    cliente.cola.get_nowait()
+                cliente.atrasado = True
+                self.descartes += 1
+                self.pedir_keyframe = True
+
+    def publish(self, game, frame):
+        if self.loop is None or not self.clientes:
+            self._game = None
+            return
+        ahora = time.time()
+        keyframe = (game is not self._game or self.pedir_keyframe or
+                    ahora - self._ultimo_keyframe >= self.keyframe_segundos)
+        cambios = game.take_changes() if game is not None and hasattr(game, 'take_changes') else None
+        if not keyframe and cambios is not None and not cambios.full:
+            self._publicar_cambios(game, frame, cambios)
+            return
+        celdas = estado_celdas(game) if game is not None else {}
+        marcadores = estado_marcadores(game) if game is not None else {}
+        if keyframe:
+            msg = {'t': 'k', 'f': frame, 'c': [[x, y, c] for (x, y), c in celdas.items()], 's': marcadores}
+            if game is not None:
+                msg.update({'juego': type(game).__name__, 'w': game.grid_w, 'h': game.grid_h})
+            self.pedir_keyframe = False
+            self._ultimo_keyframe = ahora
+        else:
+            previas = self._celdas
+            cambios_c = [[x, y, c] for (x, y), c in celdas.items() if previas.get((x, y)) != c]
+            cambios_c.extend([x, y, None] for (x, y) in previas if (x, y) not in celdas)
+            cambios_s = dict((k, v) for k, v in marcadores.items() if self._marcadores.get(k) != v)
+            msg = None
+            if cambios_c or cambios_s:
+                msg = {'t': 'd', 'f': frame, 'c': cambios_c, 's': cambios_s}
+        self._game = game
+        self._celdas = celdas
+        self._marcadores = marcadores
+        self._enviar(msg, keyframe)
+
+    def _publicar_cambios(self, game, frame, cambios):
+        # Delta a partir del ChangeSet del juego: solo se miran las celdas que cambiaron
+        celdas = self._celdas
+        cambios_c = []
+        for pos in cambios.dirty_cells(game.grid_w):
+            color = color_celda(game, pos)
+            if celdas.get(pos) != color:
+                if color is None:
+                    del celdas[pos]
+                else:
+                    celdas[pos] = color
+                cambios_c.append([pos[0], pos[1], color])
+        cambios_s = {}
+        if cambios.stats:
+            marcadores = estado_marcadores(game)
+            cambios_s = dict((k, v) for k, v in marcadores.items() if self._marcadores.get(k) != v)
+            self._marcadores = marcadores
+        if cambios_c or cambios_s:
+            self._enviar({'t': 'd', 'f': frame, 'c': cambios_c, 's': cambios_s}, False)
+
+    def _enviar(self, msg, keyframe):
+        if msg is None:
+            return
+        datos = (json.dumps(msg, separators=(',', ':')) + '\n').encode('utf-8')
+        self.bytes_enviados += len(datos) * len(self.clientes)
+        self.loop.call_soon_threadsafe(self._difundir, datos, keyframe)
+
+    def close(self):
+        if self.loop is None:
+            return
+        loop, self.loop = self.loop, None
+        def _parar():
+            if self._server is not None:
+                self._server.close()
+            loop.stop()
+        loop.call_soon_threadsafe(_parar)
+        if self._hilo is not None:
+            self._hilo.join(2.0)
+
+class _Cliente:
+    def __init__(self, writer, cola):
+        self.writer = writer
+        self.cola = cola
+        self.atrasado = False
+
+# ---------- Cliente mínimo ----------
+class SpectatorClient:
+    # Lee el flujo en un hilo y mantiene el estado reconstruido (celdas + marcadores)
+    def __init__(self, host='127.0.0.1', port=PUERTO):
+        self.sock = socket.create_connection((host, port))
+        self.celdas = {}
+        self.marcadores = {}
+        self.juego = None
+        self.dims = (0, 0)
+        self.frame = -1
+        self.mensajes = 0
+        self.keyframes = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.abierto = True
+        self._hilo = threading.Thread(target=self._leer, name='espectador-cliente')
+        self._hilo.daemon = True
+        self._hilo.start()
+
+    def _leer(self):
+        f = self.sock.makefile('rb')
+        try:
+            for linea in f:
+                self.bytes += len(linea)
+                self.aplicar(json.loads(linea.decode('utf-8')))
+        except (OSError, ValueError):
+            pass
+        self.abierto = False
+
+    def aplicar(self, msg):
+        with self.lock:
+            self.mensajes += 1
+            if msg['t'] == 'k':
+                self.keyframes += 1
+                self.celdas = {}
+                self.marcadores = {}
+                self.juego = msg.get('juego')
+                self.dims = (msg.get('w', 0), msg.get('h', 0))
+            elif self.frame < 0:
+                # Sin keyframe todavía: no hay base sobre la que aplicar el delta
+                return
+            for x, y, c in msg['c']:
+                if c is None:
+                    self.celdas.pop((x, y), None)
+                else:
+                    self.celdas[(x, y)] = c
+            self.marcadores.update(msg['s'])
+            self.frame = msg['f']
+
+    def close(self):
+        self.abierto = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+def ventana_cliente(cliente):
+    if sys.version_info[0] >= 3:
+        import tkinter as tk
+    else:
+        import Tkinter as tk
+    root = tk.Tk()
+    root.title("Espectador")
+    canvas = tk.Canvas(root, width=480, height=520, bg='#1e1e1e')
+    canvas.pack()
+
+    def dibujar():
+        canvas.delete('all')
+        with cliente.lock:
+            w, h = cliente.dims
+            celdas = list(cliente.celdas.items())
+            marcadores = dict(cliente.marcadores)
+            juego = cliente.juego
+        if w and h:
+            cell = max(1, min(460 // w, 460 // h))
+            x0 = (480 - w * cell) // 2
+            canvas.create_rectangle(x0, 10, x0 + w * cell, 10 + h * cell, outline='#b4b4b4')
+            for (x, y), c in celdas:
+                canvas.create_rectangle(x0 + x * cell, 10 + y * cell, x0 + (x + 1) * cell, 10 + (y + 1) * cell,
+                                        fill=c, outline='')
+        texto = "{0}  frame {1}  puntos {2}  nivel {3}".format(
+            juego or 'esperando...', cliente.frame, marcadores.get('score'), marcadores.get('level'))
+        canvas.create_text(10, 500, text=texto, anchor='w', fill='#e6e6e6')
+        if cliente.abierto:
+            root.after(33, dibujar)
+        else:
+            canvas.create_text(240, 260, text="Conexión cerrada", fill='#dc3c3c')
+
+    dibujar()
+    root.mainloop()
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    host = args[0] if args else '127.0.0.1'
+    port = int(args[1]) if len(args) > 1 else PUERTO
+    cliente = SpectatorClient(host, port)
+    if '--sin-ventana' in sys.argv:
+        t0 = time.time()
+        try:
+            while cliente.abierto:
+                time.sleep(1.0)
+                print("frame {0}  mensajes {1} (keyframes {2})  {3:.0f} B/mensaje  {4:.1f} KiB/s".format(
+                    cliente.frame, cliente.mensajes, cliente.keyframes,
+                    float(cliente.bytes) / max(1, cliente.mensajes), cliente.bytes / 1024.0 / (time.time() - t0)))
+        except KeyboardInterrupt:
+            pass
+    else:
+        ventana_cliente(cliente)
+    cliente.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Estadísticas persistentes: resultado de cada partida (puntos, nivel, duración)
+# y tiempos de frame agregados, guardados en SQLite desde un hilo aparte.
+# El motor solo encola tuplas en memoria; el hilo escribe por lotes en una
+# transacción y mantiene en caché la tabla de récords que muestra el menú.
+# Uso:
+#   (Dentro de la carpeta Entrega1_Proyecto_Practico)
+#       python estadisticas.py                 -> récords de todos los juegos
+#       python estadisticas.py Tetris 20       -> los 20 mejores de Tetris
+import sys
+import time
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+DB_PATH = 'estadisticas.sqlite3'
+# Filas por transacción y segundos máximos que una partida espera en la cola
+LOTE = 64
+INTERVALO_ESCRITURA = 2.0
+TOP_N = 5
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sesiones (
+    id INTEGER PRIMARY KEY,
+    juego TEXT NOT NULL,
+    fecha REAL NOT NULL,
+    score INTEGER NOT NULL,
+    level INTEGER,
+    duracion REAL NOT NULL,
+    ia INTEGER NOT NULL DEFAULT 0,
+    frames INTEGER NOT NULL,
+    frame_ms_media REAL,
+    frame_ms_max REAL,
+    frames_lentos INTEGER
+);
+CREATE INDEX IF NOT EXISTS sesiones_top ON sesiones (juego, ia, score DESC);
+"""
+
+COLUMNAS = ('juego', 'fecha', 'score', 'level', 'duracion', 'ia',
+            'frames', 'frame_ms_media', 'frame_ms_max', 'frames_lentos')
+
+INSERTAR = "INSERT INTO sesiones ({0}) VALUES ({1})".format(
+    ', '.join(COLUMNAS), ', '.join('?' * len(COLUMNAS)))
+
+# Recorre solo el índice (juego, ia, score DESC): lee n entradas aunque haya millones de filas
+CONSULTA_TOP = ("SELECT score, level, duracion, fecha FROM sesiones "
+                "WHERE juego = ? AND ia = 0 ORDER BY score DESC LIMIT ?")
+
+def abrir(path=DB_PATH):
+    import sqlite3
+    con = sqlite3.connect(path)
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute('PRAGMA synchronous=NORMAL')
+    con.executescript(ESQUEMA)
+    return con
+
+def top(con, juego, n=TOP_N):
+    return con.execute(CONSULTA_TOP, (juego, n)).fetchall()
+
+class SessionStats:
+    # Acumulador de una partida; vive en el hilo de Tk y solo toca memoria
+    def __init__(self, juego, game):
+        self.juego = juego
+        self.game = game
+        self.fecha = time.time()
+        self.duracion = 0.0
+        self.ia = False
+        self.frames = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.lentos = 0
+
+    def frame(self, dt, ms, presupuesto_ms):
+        self.duracion += dt
+        self.frames += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        if ms > presupuesto_ms:
+            self.lentos += 1
+
+    def fila(self):
+        g = self.game
+        return (self.juego, self.fecha, int(g.score), getattr(g, 'level', None), round(self.duracion, 3),
+                int(self.ia), self.frames, round(self.total_ms / max(1, self.frames), 3),
+                round(self.max_ms, 3), self.lentos)
+
+class StatsStore:
+    # Cola de escritura diferida: record() nunca bloquea ni toca el disco
+    def __init__(self, path=DB_PATH, lote=LOTE, intervalo=INTERVALO_ESCRITURA, top_n=TOP_N):
+        self.path = path
+        self.lote = lote
+        self.intervalo = intervalo
+        self.top_n = top_n
+        self.cola = queue.Queue()
+        # Récords por juego, calculados en el hilo tras cada escritura
+        self.records = {}
+        self._pedidos = set()
+        self.escritas = 0
+        self.lotes = 0
+        self.error = None
+        self._hilo = threading.Thread(target=self._run, name='estadisticas')
+        self._hilo.daemon = True
+        self._hilo.start()
+
+    def record(self, fila):
+        self.cola.put(('fila', fila))
+
+    def leaderboard(self, juego):
+        # Lectura desde la caché; la primera vez se pide al hilo y devuelve None
+        if juego not in self.records and juego not in self._pedidos:
+            self._pedidos.add(juego)
+            self.cola.put(('top', juego))
+        return self.records.get(juego)
+
+    def close(self, timeout=5.0):
+        self.cola.put(None)
+        self._hilo.join(timeout)
+
+    def _run(self):
+        try:
+            con = abrir(self.path)
+        except Exception as e:
+            self.error = e
+            print("Estadísticas desactivadas: {0}".format(e))
+            return
+        pendientes = []
+        juegos = set()
+        limite = None
+        seguir = True
+        while seguir:
+            espera = None if limite is None else max(0.0, limite - time.time())
+            try:
+                item = self.cola.get(timeout=espera)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                seguir = False
+            elif item and item[0] == 'fila':
+                pendientes.append(item[1])
+                juegos.add(item[1][0])
+                if limite is None:
+                    limite = time.time() + self.intervalo
+            elif item:
+                juegos.add(item[1])
+            if pendientes and (len(pendientes) >= self.lote or not seguir or time.time() >= limite):
+                try:
+                    with con:
+                        con.executemany(INSERTAR, pendientes)
+                    self.escritas += len(pendientes)
+                    self.lotes += 1
+                except Exception as e:
+                    self.error = e
+                    print("Estadísticas: no se pudieron guardar {0} partidas: {1}".format(len(pendientes), e))
+                pendientes = []
+                limite = None
+            if juegos and not pendientes:
+                for juego in juegos:
+                    self.records[juego] = top(con, juego, self.top_n)
+                juegos = set()
+        con.close()
+
+def main():
+    args = sys.argv[1:]
+    con = abrir()
+    if args:
+        juegos = [args[0]]
+    else:
+        juegos = [r[0] for r in con.execute("SELECT DISTINCT juego FROM sesiones ORDER BY juego")]
+    n = int(args[1]) if len(args) > 1 else 10
+    for juego in juegos:
+        print(juego)
+        for i, (score, level, duracion, fecha) in enumerate(top(con, juego, n)):
+            print("  {0:>2}. {1:>8}  nivel {2:<3} {3:7.1f} s  {4}".format(
+                i + 1, score, level if level is not None else '-', duracion,
+                time.strftime('%Y-%m-%d %H:%M', time.localtime(fecha))))
+    con.close()
+
+if __name__ == '__main__':
+    main()
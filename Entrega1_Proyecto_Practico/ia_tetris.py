@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+# IA de colocación para TetrisGame (modo demo y pruebas de estrés)
+# Busca, para la pieza actual y la siguiente (self.next_piece), todas las
+# combinaciones de rotación y columna, y puntúa el tablero resultante con
+# heurísticas clásicas: altura agregada, líneas, huecos y rugosidad.
+# Los candidatos de la pieza actual se reparten entre un pool de procesos
+# (workers > 1) sólo cuando la búsqueda es lo bastante grande como para pagar
+# la comunicación entre procesos; si no, se evalúan en el mismo hilo.
+# Autor: [Andres Rosero Toledo, Chris Ordoñez Alvarado, Edna Pamplona López]
+import time
+from collections import deque
+
+# Pesos de la heurística (altura, líneas, huecos, rugosidad)
+PESOS_DEFECTO = (-0.510066, 0.760666, -0.35663, -0.184483)
+PENALIZACION_TOPE = -1e9
+# Hojas (colocaciones actual x siguiente) a partir de las que se usa el pool.
+# Cada hoja cuesta ~2 us en línea; por debajo de esto el ida y vuelta al pool
+# (aun con el contexto ya en los workers) cuesta más que la propia búsqueda.
+TRABAJO_MIN_PARALELO = 20000
+
+# ---------- Simulación sobre tablero de bits ----------
+# Cada fila del tablero es un entero: bit x encendido = celda (x, y) ocupada.
+
+def tablero_a_bits(board):
+    filas = []
+    for row in board:
+        m = 0
+        for x, cell in enumerate(row):
+            if cell is not None:
+                m |= 1 << x
+        filas.append(m)
+    return tuple(filas)
+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(v):
+        return bin(v).count('1')
+
+def preparar_rotaciones(rots, grid_w):
+    # Por rotación: (rot, [(j, máscara_fila)], x_min, x_max, celda_bomba, perfil, columnas)
+    # perfil: [(columna, fila más baja ocupada)] como TetrisGame._column_profile
+    # columnas: [(columna, fila más alta ocupada, celdas)] para la evaluación rápida
+    preparadas = []
+    for r, shape in enumerate(rots):
+        filas = []
+        bajos = {}
+        altos = {}
+        cuenta = {}
+        primera = None
+        for j, row in enumerate(shape):
+            m = 0
+            for i, val in enumerate(row):
+                if val:
+                    m |= 1 << i
+                    bajos[i] = j
+                    altos.setdefault(i, j)
+                    cuenta[i] = cuenta.get(i, 0) + 1
+                    if primera is None:
+                        primera = (i, j)
+            if m:
+                filas.append((j, m))
+        if not filas:
+            continue
+        x_min = -min(bajos)
+        x_max = grid_w - 1 - max(bajos)
+        perfil = sorted(bajos.items())
+        columnas = [(i, altos[i], cuenta[i]) for i in sorted(altos)]
+        preparadas.append((r, filas, x_min, x_max, primera, perfil, columnas))
+    return preparadas
+
+def topes(filas, grid_w, grid_h):
+    # Fila más alta ocupada por columna (grid_h si está vacía), como TetrisGame.col_top
+    tops = [grid_h] * grid_w
+    cubierto = 0
+    for y in range(grid_h):
+        nuevos = filas[y] & ~cubierto
+        while nuevos:
+            bajo = nuevos & -nuevos
+            tops[bajo.bit_length() - 1] = y
+            nuevos ^= bajo
+        cubierto |= filas[y]
+    return tops
+
+def _desplazar(m, x):
+    return m << x if x >= 0 else m >> -x
+
+def _choca(filas_tab, grid_h, piezas, y):
+    for j, m in piezas:
+        yy = y + j
+        if yy >= grid_h or filas_tab[yy] & m:
+            return True
+    return False
+
+def _compactar(filas, grid_h, columnas):
+    # Misma gravedad que TetrisGame._settle_gravity, sobre bits
+    for x in columnas:
+        bit = 1 << x
+        n = 0
+        for y in range(grid_h):
+            if filas[y] & bit:
+                n += 1
+                filas[y] &= ~bit
+        for y in range(grid_h - n, grid_h):
+            filas[y] |= bit
+
+def soltar(filas_tab, grid_w, grid_h, rot_info, x, y0, bomba_radio=None, tops=None):
+    # Devuelve (nuevas_filas, lineas) o None si la posición inicial choca.
+    # Con tops (ver topes()) el aterrizaje se calcula en O(ancho de la pieza).
+    _r, filas_pieza, _xmin, _xmax, primera, perfil, _cols = rot_info
+    piezas = [(j, _desplazar(m, x)) for j, m in filas_pieza]
+    y = None
+    if tops is not None:
+        y = grid_h
+        for i, low in perfil:
+            top = tops[x + i]
+            if y0 + low >= top:
+                # Bajo un saliente: no sirve la superficie
+                y = None
+                break
+            if top - 1 - low < y:
+                y = top - 1 - low
+    if y is None:
+        if _choca(filas_tab, grid_h, piezas, y0):
+            return None
+        y = y0
+        while not _choca(filas_tab, grid_h, piezas, y + 1):
+            y += 1
+    filas = list(filas_tab)
+    for j, m in piezas:
+        filas[y + j] |= m
+    if bomba_radio is not None and primera is not None:
+        cx, cy = x + primera[0], y + primera[1]
+        x_lo = max(0, cx - bomba_radio)
+        x_hi = min(grid_w - 1, cx + bomba_radio)
+        borrar = 0
+        for xx in range(x_lo, x_hi + 1):
+            borrar |= 1 << xx
+        for yy in range(max(0, cy - bomba_radio), min(grid_h - 1, cy + bomba_radio) + 1):
+            filas[yy] &= ~borrar
+        _compactar(filas, grid_h, range(x_lo, x_hi + 1))
+    llena = (1 << grid_w) - 1
+    restantes = [f for f in filas if f != llena]
+    lineas = grid_h - len(restantes)
+    if lineas:
+        filas = [0] * lineas + restantes
+        _compactar(filas, grid_h, range(grid_w))
+    return filas, lineas
+
+def evaluar(filas, grid_w, grid_h, lineas, pesos=PESOS_DEFECTO):
+    if filas[0]:
+        return PENALIZACION_TOPE
+    alturas = [0] * grid_w
+    cubierto = 0
+    huecos = 0
+    for y in range(grid_h):
+        f = filas[y]
+        if not f and not cubierto:
+            continue
+        nuevos = f & ~cubierto
+        while nuevos:
+            bajo = nuevos & -nuevos
+            alturas[bajo.bit_length() - 1] = grid_h - y
+            nuevos ^= bajo
+        huecos += _popcount(cubierto & ~f)
+        cubierto |= f
+    rugosidad = 0
+    for x in range(grid_w - 1):
+        rugosidad += abs(alturas[x] - alturas[x + 1])
+    a, b, c, d = pesos
+    return a * sum(alturas) + b * lineas + c * huecos + d * rugosidad
+
+def contar_huecos(filas, grid_h):
+    cubierto = 0
+    huecos = 0
+    for y in range(grid_h):
+        f = filas[y]
+        huecos += _popcount(cubierto & ~f)
+        cubierto |= f
+    return huecos
+
+def _evaluar_hoja(filas, tops, huecos, grid_w, grid_h, rot_info, x, lineas, pesos):
+    # Evaluación de la segunda pieza sin construir el tablero: válida cuando la
+    # pieza cae desde arriba, no completa filas, no es bomba y el tablero no
+    # tiene filas llenas pendientes. Devuelve None si no aplica (el llamador
+    # usa soltar() + evaluar()).
+    _r, filas_pieza, _xmin, _xmax, _primera, perfil, columnas = rot_info
+    y = grid_h
+    for i, low in perfil:
+        top = tops[x + i]
+        if low >= top:
+            return None
+        if top - 1 - low < y:
+            y = top - 1 - low
+    llena = (1 << grid_w) - 1
+    for j, m in filas_pieza:
+        if (filas[y + j] | _desplazar(m, x)) == llena:
+            return None
+    nuevos = list(tops)
+    for i, high, n in columnas:
+        top_pieza = y + high
+        huecos += tops[x + i] - top_pieza - n
+        nuevos[x + i] = top_pieza
+    if y + filas_pieza[0][0] == 0:
+        return PENALIZACION_TOPE
+    suma = 0
+    rugosidad = 0
+    previo = None
+    for t in nuevos:
+        suma += grid_h - t
+        if previo is not None:
+            rugosidad += abs(t - previo)
+        previo = t
+    a, b, c, d = pesos
+    return a * suma + b * lineas + c * huecos + d * rugosidad
+
+def _candidatos(rots_prep):
+    for info in rots_prep:
+        for x in range(info[2], info[3] + 1):
+            yield info, x
+
+def evaluar_lote(args):
+    # Unidad de trabajo del pool: lista de (rot, x) de la pieza actual + contexto.
+    # Devuelve (mejor_puntaje, rot, x) del lote.
+    filas, grid_w, grid_h, y0, lote, actual_prep, siguiente_prep, bomba_actual, bomba_sig, radio, pesos = args
+    llena = (1 << grid_w) - 1
+    por_rot = dict((info[0], info) for info in actual_prep)
+    tops0 = topes(filas, grid_w, grid_h)
+    mejor = (None, None, None)
+    for r, x in lote:
+        res = soltar(filas, grid_w, grid_h, por_rot[r], x, y0, radio if bomba_actual else None, tops0)
+        if res is None:
+            continue
+        filas1, lineas1 = res
+        puntaje = None
+        if siguiente_prep and not filas1[0]:
+            tops1 = topes(filas1, grid_w, grid_h)
+            huecos1 = contar_huecos(filas1, grid_h)
+            # Filas que la gravedad dejó llenas se eliminan en el siguiente bloqueo
+            rapida = not bomba_sig and llena not in filas1
+            for info2, x2 in _candidatos(siguiente_prep):
+                p = None
+                if rapida:
+                    p = _evaluar_hoja(filas1, tops1, huecos1, grid_w, grid_h, info2, x2, lineas1, pesos)
+                if p is None:
+                    res2 = soltar(filas1, grid_w, grid_h, info2, x2, 0, radio if bomba_sig else None, tops1)
+                    if res2 is None:
+                        continue
+                    p = evaluar(res2[0], grid_w, grid_h, lineas1 + res2[1], pesos)
+                if puntaje is None or p > puntaje:
+                    puntaje = p
+        if puntaje is None:
+            puntaje = evaluar(filas1, grid_w, grid_h, lineas1, pesos)
+        if mejor[0] is None or puntaje > mejor[0]:
+            mejor = (puntaje, r, x)
+    return mejor
+
+# ---------- Pool de procesos ----------
+# El contexto que no cambia entre piezas (dimensiones, pesos, radio de bomba y
+# rotaciones preparadas de cada forma) se envía una sola vez por worker en el
+# inicializador; por pieza sólo viajan el tablero en bits y las claves de forma.
+_CONTEXTO = {}
+
+def _iniciar_worker(grid_w, grid_h, radio, pesos, tabla):
+    _CONTEXTO.clear()
+    _CONTEXTO.update(grid_w=grid_w, grid_h=grid_h, radio=radio, pesos=pesos, tabla=tabla)
+
+def _evaluar_lote_worker(args):
+    filas, y0, lote, clave_actual, clave_sig, bomba_actual, bomba_sig = args
+    c = _CONTEXTO
+    tabla = c['tabla']
+    siguiente = tabla[clave_sig] if clave_sig is not None else []
+    return evaluar_lote((filas, c['grid_w'], c['grid_h'], y0, lote, tabla[clave_actual], siguiente,
+                         bomba_actual, bomba_sig, c['radio'], c['pesos']))
+
+# ---------- Bot ----------
+class TetrisBot:
+    def __init__(self, game, workers=0, pesos=PESOS_DEFECTO, piezas_por_segundo=None):
+        self.game = game
+        self.workers = workers
+        self.pesos = pesos
+        # None -> una pieza por frame
+        self.piezas_por_segundo = piezas_por_segundo
+        self.acumulado = 0.0
+        self.piezas = 0
+        self.last_search_ms = 0.0
+        self.search_times_ms = deque(maxlen=1000)
+        self._pool = None
+        # Contexto con el que se creó el pool: si cambia (recarga de reglas) se rehace
+        self._pool_contexto = None
+        self._claves = {}
+        self._prep_cache = {}
+
+    def _preparar(self, rots):
+        # Cache por id(rots); se guarda rots para que el id no se reutilice
+        entry = self._prep_cache.get(id(rots))
+        if entry is None:
+            entry = (rots, preparar_rotaciones(rots, self.game.grid_w))
+            self._prep_cache[id(rots)] = entry
+        return entry[1]
+
+    def _get_pool(self):
+        g = self.game
+        contexto = (g.grid_w, g.grid_h, g.bomba_radio, tuple(self.pesos),
+                    tuple(id(forma[2]) for forma in g.normal_shapes))
+        if self._pool is not None and contexto != self._pool_contexto:
+            # Los workers guardan el contexto del inicializador: con otro radio de
+            # bomba o formas nuevas buscarían con datos viejos
+            self.close()
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            # Clave = índice en normal_shapes (las especiales reutilizan esas rots)
+            tabla = {}
+            self._claves = {}
+            for i, forma in enumerate(g.normal_shapes):
+                self._claves[id(forma[2])] = i
+                tabla[i] = self._preparar(forma[2])
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_iniciar_worker,
+                initargs=(g.grid_w, g.grid_h, g.bomba_radio, self.pesos, tabla))
+            self._pool_contexto = contexto
+        return self._pool
+
+    def _en_pool(self, candidatos, siguiente):
+        if self.workers <= 1 or len(candidatos) <= 1:
+            return False
+        hojas = 0
+        for info in siguiente:
+            hojas += info[3] - info[2] + 1
+        return len(candidatos) * max(1, hojas) >= TRABAJO_MIN_PARALELO
+
+    def choose(self):
+        # Devuelve (rot, x) para la pieza actual, o None si no hay colocación válida
+        g = self.game
+        t0 = time.perf_counter()
+        actual = self._preparar(g.current['rots'])
+        siguiente = self._preparar(g.next_piece['rots']) if g.next_piece else []
+        filas = tablero_a_bits(g.board)
+        candidatos = [(info[0], x) for info, x in _candidatos(actual)]
+        bomba_actual = g.current['name'] == 'bomba'
+        bomba_sig = bool(g.next_piece) and g.next_piece['name'] == 'bomba'
+        resultados = None
+        if self._en_pool(candidatos, siguiente):
+            pool = self._get_pool()
+            clave = self._claves.get(id(g.current['rots']))
+            clave_sig = self._claves.get(id(g.next_piece['rots'])) if g.next_piece else None
+            # Formas fuera de la tabla (p. ej. tras recargar reglas) se buscan en línea
+            if clave is not None and (clave_sig is not None or not g.next_piece):
+                # Lotes contiguos en el orden de los candidatos: al quedarse con el primer
+                # mejor lote, un empate se resuelve por el candidato de menor índice, como
+                # en la búsqueda en línea, sea cual sea el número de workers
+                n = min(self.workers, len(candidatos))
+                tam = -(-len(candidatos) // n)
+                tareas = [(filas, g.current['y'], candidatos[i:i + tam], clave, clave_sig, bomba_actual, bomba_sig)
+                          for i in range(0, len(candidatos), tam)]
+                resultados = list(pool.map(_evaluar_lote_worker, tareas))
+        if resultados is None:
+            contexto = (filas, g.grid_w, g.grid_h, g.current['y'])
+            cola = (actual, siguiente, bomba_actual, bomba_sig, g.bomba_radio, self.pesos)
+            resultados = [evaluar_lote(contexto + (candidatos,) + cola)]
+        mejor = (None, None, None)
+        for res in resultados:
+            if res[0] is not None and (mejor[0] is None or res[0] > mejor[0]):
+                mejor = res
+        self.last_search_ms = 1000.0 * (time.perf_counter() - t0)
+        self.search_times_ms.append(self.last_search_ms)
+        if mejor[0] is None:
+            return None
+        return mejor[1], mejor[2]
+
+    def play_piece(self):
+        g = self.game
+        if g.game_over:
+            return False
+        eleccion = self.choose()
+        if eleccion is not None:
+            rot, x = eleccion
+            if not g.collides(x, g.current['y'], rot):
+                g.current['rot'] = rot
+                g.current['x'] = x
+        g.hard_drop()
+        self.piezas += 1
+        return True
+
+    def update(self, dt):
+        if self.game.game_over or self.game.paused:
+            return
+        if self.piezas_por_segundo is None:
+            self.play_piece()
+            return
+        self.acumulado += dt
+        intervalo = 1.0 / max(0.001, self.piezas_por_segundo)
+        if self.acumulado >= intervalo:
+            self.acumulado -= intervalo
+            self.play_piece()
+
+    def close(self):
+        if self._pool is not None:
+            # Esperar a los workers: sin join quedan procesos vivos en cada reinicio
+            # del versus y errores de descriptores al salir del intérprete
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self._pool_contexto = None
+
+__all__ = ['TetrisBot', 'PESOS_DEFECTO', 'tablero_a_bits', 'preparar_rotaciones', 'topes', 'contar_huecos', 'soltar', 'evaluar', 'evaluar_lote']
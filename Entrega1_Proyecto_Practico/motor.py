@@ -2,15 +2,62 @@
 # Autor: [Andres Rosero Toledo, Chris Ordoñez Alvarado, Edna Pamplona López]
 # Fecha: 2024-12-05
 # Descripción: Motor básico para juegos con Tkinter, incluyendo carga de archivos .brik
+import time
+
+class StartupProfile(object):
+    # Tiempos del arranque para --perfil-arranque. Va antes del resto de imports
+    # para poder medirlos; mark() es del hilo principal, task() también de hilos de carga.
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.marks = [('inicio', self.t0)]
+        self.tasks = []
+        self.open = True
+
+    def mark(self, name):
+        if self.open:
+            self.marks.append((name, time.perf_counter()))
+
+    def has(self, name):
+        return any(m[0] == name for m in self.marks)
+
+    def task(self, name, t0, t1):
+        if self.open:
+            self.tasks.append((name, t0, t1))
+
+    def report(self, modo):
+        fases = []
+        previo = self.t0
+        for nombre, t in self.marks[1:]:
+            fases.append({'fase': nombre, 'ms': 1000.0 * (t - previo), 'desde_inicio_ms': 1000.0 * (t - self.t0)})
+            previo = t
+        tareas = [{'tarea': nombre, 'ms': 1000.0 * (t1 - t0), 'desde_inicio_ms': 1000.0 * (t0 - self.t0)}
+                  for nombre, t0, t1 in self.tasks]
+        return {'modo': modo, 'total_ms': 1000.0 * (previo - self.t0), 'fases': fases, 'tareas': tareas}
+
+STARTUP = StartupProfile()
+
 import sys
 import os
 import io
-import time
+import re
+import json
+import random
+import heapq
+import threading
+import functools
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+STARTUP.mark('import_stdlib')
 # Import Tk/Tkinter según versión para evitar tipos unión en Pylance
 if sys.version_info[0] >= 3:
     import tkinter as tk
+    import queue
 else:
     import Tkinter as tk
+    import Queue as queue
+STARTUP.mark('import_tkinter')
+# Arranque rápido: se decide antes de argparse porque afecta a los imports de este módulo
+FAST_START = __name__ == '__main__' and '--arranque-rapido' in sys.argv
 
 # Inserta ruta para importar el analizador existente
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -21,6 +68,7 @@ try:
     import analizador
 except ImportError:
     analizador = None
+STARTUP.mark('import_analizador')
 
 # Definir _reload sin ambigüedades, dependiente de versión
 if sys.version_info[0] >= 3:
@@ -29,11 +77,38 @@ else:
     _reload = reload  # builtin en Py2
 
 if analizador is not None:
-    _reload(analizador)
+    # Recién importado el reload no aporta nada; en arranque rápido se omite
+    if not FAST_START:
+        _reload(analizador)
+        STARTUP.mark('reload_analizador')
     HAS_PARSER = hasattr(analizador, 'Parser')
 else:
     HAS_PARSER = False
 
+ia_tetris = None
+if not FAST_START:
+    try:
+        import ia_tetris
+    except ImportError:
+        ia_tetris = None
+    STARTUP.mark('import_ia_tetris')
+
+def load_ia_tetris():
+    # La IA solo hace falta al pulsar BOT_KEY o en modo demo
+    global ia_tetris
+    if ia_tetris is None:
+        try:
+            import ia_tetris as modulo
+        except ImportError:
+            return None
+        ia_tetris = modulo
+    return ia_tetris
+
+try:
+    import estadisticas
+except ImportError:
+    estadisticas = None
+
 if sys.version_info[0] >= 3:
     unicode = str
 
@@ -44,36 +119,135 @@ FPS = 60
 BG_COLOR = (30, 30, 30)
 TEXT_COLOR = (230, 230, 230)
 PANEL_WIDTH = 220
+# Máximo de .brik completamente cargados en memoria (además del que está en juego)
+CATALOG_CACHE_SIZE = 4
+# Hilos para leer .brik y construir plantillas fuera del hilo de Tk (0 = en línea)
+LOADER_WORKERS = 2
+# IA de Tetris: tecla para activarla, ritmo visible y procesos del pool (0 = mismo hilo)
+BOT_KEY = 'f2'
+BOT_PIECES_PER_SECOND = 4.0
+BOT_WORKERS = 0
+# Perfilador en partida: tecla para iniciar/parar y carpeta de los .pstats
+PROFILE_KEY = 'f3'
+PROFILE_DIR = os.path.join(ANALYZER_DIR, 'perfiles')
+# Modo versus (solo Tetris): tecla en el menú y tableros en pantalla (el primero es del jugador, el resto IA)
+VERSUS_KEY = 'v'
+VERSUS_BOARDS = 2
+# Puerto por defecto del servidor de espectadores (--espectadores)
+SPECTATOR_PORT = 8765
+# Base SQLite de partidas/récords y cuántos récords muestra el menú
+STATS_DB = 'estadisticas.sqlite3'
+MENU_RECORDS = 3
+# Segundos sin teclas en el menú antes de lanzar el modo demo
+ATTRACT_IDLE_SECONDS = 20.0
+# Capacidad de la cola circular de eventos de teclado (por frame)
+INPUT_QUEUE_SIZE = 256
+# Auto-repetición por defecto (segundos) si el .brik no define control(retardo/intervalo_repeticion)
+DAS_DEFAULT = 0.17
+ARR_DEFAULT = 0.05
+# Modo --hilo-simulacion: ticks de lógica que se recuperan seguidos si el hilo se atrasa
+SIM_CATCHUP_MAX = 5
 
 # ---------- Módulo de Entrada ----------
 class InputManager:
-    def __init__(self, root):
+    def __init__(self, root=None, threaded=False):
+        # root=None -> sin ventana (reproducción/benchmarks); las teclas llegan por press/release
+        # threaded=True -> los eventos de Tk se encolan y se aplican en begin_frame (hilo de simulación)
         self.root = root
         self.keys_down = set()
         self.keys_pressed = set()
         self.keys_released = set()
-        root.bind_all('<KeyPress>', self._on_key_down)
-        root.bind_all('<KeyRelease>', self._on_key_up)
+        self.recorder = None
+        # Cola circular de eventos (perf_counter, '+'/'-', tecla); _head cuenta los escritos
+        self._queue = [None] * INPUT_QUEUE_SIZE
+        self._head = 0
+        self._frame_start = 0
+        self.dropped = 0
+        # Releases de Tk pendientes: el auto-repeat del SO llega como release+press con el mismo event.time
+        self._pending_up = {}
+        self.incoming = queue.Queue() if threaded else None
+        if root is not None and threaded:
+            root.bind_all('<KeyPress>', lambda e: self.incoming.put(('+', e.keysym.lower(), getattr(e, 'time', None))))
+            root.bind_all('<KeyRelease>', lambda e: self.incoming.put(('-', e.keysym.lower(), getattr(e, 'time', None))))
+        elif root is not None:
+            root.bind_all('<KeyPress>', self._on_key_down)
+            root.bind_all('<KeyRelease>', self._on_key_up)
 
     def begin_frame(self):
-        # Eventos se limpian al final del frame
-        pass
+        if self.incoming is not None:
+            while True:
+                try:
+                    kind, key, t = self.incoming.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == '+':
+                    self._key_down(key, t)
+                else:
+                    self._key_up(key, t)
+        # Los releases que no fueron auto-repeat se aplican al empezar el frame
+        if self._pending_up:
+            for key in list(self._pending_up):
+                self.release(key)
+            self._pending_up.clear()
 
     def end_frame(self):
         self.keys_pressed.clear()
         self.keys_released.clear()
+        perdidos = self._head - self._frame_start - INPUT_QUEUE_SIZE
+        if perdidos > 0:
+            self.dropped += perdidos
+        self._frame_start = self._head
 
     def _on_key_down(self, event):
-        key = event.keysym.lower()
+        self._key_down(event.keysym.lower(), getattr(event, 'time', None))
+
+    def _on_key_up(self, event):
+        self._key_up(event.keysym.lower(), getattr(event, 'time', None))
+
+    def _key_down(self, key, t):
+        if key in self._pending_up:
+            if t is not None and self._pending_up[key] == t:
+                # Auto-repeat del SO: la tecla sigue abajo (la repetición la decide KeyRepeater)
+                del self._pending_up[key]
+                return
+            del self._pending_up[key]
+            self.release(key)
+        if key in self.keys_down:
+            return
+        self.press(key)
+
+    def _key_up(self, key, t):
+        if key in self.keys_down:
+            self._pending_up[key] = t
+
+    def _push(self, kind, key):
+        self._queue[self._head % INPUT_QUEUE_SIZE] = (time.perf_counter(), kind, key)
+        self._head += 1
+
+    def press(self, key):
+        if self.recorder:
+            self.recorder.event('+', key)
         if key not in self.keys_down:
             self.keys_pressed.add(key)
         self.keys_down.add(key)
+        self._push('+', key)
 
-    def _on_key_up(self, event):
-        key = event.keysym.lower()
+    def release(self, key):
+        if self.recorder:
+            self.recorder.event('-', key)
         if key in self.keys_down:
             self.keys_down.remove(key)
         self.keys_released.add(key)
+        self._push('-', key)
+
+    def events(self):
+        # Eventos del frame actual en orden de llegada (los más viejos se pierden si desborda)
+        inicio = max(self._frame_start, self._head - INPUT_QUEUE_SIZE)
+        return [self._queue[i % INPUT_QUEUE_SIZE] for i in range(inicio, self._head)]
+
+    def press_count(self, key):
+        # Pulsaciones de key en este frame (varias pulsaciones rápidas no se pierden)
+        return sum(1 for _t, kind, k in self.events() if kind == '+' and k == key)
 
     def is_down(self, key):
         return key in self.keys_down
@@ -84,82 +258,806 @@ class InputManager:
     def was_released(self, key):
         return key in self.keys_released
 
+class KeyRepeater:
+    # DAS/ARR: un paso al pulsar, luego pasos cada 'arr' s tras 'das' s con la tecla abajo.
+    # Avanza con el dt del frame para que las grabaciones se reproduzcan igual.
+    def __init__(self):
+        self.held = {}
+
+    def steps(self, key, input_manager, dt, das, arr, limite):
+        n = input_manager.press_count(key)
+        if not input_manager.is_down(key):
+            self.held.pop(key, None)
+            return n
+        if n or key not in self.held:
+            self.held[key] = 0.0
+            return n
+        antes = self.held[key]
+        ahora = antes + dt
+        self.held[key] = ahora
+        if ahora < das:
+            return 0
+        if arr <= 0:
+            return limite
+        previos = int((antes - das) / arr) + 1 if antes >= das else 0
+        return min(limite, int((ahora - das) / arr) + 1 - previos)
+
+# ---------- Grabación y reproducción de entrada ----------
+# Formato: primera línea JSON con la semilla de la sesión y el orden de los .brik
+# del menú; luego una línea por frame: "dt +tecla -tecla ..." (dt con repr exacto).
+# Los tokens "!marca" indican en qué frame se aplicó un resultado del cargador.
+class InputRecorder:
+    def __init__(self, path, seed, games):
+        self.path = path
+        self.f = io.open(path, 'w', encoding='utf-8')
+        header = {'version': 2, 'seed': seed, 'games': games}
+        self.f.write(unicode(json.dumps(header)) + u'\n')
+        self.pending = []
+        self.frames = 0
+
+    def event(self, kind, key):
+        self.pending.append(kind + key)
+
+    def frame(self, dt):
+        line = repr(dt)
+        if self.pending:
+            line += ' ' + ' '.join(self.pending)
+            self.pending = []
+        self.f.write(unicode(line) + u'\n')
+        self.frames += 1
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+def load_recording(path):
+    # Devuelve (cabecera, [(dt, [eventos])])
+    with io.open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        frames = []
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            frames.append((float(parts[0]), parts[1:]))
+    return header, frames
+
+# ---------- Perfilador en partida ----------
+def frame_time_stats(valores):
+    # media/p50/p95/p99/max de una lista de tiempos en ms
+    if not valores:
+        return {}
+    orden = sorted(valores)
+    def percentil(q):
+        return orden[min(len(orden) - 1, int(q * len(orden)))]
+    return {'frames': len(orden), 'media_ms': sum(orden) / len(orden), 'p50_ms': percentil(0.50),
+            'p95_ms': percentil(0.95), 'p99_ms': percentil(0.99), 'max_ms': orden[-1]}
+
+class FrameProfiler:
+    # cProfile solo alrededor de update/render de la partida; se activa con PROFILE_KEY.
+    # Guarda un .pstats y un .json con el juego, el rango de frames y los tiempos por frame.
+    def __init__(self, game_name, first_frame):
+        import cProfile
+        self.profile = cProfile.Profile()
+        self.game_name = game_name
+        self.first_frame = first_frame
+        self.frame_ms = []
+        self.dt_ms = []
+        self.active = False
+        self._t0 = 0.0
+
+    def begin(self):
+        self.active = True
+        self._t0 = time.perf_counter()
+        self.profile.enable()
+
+    def end(self, dt):
+        self.profile.disable()
+        self.frame_ms.append(1000.0 * (time.perf_counter() - self._t0))
+        self.dt_ms.append(1000.0 * dt)
+        self.active = False
+
+    def save(self, folder, last_frame):
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        nombre = re.sub(r'[^\w.-]+', '_', self.game_name)
+        base = os.path.join(folder, 'perfil_{0}_f{1}-{2}'.format(nombre, self.first_frame, last_frame))
+        self.profile.dump_stats(base + '.pstats')
+        resumen = {
+            'juego': self.game_name,
+            'frames': [self.first_frame, last_frame],
+            'update_render': frame_time_stats(self.frame_ms),
+            'dt': frame_time_stats(self.dt_ms),
+        }
+        with io.open(base + '.json', 'w', encoding='utf-8') as f:
+            f.write(unicode(json.dumps(resumen, indent=2, ensure_ascii=False)))
+        return base + '.pstats', resumen
+
 # ---------- Renderizador / Funciones gráficas ----------
 class Renderer:
-    def __init__(self, canvas):
+    def __init__(self, canvas, atlas=None):
         self.canvas = canvas
+        # SpriteAtlas opcional: draw_sprite coloca una imagen en vez de dibujar las formas
+        self.atlas = atlas
+
+    def _item(self, kind, coords, opts, static=False):
+        # Todas las primitivas pasan por aquí (BatchRenderer las acumula)
+        getattr(self.canvas, 'create_' + kind)(*coords, **opts)
 
     def clear(self, color=BG_COLOR):
         self.canvas.delete('all')
         self.canvas.configure(bg=_rgb(color))
 
+    def flush(self):
+        pass
+
+    def cell_layer(self, key, x0, y0, cell, vista=(0, 0, 1)):
+        # Capa de celdas conservada entre frames (ver CellLayer). Este renderizador borra
+        # el canvas en cada frame: None -> el juego dibuja todas sus celdas con draw_block
+        return None
+
+    def retained(self, key, version, draw):
+        # Sección que draw(renderer) dibuja y que puede conservarse en el canvas mientras
+        # version no cambie (BatchRenderer). Este renderizador la dibuja siempre
+        draw(self)
+
     def draw_block(self, x, y, w=40, h=20, color=(200,80,80)):
-        self.canvas.create_rectangle(x, y, x+w, y+h, fill=_rgb(color), outline=_rgb((0,0,0)))
+        self._item('rectangle', (x, y, x+w, y+h), {'fill': _rgb(color), 'outline': _rgb((0,0,0))})
+
+    def draw_outline(self, x, y, w, h, color):
+        # Rectángulo sin relleno (pieza fantasma)
+        self._item('rectangle', (x+1, y+1, x+w-1, y+h-1), {'outline': _rgb(color)})
 
     def draw_text(self, text, x, y, color=TEXT_COLOR, size=12):
-        self.canvas.create_text(x, y, text=text, anchor='nw', fill=_rgb(color), font=('Arial', size))
+        self._item('text', (x, y), {'text': text, 'anchor': 'nw', 'fill': _rgb(color), 'font': ('Arial', size)})
 
-    def draw_text_center(self, text, y, color=TEXT_COLOR, size=14):
-        self.canvas.create_text(WINDOW_SIZE[0]//2, y, text=text, anchor='n', fill=_rgb(color), font=('Arial', size))
+    def draw_text_center(self, text, y, color=TEXT_COLOR, size=14, x=None):
+        x = WINDOW_SIZE[0]//2 if x is None else x
+        self._item('text', (x, y), {'text': text, 'anchor': 'n', 'fill': _rgb(color), 'font': ('Arial', size)})
 
     def draw_score(self, score, x=8, y=8):
         self.draw_text("Puntuación: {0}".format(score), x, y)
 
     def draw_grid(self, x0, y0, cols, rows, cell, color=(70,70,70)):
+        fill = {'fill': _rgb(color)}
         for c in range(cols+1):
             x = x0 + c*cell
-            self.canvas.create_line(x, y0, x, y0 + rows*cell, fill=_rgb(color))
+            self._item('line', (x, y0, x, y0 + rows*cell), fill, static=True)
         for r in range(rows+1):
             y = y0 + r*cell
-            self.canvas.create_line(x0, y, x0 + cols*cell, y, fill=_rgb(color))
+            self._item('line', (x0, y, x0 + cols*cell, y), fill, static=True)
 
     def draw_playfield(self, x0, y0, cols, rows, cell, bg=(20,20,20), border=(200,200,200)):
-        self.canvas.create_rectangle(x0, y0, x0+cols*cell, y0+rows*cell, fill=_rgb(bg), outline=_rgb(border))
+        self._item('rectangle', (x0, y0, x0+cols*cell, y0+rows*cell), {'fill': _rgb(bg), 'outline': _rgb(border)}, static=True)
 
     # Nuevas utilidades para formas de frutas
     def draw_circle(self, x, y, w, h, color, outline=(0,0,0)):
-        self.canvas.create_oval(x, y, x+w, y+h, fill=_rgb(color), outline=_rgb(outline))
+        self._item('oval', (x, y, x+w, y+h), {'fill': _rgb(color), 'outline': _rgb(outline)})
 
     def draw_polygon(self, points, color, outline=(0,0,0)):
         # points: lista de (x,y)
         flat = []
         for (px, py) in points:
             flat.extend([px, py])
-        self.canvas.create_polygon(*flat, fill=_rgb(color), outline=_rgb(outline))
+        self._item('polygon', tuple(flat), {'fill': _rgb(color), 'outline': _rgb(outline)})
+
+    def draw_sprite(self, sprite, x, y):
+        if self.atlas is not None:
+            self._item('image', (x + sprite.x0, y + sprite.y0), {'image': self.atlas.image(sprite), 'anchor': 'nw'})
+            return
+        # Sin atlas: las mismas primitivas que dibujaría el juego directamente
+        for forma in sprite.shapes:
+            if forma[0] == 'polygon':
+                self.draw_polygon([(x + px, y + py) for (px, py) in forma[1]], forma[2])
+            elif forma[0] == 'circle':
+                self.draw_circle(x + forma[1], y + forma[2], forma[3], forma[4], forma[5])
+            else:
+                self.draw_block(x + forma[1], y + forma[2], forma[3], forma[4], forma[5])
+
+class CellLayer:
+    # Celdas de un tablero que BatchRenderer conserva en el canvas entre frames: un
+    # rectángulo por celda ocupada. El juego pasa con set() solo las celdas que
+    # cambiaron (BaseGame.take_changes) y flush() crea, recolorea o borra esos ítems.
+    # full=True: la capa no tiene nada dibujado; el juego debe llamar a clear() y
+    # pasar todas las celdas visibles.
+    __slots__ = ('tag', 'geom', 'items', 'pending', 'full', 'borrar')
+
+    def __init__(self, tag):
+        self.tag = tag
+        # (x0, y0, cell, vista): celda (x, y) en x0 + x*cell, transformada por la vista
+        self.geom = None
+        self.items = {}
+        self.pending = {}
+        self.full = True
+        self.borrar = False
+
+    def clear(self):
+        self.borrar = self.borrar or bool(self.items)
+        self.items = {}
+        self.pending = {}
+        self.full = False
+
+    def set(self, pos, color):
+        # color None -> celda vacía
+        self.pending[pos] = color
+
+class BatchRenderer(Renderer):
+    # Acumula las primitivas del frame (de todas las vistas) y las aplica en una sola
+    # pasada en flush(), conservando en el canvas lo que no cambió. El frame es una
+    # secuencia de segmentos en orden de dibujo, cada uno con su tag en el canvas:
+    #   - secciones retained(clave, versión): se redibujan solo si cambia la versión;
+    #   - CellLayers de los tableros: solo se tocan las celdas que cambiaron;
+    #   - tramos sueltos: los estáticos (static=True) se conservan si son idénticos,
+    #     los demás se recrean cada frame.
+    # Un segmento redibujado se crea arriba del todo y se baja debajo del primer
+    # segmento conservado que le sigue, así el apilado respeta el orden de dibujo.
+    def __init__(self, canvas, atlas=None):
+        Renderer.__init__(self, canvas, atlas)
+        self._bg = None
+        self._frame = []
+        self._run = None
+        self._capture = None
+        # Lo que hay en el canvas: clave -> [tag, versión, nº de ítems, orden en el frame]
+        self.segments = {}
+        self.layers = {}
+        self._next_tag = 0
+        self.items_created = 0
+        self.items_changed = 0
+
+    def _tag(self):
+        self._next_tag += 1
+        return 's%d' % self._next_tag
+
+    def _item(self, kind, coords, opts, static=False):
+        if self._capture is not None:
+            self._capture.append((kind, coords, opts))
+            return
+        run = self._run
+        if run is None or run[0] != static:
+            run = self._run = (static, [])
+            self._frame.append(('tramo', run))
+        run[1].append((kind, coords, opts))
+
+    def clear(self, color=BG_COLOR):
+        self._frame = []
+        self._run = None
+        if color != self._bg:
+            self._bg = color
+            self.canvas.configure(bg=_rgb(color))
+
+    def retained(self, key, version, draw):
+        if self._capture is not None:
+            # Sección dentro de otra: forma parte de la de fuera
+            draw(self)
+            return
+        self._run = None
+        seg = self.segments.get(key)
+        if seg is not None and version is not None and seg[1] == version:
+            self._frame.append(('seccion', key, version, None))
+            return
+        items = self._capture = []
+        try:
+            draw(self)
+        finally:
+            self._capture = None
+        self._frame.append(('seccion', key, version, items))
+
+    def cell_layer(self, key, x0, y0, cell, vista=(0, 0, 1)):
+        capa = self.layers.get(key)
+        if capa is None:
+            capa = self.layers[key] = CellLayer(self._tag())
+        geom = (x0, y0, cell, vista)
+        if capa.geom != geom:
+            # Cámara desplazada o vista nueva: todo lo dibujado está en otro sitio
+            capa.geom = geom
+            capa.clear()
+            capa.full = True
+        self._run = None
+        self._frame.append(('capa', capa))
+        return capa
+
+    def _apply_layer(self, c, capa):
+        if capa.borrar:
+            c.delete(capa.tag)
+            capa.borrar = False
+        x0, y0, cell, (vx, vy, escala) = capa.geom
+        lado = cell * escala
+        negro = _rgb((0, 0, 0))
+        items = capa.items
+        creados = cambiados = 0
+        for pos, color in capa.pending.items():
+            actual = items.get(pos)
+            if color is None:
+                if actual is not None:
+                    c.delete(actual[0])
+                    del items[pos]
+                    cambiados += 1
+            elif actual is None:
+                # Mismas cuentas que draw_block (y Viewport) para las mismas coordenadas
+                x = vx + (x0 + pos[0] * cell) * escala
+                y = vy + (y0 + pos[1] * cell) * escala
+                items[pos] = (c.create_rectangle(x, y, x + lado, y + lado, fill=_rgb(color),
+                                                 outline=negro, tags=capa.tag), color)
+                creados += 1
+            elif actual[1] != color:
+                c.itemconfigure(actual[0], fill=_rgb(color))
+                items[pos] = (actual[0], color)
+                cambiados += 1
+        capa.pending = {}
+        return creados, cambiados
+
+    def flush(self):
+        c = self.canvas
+        segments = self.segments
+        # Segmentos del frame: (clave, versión, ítems nuevos o None si se conservan, capa)
+        plan = []
+        tramos = 0
+        for entrada in self._frame:
+            if entrada[0] == 'tramo':
+                static, items = entrada[1]
+                clave = ('tramo', tramos)
+                tramos += 1
+                version = tuple(items) if static else None
+                seg = segments.get(clave)
+                conservar = seg is not None and version is not None and seg[1] == version
+                plan.append((clave, version, None if conservar else items, None))
+            elif entrada[0] == 'seccion':
+                plan.append((entrada[1], entrada[2], entrada[3], None))
+            else:
+                plan.append((entrada[1].tag, None, None, entrada[1]))
+        self._frame = []
+        self._run = None
+        # Fuera del canvas lo que no se dibujó en este frame (menú, partida terminada...)
+        claves = set(p[0] for p in plan)
+        for clave in [k for k in segments if k not in claves]:
+            c.delete(segments.pop(clave)[0])
+        capas = set(id(p[3]) for p in plan if p[3] is not None)
+        for clave in [k for k, capa in self.layers.items() if id(capa) not in capas]:
+            c.delete(self.layers.pop(clave).tag)
+        # Un segmento conservado que quedó fuera de orden se redibuja
+        ultimo = -1
+        for i, (clave, version, items, capa) in enumerate(plan):
+            if capa is None and items is None:
+                seg = segments[clave]
+                if seg[3] < ultimo:
+                    seg[1] = None
+                    plan[i] = (clave, version, [], None)
+                    continue
+                ultimo = seg[3]
+        # Ancla de cada segmento: el primer segmento posterior que sigue en el canvas
+        anclas = [None] * len(plan)
+        ancla = None
+        for i in range(len(plan) - 1, -1, -1):
+            anclas[i] = ancla
+            clave, version, items, capa = plan[i]
+            if capa is not None:
+                if capa.items and not capa.borrar:
+                    ancla = capa.tag
+            elif items is None and segments[clave][2]:
+                ancla = segments[clave][0]
+        creados = cambiados = 0
+        crear = {}
+        for i, (clave, version, items, capa) in enumerate(plan):
+            if capa is not None:
+                n, m = self._apply_layer(c, capa)
+                creados += n
+                cambiados += m
+                if n and anclas[i] is not None:
+                    c.tag_lower(capa.tag, anclas[i])
+                continue
+            seg = segments.get(clave)
+            if items is None:
+                seg[3] = i
+                continue
+            if seg is None:
+                seg = segments[clave] = [self._tag(), None, 0, i]
+            elif seg[2]:
+                c.delete(seg[0])
+            tag = seg[0]
+            for kind, coords, opts in items:
+                fn = crear.get(kind)
+                if fn is None:
+                    fn = crear[kind] = getattr(c, 'create_' + kind)
+                fn(*coords, tags=tag, **opts)
+            seg[1] = version
+            seg[2] = len(items)
+            seg[3] = i
+            creados += len(items)
+            if items and anclas[i] is not None:
+                c.tag_lower(tag, anclas[i])
+        self.items_created = creados
+        self.items_changed = cambiados
+
+    def present(self, snapshot):
+        # Dibuja una FrameSnapshot publicada por el hilo de simulación
+        self.clear(snapshot.bg)
+        for kind, coords, opts in snapshot.static:
+            self._item(kind, coords, opts, static=True)
+        # Los sprites llegan sin imagen (el otro hilo no toca Tk): se resuelven aquí
+        atlas = self.atlas
+        for kind, coords, opts in snapshot.dynamic:
+            if kind == 'sprite':
+                kind, opts = 'image', {'image': atlas.image(opts['sprite']), 'anchor': 'nw'}
+            self._item(kind, coords, opts)
+        self.flush()
+
+# Lo que el hilo de simulación entrega al de Tk: primitivas del frame en tuplas
+FrameSnapshot = namedtuple('FrameSnapshot', 'frame bg static dynamic')
+
+class FrameBuffer:
+    # Doble búfer entre hilos: un único escritor llena el hueco trasero y lo
+    # intercambia con el delantero; el lector solo ve instantáneas completas.
+    def __init__(self):
+        self._slots = [None, None]
+        self._front = 0
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, snapshot):
+        back = 1 - self._front
+        self._slots[back] = snapshot
+        with self._lock:
+            self._front = back
+            self.published += 1
+
+    def latest(self):
+        # (número de publicación, instantánea); el número sirve para no redibujar la misma
+        with self._lock:
+            return self.published, self._slots[self._front]
+
+class DisplayList(Renderer):
+    # Renderer sin canvas para el hilo de simulación: graba las primitivas y
+    # flush() publica el frame como FrameSnapshot inmutable en el FrameBuffer
+    def __init__(self, buffer):
+        Renderer.__init__(self, None)
+        self.buffer = buffer
+        self.static = []
+        self.dynamic = []
+        self.bg = BG_COLOR
+        self.frame = 0
+
+    def _item(self, kind, coords, opts, static=False):
+        (self.static if static else self.dynamic).append((kind, coords, opts))
+
+    def clear(self, color=BG_COLOR):
+        self.static = []
+        self.dynamic = []
+        self.bg = color
+
+    def draw_sprite(self, sprite, x, y):
+        self._item('sprite', (x + sprite.x0, y + sprite.y0), {'sprite': sprite})
+
+    def flush(self):
+        self.buffer.publish(FrameSnapshot(self.frame, self.bg, tuple(self.static), tuple(self.dynamic)))
+        self.frame += 1
+        self.static = []
+        self.dynamic = []
+
+class SimulationThread:
+    # Bucle de lógica a paso fijo (dt = 1/FPS) en su propio hilo. Si se atrasa más de
+    # SIM_CATCHUP_MAX ticks (p. ej. Tk retuvo el GIL) descarta el resto en vez de acelerar.
+    def __init__(self, tick, rate=FPS):
+        self.tick = tick
+        self.dt = 1.0 / rate
+        self.ticks = 0
+        self.skipped = 0
+        self._stop = threading.Event()
+        self._hilo = threading.Thread(target=self._run, name='simulacion')
+        self._hilo.daemon = True
+
+    def start(self):
+        self._hilo.start()
+        return self
+
+    def alive(self):
+        return self._hilo.is_alive()
+
+    def _run(self):
+        siguiente = time.perf_counter()
+        while not self._stop.is_set():
+            ahora = time.perf_counter()
+            if ahora < siguiente:
+                self._stop.wait(siguiente - ahora)
+                continue
+            atraso = int((ahora - siguiente) / self.dt)
+            if atraso >= SIM_CATCHUP_MAX:
+                self.skipped += atraso
+                siguiente = ahora
+            self.tick(self.dt)
+            self.ticks += 1
+            siguiente += self.dt
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._hilo.is_alive() and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout)
+
+class Viewport:
+    # Transformación de una partida (espacio lógico WINDOW_SIZE) a un rectángulo del canvas.
+    # Tiene la misma API de dibujo que Renderer y delega en él.
+    def __init__(self, target, x, y, scale):
+        self.target = target
+        self.x = x
+        self.y = y
+        self.scale = scale
+
+    def _p(self, x, y):
+        return self.x + x * self.scale, self.y + y * self.scale
+
+    def _size(self, size):
+        return max(6, int(round(size * self.scale)))
+
+    def cell_layer(self, key, x0, y0, cell, vista=(0, 0, 1)):
+        return self.target.cell_layer(key, x0, y0, cell, (self.x, self.y, self.scale))
+
+    def retained(self, key, version, draw):
+        # La sección se dibuja a través de esta vista; la clave incluye la transformación
+        self.target.retained((key, self.x, self.y, self.scale), version, lambda _target: draw(self))
+
+    def draw_block(self, x, y, w=40, h=20, color=(200,80,80)):
+        x, y = self._p(x, y)
+        self.target.draw_block(x, y, w * self.scale, h * self.scale, color)
+
+    def draw_outline(self, x, y, w, h, color):
+        x, y = self._p(x, y)
+        self.target.draw_outline(x, y, w * self.scale, h * self.scale, color)
+
+    def draw_text(self, text, x, y, color=TEXT_COLOR, size=12):
+        x, y = self._p(x, y)
+        self.target.draw_text(text, x, y, color, self._size(size))
+
+    def draw_text_center(self, text, y, color=TEXT_COLOR, size=14, x=None):
+        x, y = self._p(WINDOW_SIZE[0]//2 if x is None else x, y)
+        self.target.draw_text_center(text, y, color, self._size(size), x=x)
+
+    def draw_score(self, score, x=8, y=8):
+        self.draw_text("Puntuación: {0}".format(score), x, y)
+
+    def draw_grid(self, x0, y0, cols, rows, cell, color=(70,70,70)):
+        x0, y0 = self._p(x0, y0)
+        self.target.draw_grid(x0, y0, cols, rows, cell * self.scale, color)
+
+    def draw_playfield(self, x0, y0, cols, rows, cell, bg=(20,20,20), border=(200,200,200)):
+        x0, y0 = self._p(x0, y0)
+        self.target.draw_playfield(x0, y0, cols, rows, cell * self.scale, bg, border)
+
+    def draw_circle(self, x, y, w, h, color, outline=(0,0,0)):
+        x, y = self._p(x, y)
+        self.target.draw_circle(x, y, w * self.scale, h * self.scale, color, outline)
+
+    def draw_polygon(self, points, color, outline=(0,0,0)):
+        self.target.draw_polygon([self._p(px, py) for (px, py) in points], color, outline)
+
+    def draw_sprite(self, sprite, x, y):
+        x, y = self._p(x, y)
+        self.target.draw_sprite(sprite.scaled(self.scale), x, y)
+
+class _SinDibujo:
+    # No dibuja nada: sirve para trazar solo una parte de una maquetación compartida
+    def _nada(self, *args, **kwargs):
+        pass
+    draw_block = draw_outline = draw_grid = draw_text = draw_text_center = draw_sprite = _nada
+
+SIN_DIBUJO = _SinDibujo()
+
+# ---------- Sprites ----------
+# Formas en coordenadas locales del sprite (contorno negro, como draw_block/draw_circle):
+#   ('block', x, y, w, h, color)  ('circle', x, y, w, h, color)  ('polygon', [(x, y), ...], color)
+_SPRITES = {}
+
+def sprite(key, build):
+    # Sprite único por clave (forma, tamaño de celda, color...); build() da sus formas
+    s = _SPRITES.get(key)
+    if s is None:
+        s = _SPRITES[key] = Sprite(key, build())
+    return s
+
+class Sprite:
+    __slots__ = ('key', 'shapes', 'x0', 'y0', 'w', 'h', '_scaled')
+
+    def __init__(self, key, shapes):
+        self.key = key
+        self.shapes = tuple(shapes)
+        xs = []
+        ys = []
+        for forma in self.shapes:
+            if forma[0] == 'polygon':
+                xs.extend(px for px, _py in forma[1])
+                ys.extend(py for _px, py in forma[1])
+            else:
+                xs.extend((forma[1], forma[1] + forma[3]))
+                ys.extend((forma[2], forma[2] + forma[4]))
+        # Caja en píxeles enteros que cubre todas las formas (el contorno incluido)
+        self.x0 = int(min(xs) // 1)
+        self.y0 = int(min(ys) // 1)
+        self.w = int(-(-max(xs) // 1)) - self.x0 + 1
+        self.h = int(-(-max(ys) // 1)) - self.y0 + 1
+        self._scaled = {}
+
+    def scaled(self, scale):
+        if scale == 1:
+            return self
+        s = self._scaled.get(scale)
+        if s is None:
+            formas = []
+            for forma in self.shapes:
+                if forma[0] == 'polygon':
+                    formas.append(('polygon', [(px * scale, py * scale) for px, py in forma[1]], forma[2]))
+                else:
+                    formas.append((forma[0],) + tuple(v * scale for v in forma[1:5]) + (forma[5],))
+            s = self._scaled[scale] = Sprite((self.key, scale), formas)
+        return s
+
+def _dentro_poligono(puntos, x, y):
+    dentro = False
+    j = len(puntos) - 1
+    for i in range(len(puntos)):
+        xi, yi = puntos[i]
+        xj, yj = puntos[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / float(yj - yi) + xi:
+            dentro = not dentro
+        j = i
+    return dentro
+
+class SpriteAtlas:
+    # PhotoImage por sprite, rasterizado la primera vez que se pide. Los píxeles que
+    # ninguna forma cubre no se escriben y quedan transparentes.
+    def __init__(self, image_factory=None):
+        self.images = {}
+        self.image_factory = image_factory
+
+    def image(self, sprite):
+        img = self.images.get(sprite.key)
+        if img is None:
+            img = self.images[sprite.key] = self._rasterize(sprite)
+        return img
+
+    def _rasterize(self, sprite):
+        w, h = sprite.w, sprite.h
+        pixeles = [[None] * w for _ in range(h)]
+        for forma in sprite.shapes:
+            if forma[0] == 'polygon':
+                puntos = [(px - sprite.x0, py - sprite.y0) for px, py in forma[1]]
+                dentro = lambda px, py, puntos=puntos: _dentro_poligono(puntos, px, py)
+                color = forma[2]
+            else:
+                x, y, fw, fh = forma[1] - sprite.x0, forma[2] - sprite.y0, forma[3], forma[4]
+                color = forma[5]
+                if forma[0] == 'circle':
+                    cx, cy, rx, ry = x + fw / 2.0, y + fh / 2.0, max(fw / 2.0, 0.5), max(fh / 2.0, 0.5)
+                    dentro = lambda px, py, cx=cx, cy=cy, rx=rx, ry=ry: ((px - cx) / rx) ** 2 + ((py - cy) / ry) ** 2 <= 1.0
+                else:
+                    dentro = lambda px, py, x=x, y=y, fw=fw, fh=fh: x <= px <= x + fw + 1 and y <= py <= y + fh + 1
+            # Centro de cada píxel; los del borde de la forma llevan el contorno negro
+            mascara = set((px, py) for py in range(h) for px in range(w) if dentro(px + 0.5, py + 0.5))
+            relleno = _rgb(color)
+            for px, py in mascara:
+                borde = ((px - 1, py) not in mascara or (px + 1, py) not in mascara or
+                         (px, py - 1) not in mascara or (px, py + 1) not in mascara)
+                pixeles[py][px] = '#000000' if borde else relleno
+        img = (self.image_factory or tk.PhotoImage)(width=w, height=h)
+        for py, fila in enumerate(pixeles):
+            px = 0
+            while px < w:
+                if fila[px] is None:
+                    px += 1
+                    continue
+                fin = px
+                while fin < w and fila[fin] is not None:
+                    fin += 1
+                img.put('{' + ' '.join(fila[px:fin]) + '}', to=(px, py))
+                px = fin
+        return img
+
+class Camera:
+    # Ventana de celdas visibles cuando el tablero no cabe en el área de juego.
+    # Sigue a un objetivo (cabeza de la serpiente, pieza activa) con un margen de
+    # un cuarto de ventana; si el tablero cabe entero queda fija en (0, 0).
+    def __init__(self, grid_w, grid_h, view_w, view_h):
+        self.grid_w = grid_w
+        self.grid_h = grid_h
+        self.view_w = view_w
+        self.view_h = view_h
+        self.x = 0
+        self.y = 0
+
+    def _seguir(self, pos, inicio, vista, total):
+        if vista >= total:
+            return 0
+        margen = vista // 4
+        if pos < inicio + margen:
+            inicio = pos - margen
+        elif pos >= inicio + vista - margen:
+            inicio = pos - vista + margen + 1
+        return max(0, min(total - vista, inicio))
+
+    def follow(self, x, y):
+        self.x = self._seguir(x, self.x, self.view_w, self.grid_w)
+        self.y = self._seguir(y, self.y, self.view_h, self.grid_h)
+
+    def visible(self, x, y):
+        return self.x <= x < self.x + self.view_w and self.y <= y < self.y + self.view_h
+
+def play_area(grid_w, grid_h, cell):
+    # Celdas visibles y posición del área de juego (a la izquierda del panel)
+    play_w = WINDOW_SIZE[0] - PANEL_WIDTH
+    view_w = max(1, min(grid_w, (play_w - 20) // cell))
+    view_h = max(1, min(grid_h, WINDOW_SIZE[1] // cell))
+    return {
+        'view_w': view_w,
+        'view_h': view_h,
+        'offset_x': max(10, (play_w - view_w * cell) // 2),
+        'offset_y': (WINDOW_SIZE[1] - view_h * cell) // 2,
+    }
+
+class GameInstance:
+    # Una partida del modo versus: juego, su vista en pantalla y la IA si la controla
+    def __init__(self, game, viewport, bot=None):
+        self.game = game
+        self.viewport = viewport
+        self.bot = bot
+
+def split_viewports(target, n):
+    # Rejilla casi cuadrada de n vistas a escala uniforme dentro de WINDOW_SIZE
+    cols = 1
+    while cols * cols < n:
+        cols += 1
+    rows = (n + cols - 1) // cols
+    scale = 1.0 / max(cols, rows)
+    w, h = WINDOW_SIZE[0] * scale, WINDOW_SIZE[1] * scale
+    x0 = (WINDOW_SIZE[0] - cols * w) / 2.0
+    y0 = (WINDOW_SIZE[1] - rows * h) / 2.0
+    return [Viewport(target, x0 + (i % cols) * w, y0 + (i // cols) * h, scale) for i in range(n)]
+
+_RGB = {}
 
 def _rgb(rgb_tuple):
-    return '#%02x%02x%02x' % rgb_tuple
+    # Se llama por cada primitiva de cada frame: cada color se formatea una vez
+    s = _RGB.get(rgb_tuple)
+    if s is None:
+        s = _RGB[rgb_tuple] = '#%02x%02x%02x' % rgb_tuple
+    return s
+
+COLOR_NAMES = {
+    'cian': (0, 255, 255),
+    'amarillo': (255, 255, 0),
+    'magenta': (255, 0, 255),
+    'naranja': (255, 165, 0),
+    'azul': (0, 120, 255),
+    'verde': (0, 200, 0),
+    'rojo': (220, 40, 40),
+    'rojo_especial': (220, 40, 40),
+    'celeste': (135, 206, 235),
+    'azul_especial': (80, 120, 255),
+    'dorado': (220, 180, 30),
+    'azul_cielo': (60, 120, 220),
+    'blanco': (255, 255, 255),
+    'morado': (128, 0, 128),
+}
 
 def color_from_name(name):
-    # Normalizar nombre para que funcione en Py2 (unicode)
-    try:
-        # En Py2: si es unicode, convertir a str (bytes) para coincidir con claves del dict
-        import sys
-        if sys.version_info[0] == 2 and isinstance(name, unicode):
-            name = name.encode('utf-8')
-    except Exception:
-        pass
+    # En Py2: si es unicode, convertir a str (bytes) para coincidir con claves del dict
+    if sys.version_info[0] == 2 and isinstance(name, unicode):
+        name = name.encode('utf-8')
     if isinstance(name, str):
         name = name.lower()
-    cmap = {
-        'cian': (0, 255, 255),
-        'amarillo': (255, 255, 0),
-        'magenta': (255, 0, 255),
-        'naranja': (255, 165, 0),
-        'azul': (0, 120, 255),
-        'verde': (0, 200, 0),
-        'rojo': (220, 40, 40),
-        'rojo_especial': (220, 40, 40),
-        'celeste': (135, 206, 235),
-        'azul_especial': (80, 120, 255),
-        'dorado': (220, 180, 30),
-        'azul_cielo': (60, 120, 220),
-        'blanco': (255, 255, 255),
-        'morado': (128, 0, 128),
-    }
-    return cmap.get(name, (200, 140, 40))
+    return COLOR_NAMES.get(name, (200, 140, 40))
 
 # ---------- CARGA DE ARCHIVOS .brik ----------
+class BrikIncludeError(Exception):
+    pass
+
+# Caché por proceso de los .brik ya parseados: ruta absoluta -> (mtime, hechos propios, inclusiones).
+# Compartida por GameCatalog y los hilos de carga; los hechos devueltos no deben modificarse.
+_BRIK_CACHE = {}
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
 class BrikLoader:
     @staticmethod
     def parse_arg(node):
@@ -179,26 +1077,94 @@ class BrikLoader:
 
     @staticmethod
     def load(path):
+        return BrikLoader.load_tracked(path)[0]
+
+    @staticmethod
+    def load_tracked(path):
+        # Hechos del archivo seguidos de los de sus inclusiones (los propios tienen prioridad)
+        # y [(ruta incluida, mtime)]; ({}, []) ante errores de sintaxis, inclusiones que faltan o ciclos
         if not analizador:
-            return {}
+            return {}, []
+        try:
+            return BrikLoader._resolve(os.path.abspath(path))
+        except BrikIncludeError as e:
+            print("Error en {0}: {1}".format(os.path.basename(path), e))
+        except Exception:
+            pass
+        return {}, []
+
+    @staticmethod
+    def _module(path, cache):
+        # Un parseo por archivo incluido y proceso mientras no cambie su mtime; el archivo
+        # principal no se guarda (de retenerlo ya se encarga el LRU de GameCatalog)
+        mtime = _mtime(path)
+        entry = _BRIK_CACHE.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry
+        facts, incluidos = BrikLoader.parse_file(path)
+        base = os.path.dirname(path)
+        entry = (mtime, facts, tuple(os.path.abspath(os.path.join(base, r)) for r in incluidos))
+        if cache:
+            _BRIK_CACHE[path] = entry
+        return entry
+
+    @staticmethod
+    def _modules(path):
+        # Recorrido en profundidad: el archivo y luego cada inclusión en orden; cada archivo
+        # compartido aparece una sola vez y un ciclo es un error
+        orden = []
+        vistos = set()
+        def visitar(ruta, pila):
+            if ruta in pila:
+                ciclo = pila[pila.index(ruta):] + (ruta,)
+                raise BrikIncludeError("inclusión circular: " + " -> ".join(os.path.basename(r) for r in ciclo))
+            if ruta in vistos:
+                return
+            vistos.add(ruta)
+            if not os.path.isfile(ruta):
+                # Sin pila es el archivo principal, no una inclusión
+                raise BrikIncludeError("no existe el archivo {0}{1}".format('incluido ' if pila else '', ruta))
+            mtime, facts, incluidos = BrikLoader._module(ruta, cache=bool(pila))
+            orden.append((ruta, mtime, facts))
+            for inc in incluidos:
+                visitar(inc, pila + (ruta,))
+        visitar(path, ())
+        return orden
+
+    @staticmethod
+    def _resolve(path):
+        modulos = BrikLoader._modules(path)
+        deps = [(ruta, mtime) for ruta, mtime, _facts in modulos[1:]]
+        if len(modulos) == 1:
+            return modulos[0][2], deps
+        # Sin copiar hechos: las listas de argumentos se comparten con la caché y un
+        # predicado presente en un solo archivo reutiliza su lista tal cual
+        merged = {}
+        for _ruta, _mtime_mod, facts in modulos:
+            for pred, recs in facts.items():
+                previo = merged.get(pred)
+                merged[pred] = recs if previo is None else previo + recs
+        return merged, deps
+
+    @staticmethod
+    def parse_file(path):
+        # Hechos propios del archivo y rutas de sus incluir(...), sin resolver.
+        # Los errores de sintaxis se propagan (load los convierte en {})
         try:
             with io.open(path, 'r', encoding='utf-8') as f:
                 code = f.read()
         except TypeError:
             with open(path, 'r') as f:
                 code = f.read()
+        if hasattr(analizador, 'compile_facts'):
+            # El cargador no necesita el árbol: de los tokens a los hechos en una pasada
+            return analizador.compile_facts(code)
         if hasattr(analizador, 'parse_code'):
-            try:
-                ast = analizador.parse_code(code)
-            except Exception:
-                return {}
+            ast = analizador.parse_code(code)
         elif hasattr(analizador, 'Parser'):
-            try:
-                tokens = analizador.lexer(code)
-                parser = analizador.Parser(tokens)
-                ast = parser.parse()
-            except Exception:
-                return {}
+            tokens = analizador.lexer(code)
+            parser = analizador.Parser(tokens)
+            ast = parser.parse()
         else:
             facts = {}
             import re
@@ -213,27 +1179,178 @@ class BrikLoader:
                 pred = m.group(1)
                 cuerpo = [s.strip() for s in m.group(2).split(',')]
                 facts.setdefault(pred, []).append(cuerpo)
-            return facts
+            return facts, ()
         facts = {}
+        incluidos = []
         for hecho in ast.children:
+            if hecho.type == 'Incluir':
+                incluidos.append(hecho.value)
+                continue
             if hecho.type != 'Hecho' or not hecho.children:
                 continue
             pred = hecho.children[0].value
             args = [BrikLoader.parse_arg(a) for a in hecho.children[1:]]
             facts.setdefault(pred, []).append(args)
-        return facts
+        return facts, incluidos
 
 def list_brik_files():
     folder = ANALYZER_DIR
     files = []
     try:
         for name in os.listdir(folder):
-            if name.lower().endswith('.brik'):
+            # Los .brik que empiezan por '_' son módulos para incluir(...), no juegos
+            if name.lower().endswith('.brik') and not name.startswith('_'):
                 files.append(os.path.join(folder, name))
     except Exception:
         return []
     return files
 
+# ---------- Catálogo perezoso de juegos ----------
+_HEADER_NOMBRE = re.compile(r"^\s*juego\s*\(\s*nombre\s*,\s*'([^']*)'")
+_HEADER_DIMS = re.compile(r"^\s*tablero\s*\(\s*dimensiones\s*,\s*\[\s*(\d+)\s*,\s*(\d+)\s*\]")
+
+def scan_brik_header(path):
+    # Lectura rápida de juego(nombre, ...) y tablero(dimensiones, ...) sin parsear el archivo;
+    # se detiene en cuanto encuentra ambos hechos
+    nombre = None
+    dims = None
+    try:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if nombre is None:
+                    m = _HEADER_NOMBRE.match(line)
+                    if m:
+                        nombre = m.group(1)
+                if dims is None:
+                    m = _HEADER_DIMS.match(line)
+                    if m:
+                        dims = (int(m.group(1)), int(m.group(2)))
+                if nombre is not None and dims is not None:
+                    break
+    except (IOError, OSError, UnicodeDecodeError):
+        pass
+    return {'path': path, 'name': nombre or os.path.basename(path), 'dims': dims}
+
+class GameCatalog:
+    # Hechos completos y plantillas de los .brik, cargados al elegirlos y
+    # retenidos en un LRU acotado (clave: ruta; se recarga si cambia el mtime).
+    # Se usa desde los hilos de BackgroundLoader: el parseo va fuera del lock.
+    def __init__(self, max_cached=CATALOG_CACHE_SIZE):
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, path):
+        mtime = _mtime(path)
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is not None and entry['mtime'] == mtime and \
+                    all(_mtime(dep) == m for dep, m in entry['deps']):
+                self._cache.move_to_end(path)
+                return entry
+        t0 = time.perf_counter()
+        data, deps = BrikLoader.load_tracked(path)
+        entry = {'mtime': mtime, 'data': data, 'deps': deps, 'template': None}
+        STARTUP.task('BrikLoader.load ' + os.path.basename(path), t0, time.perf_counter())
+        with self._lock:
+            self._cache[path] = entry
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return entry
+
+    def data(self, path):
+        return self._entry(path)['data']
+
+    def template(self, path):
+        entry = self._entry(path)
+        if entry['template'] is None:
+            entry['template'] = GameFactory.build_template(entry['data'])
+        return entry['template']
+
+    def peek_template(self, path):
+        # Sin E/S: plantilla ya construida o None (para el hilo de Tk)
+        with self._lock:
+            entry = self._cache.get(path)
+            return entry['template'] if entry is not None else None
+
+    def mtime(self, path):
+        with self._lock:
+            entry = self._cache.get(path)
+            return entry['mtime'] if entry is not None else None
+
+    def watched(self, path):
+        # {ruta: mtime} del archivo y de sus incluir(...) en la última carga: lo que
+        # hay que vigilar para la recarga en caliente
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is None:
+                return {path: None}
+            vigilados = dict(entry['deps'])
+            vigilados[path] = entry['mtime']
+            return vigilados
+
+    def cached_paths(self):
+        with self._lock:
+            return list(self._cache)
+
+class BackgroundLoader:
+    # Lee cabeceras y .brik completos en un pool de hilos. Cada tarea deja un
+    # mensaje en self.results que GameEngine._tick consume:
+    #   ('lista', [rutas])  ('cabecera', ruta, entrada)  ('listo', ruta, plantilla)
+    #   ('recarga', ruta, plantilla)  ('error', ruta, texto)
+    # workers=0 ejecuta las tareas en línea (reproducción determinista).
+    def __init__(self, catalog, workers=LOADER_WORKERS):
+        self.catalog = catalog
+        self.results = queue.Queue()
+        self._pool = None
+        if workers > 0:
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def _submit(self, fn, path):
+        if self._pool is None:
+            self._run(fn, path)
+        else:
+            self._pool.submit(self._run, fn, path)
+
+    def _run(self, fn, path):
+        try:
+            self.results.put(fn(path))
+        except Exception as e:
+            self.results.put(('error', path, str(e)))
+
+    def scan_folder(self):
+        self._submit(self._list_files, None)
+
+    def _list_files(self, _path):
+        t0 = time.perf_counter()
+        files = list_brik_files()
+        STARTUP.task('list_brik_files', t0, time.perf_counter())
+        return ('lista', files)
+
+    def scan_header(self, path):
+        self._submit(lambda p: ('cabecera', p, scan_brik_header(p)), path)
+
+    def load(self, path):
+        self._submit(lambda p: ('listo', p, self.catalog.template(p)), path)
+
+    def reload(self, path):
+        # El catálogo vuelve a parsear porque el mtime cambió
+        self._submit(lambda p: ('recarga', p, self.catalog.template(p)), path)
+
+    def poll(self):
+        mensajes = []
+        while True:
+            try:
+                mensajes.append(self.results.get_nowait())
+            except queue.Empty:
+                return mensajes
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
 def get_rule_values(data, nombre_regla, clave):
     return [r[2] for r in data.get('regla', []) if len(r) >= 3 and r[0] == nombre_regla and r[1] == clave]
 
@@ -282,15 +1399,341 @@ def get_dimensions(data):
     return 10, 20
 
 # ---------- JUEGOS DINÁMICOS ----------
+class GameTemplate:
+    # Estado inicial resuelto una sola vez por .brik cargado: todas las reglas,
+    # teclas y formas ya convertidas. Es de solo lectura; reiniciar una partida
+    # solo copia esta configuración y reconstruye el estado mutable.
+    def __init__(self, cls, data, config):
+        self.cls = cls
+        self.data = data
+        self.config = MappingProxyType(config)
+
+def get_control_key(data, action):
+    for registro in data.get('control', []):
+        if len(registro) == 2:
+            nombre_accion = registro[0]
+            # Normalizar nombre de acción por si viene con comillas
+            if isinstance(nombre_accion, (str, unicode)) and len(nombre_accion) >= 2:
+                if nombre_accion[0] == '\'' and nombre_accion[-1] == '\'':
+                    nombre_accion = nombre_accion[1:-1]
+            if nombre_accion == action:
+                tecla = registro[1]
+                # Aceptar tanto str como unicode (Py2)
+                if isinstance(tecla, (str, unicode)) and len(tecla) >= 1:
+                    # Quitar comillas simples si quedaron del parser simple
+                    if len(tecla) >= 2 and tecla[0] == '\'' and tecla[-1] == '\'':
+                        tecla = tecla[1:-1]
+                    return tecla.lower()
+    return None
+
+def get_control_number(data, action, default=None):
+    # control(accion, numero): parámetros de entrada como la auto-repetición
+    for registro in data.get('control', []):
+        if len(registro) == 2 and str(registro[0]).strip('\'') == action:
+            try:
+                return float(registro[1])
+            except (TypeError, ValueError):
+                return default
+    return default
+
+# ---------- Reglas compiladas ----------
+def _sin_comillas(v):
+    if isinstance(v, (str, unicode)) and len(v) >= 2 and v[0] == '\'' and v[-1] == '\'':
+        return v[1:-1]
+    return v
+
+def compile_rules(data, defaults, actions):
+    # regla(R, evento, E) + regla(R, accion|efecto, A) -> ((E, ((A, params), ...)), ...)
+    # params son todos los regla(R, clave, valor) de R. 'defaults' = (R, evento, accion, params)
+    # fija el evento/acción de reglas que el motor conoce aunque el .brik no los declare.
+    por_regla = OrderedDict()
+    for r in data.get('regla', []):
+        if len(r) >= 3:
+            por_regla.setdefault(r[0], {}).setdefault(r[1], r[2])
+    tabla = OrderedDict()
+    def agregar(nombre, evento, accion, params, defecto=None):
+        if accion not in actions:
+            print("Regla {0}: acción desconocida '{1}'{2}".format(
+                nombre, accion, ", se usa '{0}'".format(defecto) if defecto else ", se ignora"))
+            if defecto is None:
+                return
+            accion = defecto
+        tabla.setdefault(evento, []).append((accion, MappingProxyType(params)))
+    conocidas = set()
+    for nombre, evento, accion, params in defaults:
+        attrs = por_regla.get(nombre, {})
+        p = dict(params)
+        p.update(attrs)
+        elegida = _sin_comillas(attrs.get('accion', attrs.get('efecto', accion)))
+        agregar(nombre, _sin_comillas(attrs.get('evento', evento)), elegida, p, accion)
+        conocidas.add(nombre)
+    for nombre, attrs in por_regla.items():
+        if nombre not in conocidas and 'evento' in attrs and 'accion' in attrs:
+            agregar(nombre, _sin_comillas(attrs['evento']), _sin_comillas(attrs['accion']), dict(attrs))
+    return tuple((evento, tuple(acciones)) for evento, acciones in tabla.items())
+
+def _encadenar(handlers):
+    def disparar(*args):
+        for h in handlers:
+            h(*args)
+    return disparar
+
+class AliasSampler:
+    # Muestreo ponderado O(1) (método alias de Vose): una sola llamada a rng.random()
+    # por muestra, con las tablas precompiladas desde las probabilidades del .brik.
+    def __init__(self, items, weights):
+        n = len(items)
+        total = float(sum(weights))
+        self.items = tuple(items)
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        if n == 0 or total <= 0:
+            return
+        escalados = [w * n / total for w in weights]
+        pequenos = [i for i, w in enumerate(escalados) if w < 1.0]
+        grandes = [i for i, w in enumerate(escalados) if w >= 1.0]
+        while pequenos and grandes:
+            s, g = pequenos.pop(), grandes.pop()
+            self.prob[s] = escalados[s]
+            self.alias[s] = g
+            escalados[g] -= 1.0 - escalados[s]
+            (pequenos if escalados[g] < 1.0 else grandes).append(g)
+        # Restos por redondeo: probabilidad 1 (se quedan con su propio valor)
+        for i in pequenos + grandes:
+            self.prob[i] = 1.0
+
+    def sample(self, rng):
+        u = rng.random() * len(self.items)
+        i = int(u)
+        return self.items[i] if u - i < self.prob[i] else self.items[self.alias[i]]
+
+    def __eq__(self, other):
+        # Para la recarga en caliente: solo cuenta como cambio si cambian las tablas
+        return isinstance(other, AliasSampler) and (self.items, self.prob, self.alias) == \
+            (other.items, other.prob, other.alias)
+
+    def __ne__(self, other):
+        return not self == other
+
+def chained_weights(probabilidades):
+    # Probabilidades efectivas de la antigua cadena de comparaciones acumuladas
+    # (r < p1, r < p1+p2, ...): cada una recortada a lo que quede hasta 1; el resto va al último
+    pesos = []
+    acumulado = 0.0
+    for p in probabilidades:
+        p = max(0.0, min(p, 1.0 - acumulado))
+        pesos.append(p)
+        acumulado += p
+    pesos.append(max(0.0, 1.0 - acumulado))
+    return pesos
+
+class EffectScheduler:
+    # Efectos temporizados de una partida en un montículo por instante de fin.
+    # advance() solo toca los vencidos (O(vencidos·log n) por tick, no O(tipos de efecto)).
+    # Cada efecto es independiente: varios del mismo tipo se apilan y terminan por separado.
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+        self._active = {}
+
+    def schedule(self, at, kind, on_end=None):
+        # Devuelve el efecto (lista mutable) para poder cancelarlo
+        self._seq += 1
+        effect = [at, self._seq, kind, on_end, True]
+        heapq.heappush(self._heap, (at, self._seq, effect))
+        self._active[kind] = self._active.get(kind, 0) + 1
+        return effect
+
+    def cancel(self, effect):
+        # Cancelación perezosa: la entrada se descarta al vencer
+        if effect is not None and effect[4]:
+            effect[4] = False
+            self._active[effect[2]] -= 1
+
+    def advance(self, now):
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _at, _seq, effect = heapq.heappop(heap)
+            if not effect[4]:
+                continue
+            effect[4] = False
+            self._active[effect[2]] -= 1
+            if effect[3] is not None:
+                effect[3]()
+
+    def active(self, kind):
+        return self._active.get(kind, 0) > 0
+
+    def count(self, kind):
+        return self._active.get(kind, 0)
+
+# Lector de take_changes() del renderizado en pantalla (espectador.py usa el de por defecto)
+LECTOR_PANTALLA = 'pantalla'
+
+class ChangeSet:
+    # Lo que cambió en el modelo desde el último take_changes(): celdas (x, y) cuyo
+    # contenido cambió, filas enteras desplazadas, movimientos con nombre
+    # ('cabeza', 'cola', 'fruta', 'pieza' -> (antes, después)) y marcadores.
+    # full=True: sin detalle (partida nueva, recarga, tablero reemplazado), mirar todo.
+    __slots__ = ('full', 'cells', 'rows', 'moves', 'stats')
+
+    def __init__(self, full=True):
+        self.full = full
+        self.cells = set()
+        self.rows = set()
+        self.moves = {}
+        self.stats = set()
+
+    def move(self, nombre, antes, despues):
+        # Varios movimientos entre dos lecturas: se conserva el primer 'antes'
+        previo = self.moves.get(nombre)
+        self.moves[nombre] = (previo[0] if previo is not None else antes, despues)
+
+    def merge(self, otro):
+        # Suma los cambios de otro conjunto posterior a este
+        self.full = self.full or otro.full
+        self.cells.update(otro.cells)
+        self.rows.update(otro.rows)
+        self.stats.update(otro.stats)
+        for nombre, (antes, despues) in otro.moves.items():
+            self.move(nombre, antes, despues)
+
+    def dirty_cells(self, grid_w):
+        # Celdas sueltas más las de las filas desplazadas
+        if not self.rows:
+            return self.cells
+        celdas = set(self.cells)
+        for y in self.rows:
+            celdas.update((x, y) for x in range(grid_w))
+        return celdas
+
+    def __bool__(self):
+        return bool(self.full or self.cells or self.rows or self.moves or self.stats)
+    __nonzero__ = __bool__
+
 class BaseGame:
-    def __init__(self, data):
+    # Reglas conocidas (regla, evento, acción por defecto, params por defecto) y
+    # acciones del .brik -> método del juego que las implementa
+    DEFAULT_RULES = ()
+    ACTIONS = {}
+
+    def __init__(self, data, seed=None, template=None):
+        if template is None:
+            template = type(self).build_template(data)
+        self.template = template
         self.data = data
+        self.__dict__.update(template.config)
+        self.bind_rules()
+        self.reset(seed)
+
+    @classmethod
+    def build_template(cls, data):
+        config = cls.resolve_config(data)
+        config['rule_table'] = compile_rules(data, cls.DEFAULT_RULES, cls.ACTIONS)
+        return GameTemplate(cls, data, config)
+
+    def bind_rules(self):
+        # Tabla de despacho evento -> callable ya ligado: disparar es un lookup y una llamada
+        self.dispatch = {}
+        for evento, acciones in self.rule_table:
+            handlers = [functools.partial(getattr(self, self.ACTIONS[accion]), params) for accion, params in acciones]
+            self.dispatch[evento] = handlers[0] if len(handlers) == 1 else _encadenar(handlers)
+
+    def fire(self, evento, *args):
+        handler = self.dispatch.get(evento)
+        if handler is None:
+            return False
+        handler(*args)
+        return True
+
+    @classmethod
+    def resolve_config(cls, data):
+        # Valores que solo dependen del .brik (se calculan una vez por plantilla)
+        return {
+            'hint_color': (160,160,160),
+            'key_pause': None,
+            'key_restart': None,
+            # juego(semilla, N): todas las partidas de este .brik usan la misma semilla
+            'fixed_seed': get_numeric_fact(data, 'juego', 'semilla', None, int),
+        }
+
+    def reset(self, seed=None):
+        # RNG propio por partida para poder reproducir sesiones
+        if self.fixed_seed is not None:
+            seed = self.fixed_seed
+        self.seed = seed if seed is not None else random.randrange(2**31)
+        self.rng = random.Random(self.seed)
         self.score = 0
         self.game_over = False
         self.paused = False
-        self.hint_color = (160,160,160)
-        self.key_pause = None
-        self.key_restart = None
+        self.effects = EffectScheduler()
+        # Cambios para quien dibuje o transmita la partida (ver take_changes)
+        self.changes = ChangeSet()
+        self._stats_seen = None
+        self._lectores = {}
+
+    # Marcadores que take_changes compara entre lecturas
+    STATS = ('score', 'level', 'lives', 'game_over', 'paused')
+
+    def take_changes(self, lector=None):
+        # Cambios desde la última lectura de `lector` (la pantalla, los espectadores...).
+        # Lo acumulado se reparte a los conjuntos pendientes de los demás lectores, así
+        # que cada uno ve todo lo ocurrido; un lector nuevo recibe full=True.
+        cambios, self.changes = self.changes, ChangeSet(full=False)
+        self.collect_changes(cambios)
+        actuales = tuple(getattr(self, k, None) for k in self.STATS)
+        vistos = self._stats_seen
+        if vistos is None:
+            cambios.stats.update(self.STATS)
+        else:
+            cambios.stats.update(k for k, antes, ahora in zip(self.STATS, vistos, actuales) if antes != ahora)
+        self._stats_seen = actuales
+        lectores = self._lectores
+        propio = lectores.get(lector)
+        for clave, pendiente in lectores.items():
+            if clave != lector:
+                pendiente.merge(cambios)
+        lectores[lector] = ChangeSet(full=False)
+        if propio is None:
+            cambios.full = True
+            cambios.stats.update(self.STATS)
+            return cambios
+        propio.merge(cambios)
+        return propio
+
+    def collect_changes(self, cambios):
+        # Cambios que es más barato calcular al leer que registrar en cada mutación
+        pass
+
+    # Claves atadas a la forma del tablero: cambiarlas exige reiniciar la partida
+    HOT_RELOAD_FIXED = ('grid_w', 'grid_h', 'cell', 'offset_x', 'offset_y', 'view_w', 'view_h')
+
+    def apply_template(self, template):
+        # Recarga en caliente: copia solo los valores que cambiaron y conserva
+        # el estado (tablero, serpiente, puntuación...). Devuelve (aplicados, omitidos).
+        anterior = self.template.config
+        aplicados, omitidos = [], []
+        for clave, valor in template.config.items():
+            viejo = anterior.get(clave)
+            if viejo == valor:
+                continue
+            if clave in self.HOT_RELOAD_FIXED:
+                omitidos.append(clave)
+                continue
+            self.config_changed(clave, viejo, valor)
+            setattr(self, clave, valor)
+            aplicados.append(clave)
+        if 'rule_table' in aplicados:
+            self.bind_rules()
+        if aplicados:
+            self.changes.full = True
+        # Reiniciar ya usa la plantilla nueva (incluidas las claves omitidas)
+        self.template = template
+        self.data = template.data
+        return aplicados, omitidos
+
+    def config_changed(self, clave, anterior, nuevo):
+        pass
 
     def update(self, dt, input_manager): pass
     def render(self, renderer): pass
@@ -300,373 +1743,500 @@ class BaseGame:
         return hint
 
     def get_key_for_action(self, action):
-        for registro in self.data.get('control', []):
-            if len(registro) == 2:
-                nombre_accion = registro[0]
-                # Normalizar nombre de acción por si viene con comillas
-                if isinstance(nombre_accion, (str, unicode)) and len(nombre_accion) >= 2:
-                    if nombre_accion[0] == '\'' and nombre_accion[-1] == '\'':
-                        nombre_accion = nombre_accion[1:-1]
-                if nombre_accion == action:
-                    tecla = registro[1]
-                    # Aceptar tanto str como unicode (Py2)
-                    if isinstance(tecla, (str, unicode)) and len(tecla) >= 1:
-                        # Quitar comillas simples si quedaron del parser simple
-                        if len(tecla) >= 2 and tecla[0] == '\'' and tecla[-1] == '\'':
-                            tecla = tecla[1:-1]
-                        return tecla.lower()
-        return None
+        return get_control_key(self.data, action)
+
+# ---------- Sprites de Snake ----------
+def snake_head_shapes(cell, dx, dy):
+    # Cabeza con los ojos según la dirección
+    eye_size = max(3, cell//6)
+    negro = (0, 0, 0)
+    formas = [('block', 0, 0, cell, cell, (120, 220, 120))]
+    if dx == 1:  # derecha
+        ojos = [(cell - eye_size - 2, 3), (cell - eye_size - 2, cell - eye_size - 3)]
+    elif dx == -1:  # izquierda
+        ojos = [(2, 3), (2, cell - eye_size - 3)]
+    elif dy == -1:  # arriba
+        ojos = [(3, 2), (cell - eye_size - 3, 2)]
+    else:  # abajo
+        ojos = [(3, cell - eye_size - 2), (cell - eye_size - 3, cell - eye_size - 2)]
+    formas.extend(('block', ex, ey, eye_size, eye_size, negro) for ex, ey in ojos)
+    return formas
+
+# Forma que debe pedir el .brik para que cada fruta especial tenga su dibujo propio
+SNAKE_FRUIT_SHAPES = {'dorada': 'manzana', 'explosiva': 'bomba', 'ralentizar': 'reloj', 'morada': 'tenis'}
+
+def fruit_shapes(tipo, cell):
+    if tipo == 'dorada':
+        # Manzana dorada: cuerpo con leve borde y tallo/hoja
+        return [('circle', 3, 3, cell - 6, cell - 6, color_from_name('dorado')),
+                ('block', cell//2 - 2, 1, 4, 6, (120,80,30)),
+                ('polygon', [(cell//2 + 3, 2), (cell//2 + 8, 5), (cell//2 + 2, 7)], (40,160,60))]
+    if tipo == 'explosiva':
+        # Bomba roja: cuerpo centrado y mecha en la parte superior derecha
+        mx = cell - 8; my = 4
+        return [('circle', 4, 4, cell - 8, cell - 8, color_from_name('rojo')),
+                ('block', mx, my, 3, 8, (180,180,180)),
+                ('polygon', [(mx+3, my), (mx+8, my-2), (mx+5, my+3)], (255,200,80))]
+    if tipo == 'ralentizar':
+        # Reloj azul: círculo con dos manecillas
+        return [('circle', 3, 3, cell-6, cell-6, color_from_name('azul_cielo')),
+                ('polygon', [(cell//2, 6), (cell//2+2, 6), (cell//2+2, cell//2)], (0,0,0)),
+                ('polygon', [(cell//2, cell//2), (cell//2+2, cell//2), (cell//2+9, cell//2+2)], (0,0,0))]
+    if tipo == 'morada':
+        # Tenis deportivo morado: suela, cuerpo del zapato y cordones
+        return [('block', 2, cell - 6, cell - 4, 4, (220,220,220)),
+                ('polygon', [(2, cell - 6), (cell - 4, cell - 6), (cell - 6, cell - 12),
+                             (cell - 10, cell - 14), (6, cell - 14), (4, cell - 10)], color_from_name('morado')),
+                ('block', 8, cell - 12, 2, 4, (230,230,230)),
+                ('block', 11, cell - 12, 2, 4, (230,230,230))]
+    # Normal: fruta blanca con forma de manzana simple
+    return [('circle', 3, 3, cell - 6, cell - 6, color_from_name('blanco')),
+            ('block', cell//2 - 2, 1, 4, 6, (120,120,120))]
+
+# Iconos de la guía del panel (16x16) y (icono, texto, separación tras la línea)
+SNAKE_ICONS = {
+    'manzana': [('circle', 2, 2, 12, 12, color_from_name('dorado')), ('block', 8, 0, 3, 5, (120,80,30))],
+    'bomba': [('circle', 3, 3, 10, 10, color_from_name('rojo')), ('block', 12, 2, 2, 6, (180,180,180))],
+    'reloj': [('circle', 2, 2, 12, 12, color_from_name('azul_cielo'))],
+    'tenis': [('block', 2, 12, 12, 3, (220,220,220)),
+              ('polygon', [(3, 12), (13, 12), (11, 8), (6, 8), (4, 10)], color_from_name('morado'))],
+}
+SNAKE_GUIDE = (('manzana', "Dorada", 18), ('bomba', "Explosiva", 16), ('reloj', "Ralentizar", 16), ('tenis', "Velocidad +", 16))
 
 class SnakeGame(BaseGame):
-    def __init__(self, data):
-        BaseGame.__init__(self, data)
-        self.grid_w, self.grid_h = get_dimensions(data)
+    DEFAULT_RULES = (
+        ('comer_fruta', 'fruta_comida', 'crecer', {}),
+        ('fruta_dorada', 'fruta_dorada', 'puntos_extra', {}),
+        ('fruta_explosiva', 'fruta_explosiva', 'reducir_longitud', {}),
+        ('powerup_ralentizar', 'powerup_ralentizar', 'modificar_velocidad', {'multiplicador': 0.5, 'duracion_efecto': 8}),
+        ('fruta_morada', 'fruta_morada', 'modificar_velocidad', {'multiplicador': 1.5, 'duracion_efecto': 6}),
+    )
+    ACTIONS = {
+        'crecer': '_accion_crecer',
+        'puntos_extra': '_accion_puntos_extra',
+        'reducir_longitud': '_accion_reducir_longitud',
+        'modificar_velocidad': '_accion_modificar_velocidad',
+    }
+    # Tipo de fruta comida -> evento que dispara
+    FRUIT_EVENTS = {
+        'dorada': 'fruta_dorada',
+        'explosiva': 'fruta_explosiva',
+        'ralentizar': 'powerup_ralentizar',
+        'morada': 'fruta_morada',
+    }
+
+    @classmethod
+    def resolve_config(cls, data):
+        cfg = BaseGame.resolve_config(data)
+        grid_w, grid_h = get_dimensions(data)
         # Ajustar el área de juego para dejar un panel a la derecha
         available_w = max(100, WINDOW_SIZE[0] - PANEL_WIDTH - 20)
-        self.cell = max(12, min(20, available_w // max(self.grid_w, 1)))
-        self.speed = get_numeric_fact(data, 'juego', 'velocidad_inicial', 4.0, float)
+        cell = max(12, min(20, available_w // max(grid_w, 1)))
+        # Centrar dentro del área disponible (excluye panel); si no cabe, se ve por una cámara
+        cfg.update(play_area(grid_w, grid_h, cell))
+        cfg.update({
+            'grid_w': grid_w,
+            'grid_h': grid_h,
+            'cell': cell,
+            'speed_initial': get_numeric_fact(data, 'juego', 'velocidad_inicial', 4.0, float),
+            'lives_initial': get_rule_value(data, 'juego', 'vidas', 3, int) or 3,
+            'longitud_inicial': int(get_fact_value(data, 'serpiente', 'longitud_inicial', 3)),
+            'prob_dorada': get_rule_value(data, 'fruta_dorada', 'probabilidad', 0.2, float),
+            'prob_explosiva': get_rule_value(data, 'fruta_explosiva', 'probabilidad', 0.12, float),
+            'prob_ralentizar': get_rule_value(data, 'powerup_ralentizar', 'probabilidad', 0.1, float),
+            'prob_morada': get_rule_value(data, 'fruta_morada', 'probabilidad', 0.15, float),
+            'base_fruit_color': color_from_name('blanco'),
+            'score_add': next((int(r[2]) for r in data.get('regla', []) if r[0]=='comer_fruta' and r[1]=='puntuacion'), 10),
+            'key_cache': {
+                'izq': get_control_key(data, 'mover_izquierda') or 'left',
+                'der': get_control_key(data, 'mover_derecha') or 'right',
+                'arr': get_control_key(data, 'mover_arriba') or 'up',
+                'aba': get_control_key(data, 'mover_abajo') or 'down',
+            },
+            'key_pause': get_control_key(data, 'pausar') or 'p',
+            'key_restart': get_control_key(data, 'reiniciar') or 'r',
+            'turn_buffer': int(get_control_number(data, 'giros_en_cola', 2)),
+            'explosiva_dur': get_rule_value(data, 'fruta_explosiva', 'duracion_segundos', 5, int),
+            'points_per_level': get_rule_value(data, 'niveles_velocidad', 'puntos_por_nivel', 50, int) or 50,
+            'speed_mult_level': get_rule_value(data, 'niveles_velocidad', 'multiplicador_velocidad', 1.1, float) or 1.1,
+            # Condición de victoria y formas de frutas (antes se buscaban en cada evento/frame)
+            'vict_cond': next((r[2] for r in data.get('regla', []) if r[0]=='victoria' and r[1]=='condicion'), None),
+            'vict_nivel': get_rule_value(data, 'victoria', 'nivel_objetivo', None, int),
+            'forma_dorada': get_rule_str(data, 'fruta_dorada', 'forma', 'manzana'),
+            'forma_explo': get_rule_str(data, 'fruta_explosiva', 'forma', 'bomba'),
+            'forma_ralen': get_rule_str(data, 'powerup_ralentizar', 'forma', 'reloj'),
+            'forma_morada': get_rule_str(data, 'fruta_morada', 'forma', 'tenis'),
+        })
+        k = cfg['key_cache']
+        cfg['key_dirs'] = {k['izq']: (-1, 0), k['der']: (1, 0), k['arr']: (0, -1), k['aba']: (0, 1)}
+        cfg['fruit_sampler'] = AliasSampler(
+            ('explosiva', 'ralentizar', 'dorada', 'morada', 'normal'),
+            chained_weights((cfg['prob_explosiva'], cfg['prob_ralentizar'], cfg['prob_dorada'], cfg['prob_morada'])))
+        return cfg
+
+    def config_changed(self, clave, anterior, nuevo):
+        # La velocidad actual ya lleva niveles y efectos: se reescala
+        if clave == 'speed_initial' and anterior:
+            self.speed *= nuevo / anterior
+
+    def reset(self, seed=None):
+        BaseGame.reset(self, seed)
+        self.speed = self.speed_initial
         self.timer_move = 0.0
         self.time_total = 0.0
-        self.lives = get_rule_value(data, 'juego', 'vidas', 3, int) or 3
-        longitud = int(get_fact_value(data, 'serpiente', 'longitud_inicial', 3))
+        self.lives = self.lives_initial
         start_x, start_y = self.grid_w // 2, self.grid_h // 2
-        self.snake = [(start_x - i, start_y) for i in range(longitud)]
+        self.snake = [(start_x - i, start_y) for i in range(self.longitud_inicial)]
+        # Mismas posiciones que self.snake en un set (choques y render por ventana)
+        self.cuerpo = set(self.snake)
+        self.camera = Camera(self.grid_w, self.grid_h, self.view_w, self.view_h)
         self.dir = (1, 0)
-        self.next_dir = self.dir
+        # Giros pendientes en orden de pulsación (se aplica uno por paso)
+        self.turns = []
         self.fruit_type = 'normal'
-        self.speed_effect_end = 0.0
-        self.prob_dorada = get_rule_value(data, 'fruta_dorada', 'probabilidad', 0.2, float)
-        self.prob_explosiva = get_rule_value(data, 'fruta_explosiva', 'probabilidad', 0.12, float)
-        self.prob_ralentizar = get_rule_value(data, 'powerup_ralentizar', 'probabilidad', 0.1, float)
-        self.ralentizar_mult = get_rule_value(data, 'powerup_ralentizar', 'multiplicador', 0.5, float)
-        self.ralentizar_dur = get_rule_value(data, 'powerup_ralentizar', 'duracion_efecto', 8, int)
-        self.prob_morada = get_rule_value(data, 'fruta_morada', 'probabilidad', 0.15, float)
-        self.morada_mult = get_rule_value(data, 'fruta_morada', 'multiplicador', 1.5, float)
-        self.morada_dur = get_rule_value(data, 'fruta_morada', 'duracion_efecto', 6, int)
-        self.base_fruit_color = color_from_name('blanco')
+        # Caducidad de la fruta explosiva actual (efecto en self.effects)
+        self._fruit_timer = None
+        self.fruit = None
         self.fruit = self.spawn_fruit()
-        self.score_add = next((int(r[2]) for r in data.get('regla', []) if r[0]=='comer_fruta' and r[1]=='puntuacion'), 10)
-        self.key_cache = {
-            'izq': self.get_key_for_action('mover_izquierda') or 'left',
-            'der': self.get_key_for_action('mover_derecha') or 'right',
-            'arr': self.get_key_for_action('mover_arriba') or 'up',
-            'aba': self.get_key_for_action('mover_abajo') or 'down',
-        }
-        self.key_pause = self.get_key_for_action('pausar') or 'p'
-        self.key_restart = self.get_key_for_action('reiniciar') or 'r'
-        # Centrar dentro del área disponible (excluye panel)
-        play_w = WINDOW_SIZE[0] - PANEL_WIDTH
-        self.offset_x = max(10, (play_w - self.grid_w * self.cell) // 2)
-        self.offset_y = (WINDOW_SIZE[1] - self.grid_h * self.cell) // 2
-        self.explosiva_dur = get_rule_value(data, 'fruta_explosiva', 'duracion_segundos', 5, int)
-        self.fruit_spawn_time = 0.0
-        self.last_speed_mult = 1.0
         self.level = 1
-        self.points_per_level = get_rule_value(data, 'niveles_velocidad', 'puntos_por_nivel', 50, int) or 50
-        self.speed_mult_level = get_rule_value(data, 'niveles_velocidad', 'multiplicador_velocidad', 1.1, float) or 1.1
+
+    def queue_turn(self, d):
+        # Se compara con el último giro en cola: dos pulsaciones rápidas dan dos giros
+        ultimo = self.turns[-1] if self.turns else self.dir
+        if d == ultimo or d == (-ultimo[0], -ultimo[1]):
+            return
+        if len(self.turns) < max(1, self.turn_buffer):
+            self.turns.append(d)
 
     def spawn_fruit(self):
-        import random
+        rng = self.rng
         while True:
-            pos = (random.randint(0, self.grid_w - 1), random.randint(0, self.grid_h - 1))
-            if pos not in self.snake:
+            pos = (rng.randint(0, self.grid_w - 1), rng.randint(0, self.grid_h - 1))
+            if pos not in self.cuerpo:
                 break
-        r = random.random()
-        if r < self.prob_explosiva:
-            self.fruit_type = 'explosiva'
-        elif r < self.prob_explosiva + self.prob_ralentizar:
-            self.fruit_type = 'ralentizar'
-        elif r < self.prob_explosiva + self.prob_ralentizar + self.prob_dorada:
-            self.fruit_type = 'dorada'
-        elif r < self.prob_explosiva + self.prob_ralentizar + self.prob_dorada + self.prob_morada:
-            self.fruit_type = 'morada'
-        else:
-            self.fruit_type = 'normal'
-        self.fruit_spawn_time = self.time_total
+        cambios = self.changes
+        cambios.move('fruta', self.fruit, pos)
+        if self.fruit is not None:
+            cambios.cells.add(self.fruit)
+        cambios.cells.add(pos)
+        self.fruit_type = self.fruit_sampler.sample(rng)
+        self.effects.cancel(self._fruit_timer)
+        self._fruit_timer = None
+        if self.fruit_type == 'explosiva':
+            self._fruit_timer = self.effects.schedule(self.time_total + self.explosiva_dur, 'fruta_explosiva',
+                                                      self._fruta_caducada)
         return pos
 
+    def _fruta_caducada(self):
+        # La explosiva no comida a tiempo se sustituye por una normal
+        self._fruit_timer = None
+        self.fruit = self.spawn_fruit()
+        # La sustituta siempre es normal, aunque el sorteo saliera explosiva
+        self.effects.cancel(self._fruit_timer)
+        self._fruit_timer = None
+        self.fruit_type = 'normal'
+
     def update(self, dt, input_manager):
         if self.game_over or self.paused:
             return
         self.time_total += dt
-        k = self.key_cache
-        if k['izq'] and input_manager.was_pressed(k['izq']):
-            if self.dir != (1,0):
-                self.next_dir = (-1,0)
-        if k['der'] and input_manager.was_pressed(k['der']):
-            if self.dir != (-1,0):
-                self.next_dir = (1,0)
-        if k['arr'] and input_manager.was_pressed(k['arr']):
-            if self.dir != (0,1):
-                self.next_dir = (0,-1)
-        if k['aba'] and input_manager.was_pressed(k['aba']):
-            if self.dir != (0,-1):
-                self.next_dir = (0,1)
+        for _t, kind, key in input_manager.events():
+            d = self.key_dirs.get(key) if kind == '+' else None
+            if d is not None:
+                self.queue_turn(d)
         self.timer_move += dt
         step_time = max(0.05, 0.25 / self.speed)
         if self.timer_move >= step_time:
             self.timer_move = 0.0
-            self.dir = self.next_dir
+            if self.turns:
+                self.dir = self.turns.pop(0)
             head = (self.snake[0][0] + self.dir[0], self.snake[0][1] + self.dir[1])
-            if (head[0] < 0 or head[0] >= self.grid_w or head[1] < 0 or head[1] >= self.grid_h or head in self.snake):
+            if (head[0] < 0 or head[0] >= self.grid_w or head[1] < 0 or head[1] >= self.grid_h or head in self.cuerpo):
                 # Perder una vida y reiniciar posición si quedan vidas
                 if self.lives > 1:
                     self.lives -= 1
-                    start_x, start_y = self.grid_w // 2, self.grid_h // 2
-                    longitud = max(3, len(self.snake))
-                    self.snake = [(start_x - i, start_y) for i in range(min(longitud, 5))]
-                    self.dir = (1, 0)
-                    self.next_dir = self.dir
+                    self._reiniciar_serpiente()
                     return
                 else:
                     self.game_over = True
                     return
+            cambios = self.changes
+            # La cabeza anterior pasa a ser cuerpo: también cambia su dibujo
+            cambios.cells.add(self.snake[0])
+            cambios.cells.add(head)
+            cambios.move('cabeza', self.snake[0], head)
             self.snake.insert(0, head)
+            self.cuerpo.add(head)
             if head == self.fruit:
-                self.score += self.score_add
-                if self.score // self.points_per_level + 1 > self.level:
-                    self.level = self.score // self.points_per_level + 1
-                    self.speed *= self.speed_mult_level
-                # Condición de victoria por nivel objetivo
-                vict_cond = next((r[2] for r in self.data.get('regla', []) if r[0]=='victoria' and r[1]=='condicion'), None)
-                vict_nivel = get_rule_value(self.data, 'victoria', 'nivel_objetivo', None, int)
-                if vict_cond == 'nivel_objetivo' and isinstance(vict_nivel, int):
-                    if self.level >= vict_nivel:
-                        self.game_over = True
-                if self.fruit_type == 'dorada':
-                    self.score += self.score_add * 2
-                    self.fruit = self.spawn_fruit()
-                elif self.fruit_type == 'explosiva':
-                    # Quitar solo una vida; si quedan, reiniciar serpiente
-                    if self.lives > 1:
-                        self.lives -= 1
-                        start_x, start_y = self.grid_w // 2, self.grid_h // 2
-                        base_len = max(3, len(self.snake))
-                        self.snake = [(start_x - i, start_y) for i in range(min(base_len, 5))]
-                        self.dir = (1, 0)
-                        self.next_dir = self.dir
-                        self.fruit = self.spawn_fruit()
-                    else:
-                        self.game_over = True
-                elif self.fruit_type == 'ralentizar':
-                    self.speed_effect_end = self.time_total + self.ralentizar_dur
-                    self.last_speed_mult = self.ralentizar_mult
-                    self.speed *= self.last_speed_mult
-                    self.fruit = self.spawn_fruit()
-                elif self.fruit_type == 'morada':
-                    self.speed_effect_end = self.time_total + self.morada_dur
-                    self.last_speed_mult = self.morada_mult
-                    self.speed *= self.last_speed_mult
-                    self.fruit = self.spawn_fruit()
-                else:
+                self.fire('fruta_comida')
+                # Efecto del tipo de fruta (regla de la fruta); sin regla solo reaparece
+                if not self.fire(self.FRUIT_EVENTS.get(self.fruit_type)):
                     self.fruit = self.spawn_fruit()
             else:
-                self.snake.pop()
-        if self.speed_effect_end and self.time_total >= self.speed_effect_end:
-            self.speed_effect_end = 0.0
-            if self.last_speed_mult != 0:
-                self.speed /= self.last_speed_mult
-            self.last_speed_mult = 1.0
-        if self.fruit_type == 'explosiva' and (self.time_total - self.fruit_spawn_time) >= self.explosiva_dur:
+                cola = self.snake.pop()
+                self.cuerpo.discard(cola)
+                cambios.cells.add(cola)
+                cambios.move('cola', cola, self.snake[-1])
+        self.effects.advance(self.time_total)
+
+    def _reiniciar_serpiente(self):
+        # Tras perder una vida: serpiente corta en el centro mirando a la derecha
+        cambios = self.changes
+        cambios.cells.update(self.snake)
+        cambios.move('cabeza', self.snake[0], None)
+        cambios.move('cola', self.snake[-1], None)
+        start_x, start_y = self.grid_w // 2, self.grid_h // 2
+        longitud = max(3, len(self.snake))
+        self.snake = [(start_x - i, start_y) for i in range(min(longitud, 5))]
+        self.cuerpo = set(self.snake)
+        self.dir = (1, 0)
+        self.turns = []
+        cambios.cells.update(self.snake)
+        cambios.move('cabeza', None, self.snake[0])
+        cambios.move('cola', None, self.snake[-1])
+
+    # ----- Acciones de reglas (ver ACTIONS) -----
+    def _accion_crecer(self, params):
+        # La cabeza ya avanzó sin quitar la cola: aquí solo puntuación, nivel y victoria
+        self.score += self.score_add
+        if self.score // self.points_per_level + 1 > self.level:
+            self.level = self.score // self.points_per_level + 1
+            self.speed *= self.speed_mult_level
+        # Condición de victoria por nivel objetivo
+        if self.vict_cond == 'nivel_objetivo' and isinstance(self.vict_nivel, int):
+            if self.level >= self.vict_nivel:
+                self.game_over = True
+
+    def _accion_puntos_extra(self, params):
+        self.score += self.score_add * 2
+        self.fruit = self.spawn_fruit()
+
+    def _accion_reducir_longitud(self, params):
+        # Quitar solo una vida; si quedan, reiniciar serpiente
+        if self.lives > 1:
+            self.lives -= 1
+            self._reiniciar_serpiente()
             self.fruit = self.spawn_fruit()
-            self.fruit_type = 'normal'
+        else:
+            self.game_over = True
+
+    def _accion_modificar_velocidad(self, params):
+        # Cada fruta aplica y deshace su propio multiplicador: los efectos solapados se componen
+        mult = float(params['multiplicador'])
+        if mult:
+            self.speed *= mult
+            self.effects.schedule(self.time_total + int(params['duracion_efecto']), 'velocidad',
+                                  functools.partial(self._fin_velocidad, mult))
+        self.fruit = self.spawn_fruit()
+
+    def _fin_velocidad(self, mult):
+        self.speed /= mult
 
     def build_hint(self):
         return "Mover: W/A/S/D  Pausa: P  Reiniciar: R"
 
+    def _sprite_cabeza(self):
+        cell = self.cell
+        dx, dy = self.dir
+        return sprite(('cabeza', cell, dx, dy), lambda: snake_head_shapes(cell, dx, dy))
+
+    def _sprite_fruta(self):
+        tipo = self.fruit_type
+        forma = {'dorada': self.forma_dorada, 'explosiva': self.forma_explo,
+                 'ralentizar': self.forma_ralen, 'morada': self.forma_morada}.get(tipo)
+        if SNAKE_FRUIT_SHAPES.get(tipo) != forma:
+            tipo = 'normal'
+        cell = self.cell
+        return sprite(('fruta', tipo, cell), lambda: fruit_shapes(tipo, cell))
+
+    def _segmentos_visibles(self):
+        # Celdas de la serpiente dentro de la cámara, cabeza incluida. Se recorre la
+        # serpiente o la ventana, lo que tenga menos celdas: coste acotado por la ventana
+        cam = self.camera
+        if len(self.snake) <= cam.view_w * cam.view_h:
+            return [p for p in self.snake if cam.visible(*p)]
+        cuerpo = self.cuerpo
+        return [(x, y) for y in range(cam.y, cam.y + cam.view_h)
+                for x in range(cam.x, cam.x + cam.view_w) if (x, y) in cuerpo]
+
+    def _render_fondo(self, renderer):
+        renderer.draw_playfield(self.offset_x, self.offset_y, self.view_w, self.view_h, self.cell,
+                                bg=(25,25,25), border=(180,180,180))
+        renderer.draw_grid(self.offset_x, self.offset_y, self.view_w, self.view_h, self.cell, color=(50,50,50))
+
+    def _render_sprite(self, renderer, nombre, spr, x, y):
+        # Sprite suelto como sección: en el canvas solo se recrea si cambia o se mueve
+        renderer.retained((self, nombre), (spr.key, x, y), lambda r: r.draw_sprite(spr, x, y))
+
     def render(self, renderer):
         # Área de juego
-        renderer.draw_playfield(self.offset_x, self.offset_y, self.grid_w, self.grid_h, self.cell,
-                                bg=(25,25,25), border=(180,180,180))
-        renderer.draw_grid(self.offset_x, self.offset_y, self.grid_w, self.grid_h, self.cell, color=(50,50,50))
-        for i,(x,y) in enumerate(self.snake):
-            bx = self.offset_x + x*self.cell
-            by = self.offset_y + y*self.cell
-            if i == 0:
-                head_color = (120, 220, 120)
-                renderer.draw_block(bx, by, self.cell, self.cell, head_color)
-                # Ojos según dirección
-                eye_size = max(3, self.cell//6)
-                dx, dy = self.dir
-                if dx == 1:  # derecha
-                    ex = bx + self.cell - eye_size - 2
-                    ey1 = by + 3
-                    ey2 = by + self.cell - eye_size - 3
-                    renderer.draw_block(ex, ey1, eye_size, eye_size, (0,0,0))
-                    renderer.draw_block(ex, ey2, eye_size, eye_size, (0,0,0))
-                elif dx == -1:  # izquierda
-                    ex = bx + 2
-                    ey1 = by + 3
-                    ey2 = by + self.cell - eye_size - 3
-                    renderer.draw_block(ex, ey1, eye_size, eye_size, (0,0,0))
-                    renderer.draw_block(ex, ey2, eye_size, eye_size, (0,0,0))
-                elif dy == -1:  # arriba
-                    ey = by + 2
-                    ex1 = bx + 3
-                    ex2 = bx + self.cell - eye_size - 3
-                    renderer.draw_block(ex1, ey, eye_size, eye_size, (0,0,0))
-                    renderer.draw_block(ex2, ey, eye_size, eye_size, (0,0,0))
-                else:  # abajo
-                    ey = by + self.cell - eye_size - 2
-                    ex1 = bx + 3
-                    ex2 = bx + self.cell - eye_size - 3
-                    renderer.draw_block(ex1, ey, eye_size, eye_size, (0,0,0))
-                    renderer.draw_block(ex2, ey, eye_size, eye_size, (0,0,0))
+        cam = self.camera
+        cam.follow(*self.snake[0])
+        renderer.retained((self, 'fondo'), (self.offset_x, self.offset_y, self.view_w, self.view_h, self.cell),
+                          self._render_fondo)
+        # Solo las celdas dentro de la cámara generan ítems
+        cabeza = self.snake[0]
+        body_color = (0, 160, 0)
+        capa = renderer.cell_layer((self, 'celdas'), self.offset_x - cam.x*self.cell,
+                                   self.offset_y - cam.y*self.cell, self.cell)
+        if capa is not None:
+            # Capa conservada en el canvas: el cuerpo solo cambia en las celdas del ChangeSet
+            # (la cabeza va como sprite aparte)
+            cambios = self.take_changes(LECTOR_PANTALLA)
+            if capa.full or cambios.full:
+                capa.clear()
+                celdas = self._segmentos_visibles()
             else:
-                body_color = (0, 160, 0)
-                renderer.draw_block(bx, by, self.cell, self.cell, body_color)
+                celdas = [pos for pos in cambios.dirty_cells(self.grid_w) if cam.visible(*pos)]
+            for pos in celdas:
+                capa.set(pos, body_color if pos in self.cuerpo and pos != cabeza else None)
+            if cam.visible(*cabeza):
+                self._render_sprite(renderer, 'cabeza', self._sprite_cabeza(),
+                                    self.offset_x + (cabeza[0] - cam.x)*self.cell,
+                                    self.offset_y + (cabeza[1] - cam.y)*self.cell)
+        else:
+            for (x,y) in self._segmentos_visibles():
+                bx = self.offset_x + (x - cam.x)*self.cell
+                by = self.offset_y + (y - cam.y)*self.cell
+                if (x, y) == cabeza:
+                    renderer.draw_sprite(self._sprite_cabeza(), bx, by)
+                else:
+                    renderer.draw_block(bx, by, self.cell, self.cell, body_color)
         # Diseños de frutas según reglas (.brik)
-        forma_dorada = get_rule_str(self.data, 'fruta_dorada', 'forma', 'manzana')
-        forma_explo = get_rule_str(self.data, 'fruta_explosiva', 'forma', 'bomba')
-        forma_ralen = get_rule_str(self.data, 'powerup_ralentizar', 'forma', 'reloj')
-        forma_morada = get_rule_str(self.data, 'fruta_morada', 'forma', 'tenis')
-        fx = self.offset_x + self.fruit[0]*self.cell
-        fy = self.offset_y + self.fruit[1]*self.cell
-        if self.fruit_type == 'dorada' and forma_dorada == 'manzana':
-            # Manzana dorada: cuerpo con leve borde y tallo/hoja
-            body_w = self.cell - 6; body_h = self.cell - 6
-            bx = fx + 3; by = fy + 3
-            renderer.draw_circle(bx, by, body_w, body_h, color_from_name('dorado'))
-            # Tallo
-            renderer.draw_block(fx + self.cell//2 - 2, fy + 1, 4, 6, (120,80,30))
-            # Hoja
-            renderer.draw_polygon([(fx + self.cell//2 + 3, fy + 2), (fx + self.cell//2 + 8, fy + 5), (fx + self.cell//2 + 2, fy + 7)], (40,160,60))
-        elif self.fruit_type == 'explosiva' and forma_explo == 'bomba':
-            # Bomba roja: cuerpo centrado y mecha en la parte superior derecha
-            body_w = self.cell - 8; body_h = self.cell - 8
-            bx = fx + 4; by = fy + 4
-            renderer.draw_circle(bx, by, body_w, body_h, color_from_name('rojo'))
-            # Mecha mejor ubicada con ángulo
-            mx = fx + self.cell - 8; my = fy + 4
-            renderer.draw_block(mx, my, 3, 8, (180,180,180))
-            renderer.draw_polygon([(mx+3, my), (mx+8, my-2), (mx+5, my+3)], (255,200,80))
-        elif self.fruit_type == 'ralentizar' and forma_ralen == 'reloj':
-            # Reloj azul: círculo con dos manecillas
-            renderer.draw_circle(fx+3, fy+3, self.cell-6, self.cell-6, color_from_name('azul_cielo'))
-            # Manecillas (polígonos simples)
-            renderer.draw_polygon([(fx+self.cell//2, fy+6), (fx+self.cell//2+2, fy+6), (fx+self.cell//2+2, fy+self.cell//2)], (0,0,0))
-            renderer.draw_polygon([(fx+self.cell//2, fy+self.cell//2), (fx+self.cell//2+2, fy+self.cell//2), (fx+self.cell//2+9, fy+self.cell//2+2)], (0,0,0))
-        elif self.fruit_type == 'morada' and forma_morada == 'tenis':
-            # Tenis deportivo morado: suela y cuerpo del zapato
-            c = color_from_name('morado')
-            # Suela
-            renderer.draw_block(fx + 2, fy + self.cell - 6, self.cell - 4, 4, (220,220,220))
-            # Cuerpo del tenis
-            pts = [
-                (fx + 2, fy + self.cell - 6),
-                (fx + self.cell - 4, fy + self.cell - 6),
-                (fx + self.cell - 6, fy + self.cell - 12),
-                (fx + self.cell - 10, fy + self.cell - 14),
-                (fx + 6, fy + self.cell - 14),
-                (fx + 4, fy + self.cell - 10)
-            ]
-            renderer.draw_polygon(pts, c)
-            # Detalle de cordones
-            renderer.draw_block(fx + 8, fy + self.cell - 12, 2, 4, (230,230,230))
-            renderer.draw_block(fx + 11, fy + self.cell - 12, 2, 4, (230,230,230))
+        if not cam.visible(*self.fruit):
+            # Fruta fuera de la cámara: marca pequeña en el borde, en su dirección
+            mx = min(max(self.fruit[0], cam.x), cam.x + cam.view_w - 1) - cam.x
+            my = min(max(self.fruit[1], cam.y), cam.y + cam.view_h - 1) - cam.y
+            cell = self.cell
+            self._render_sprite(renderer, 'fruta', sprite(('marca', cell), lambda: [('circle', cell//3, cell//3, cell//3, cell//3, color_from_name('blanco'))]),
+                                self.offset_x + mx*cell, self.offset_y + my*cell)
         else:
-            # Normal: fruta blanca con forma de manzana simple
-            body_w = self.cell - 6; body_h = self.cell - 6
-            bx = fx + 3; by = fy + 3
-            renderer.draw_circle(bx, by, body_w, body_h, color_from_name('blanco'))
-            renderer.draw_block(fx + self.cell//2 - 2, fy + 1, 4, 6, (120,120,120))
-        # Panel lateral derecho
+            self._render_sprite(renderer, 'fruta', self._sprite_fruta(),
+                                self.offset_x + (self.fruit[0] - cam.x)*self.cell,
+                                self.offset_y + (self.fruit[1] - cam.y)*self.cell)
+        # Panel lateral derecho: rótulos fijos y marcador, cada uno se redibuja solo si cambia
+        renderer.retained((self, 'panel'), 0, lambda r: self._render_panel(r, SIN_DIBUJO))
+        renderer.retained((self, 'marcador'), (self.score, round(self.speed,2), self.level, self.lives,
+                                               self.game_over, self.paused),
+                          lambda r: self._render_panel(SIN_DIBUJO, r))
+
+    def _render_panel(self, fijo, dato):
+        # Mismo trazado para las dos secciones del panel: rótulos y guías (fijo) y lo
+        # que cambia durante la partida (dato); la otra parte va a SIN_DIBUJO
         panel_x = WINDOW_SIZE[0] - PANEL_WIDTH
-        renderer.draw_block(panel_x, 0, PANEL_WIDTH, WINDOW_SIZE[1], color=(20,20,20))
+        fijo.draw_block(panel_x, 0, PANEL_WIDTH, WINDOW_SIZE[1], color=(20,20,20))
         y = 20
-        renderer.draw_text("PUNTUACION", panel_x + 14, y, color=(0,200,0), size=12); y += 18
-        renderer.draw_text(str(self.score), panel_x + 14, y, size=12); y += 22
-        renderer.draw_text("VELOCIDAD", panel_x + 14, y, color=(180,180,180), size=12); y += 18
-        renderer.draw_text("{0}".format(round(self.speed,2)), panel_x + 14, y, size=12); y += 22
-        renderer.draw_text("NIVEL", panel_x + 14, y, color=(180,180,180), size=12); y += 18
-        renderer.draw_text(str(self.level), panel_x + 14, y, size=12); y += 22
-        renderer.draw_text("VIDAS", panel_x + 14, y, color=(180,180,180), size=12); y += 18
-        renderer.draw_text(str(self.lives), panel_x + 14, y, size=12); y += 26
+        fijo.draw_text("PUNTUACION", panel_x + 14, y, color=(0,200,0), size=12); y += 18
+        dato.draw_text(str(self.score), panel_x + 14, y, size=12); y += 22
+        fijo.draw_text("VELOCIDAD", panel_x + 14, y, color=(180,180,180), size=12); y += 18
+        dato.draw_text("{0}".format(round(self.speed,2)), panel_x + 14, y, size=12); y += 22
+        fijo.draw_text("NIVEL", panel_x + 14, y, color=(180,180,180), size=12); y += 18
+        dato.draw_text(str(self.level), panel_x + 14, y, size=12); y += 22
+        fijo.draw_text("VIDAS", panel_x + 14, y, color=(180,180,180), size=12); y += 18
+        dato.draw_text(str(self.lives), panel_x + 14, y, size=12); y += 26
         # Espaciado entre bloques
         y += 6
-        renderer.draw_text("CONTROLES", panel_x + 14, y, color=(200,200,200), size=12); y += 18
-        renderer.draw_text("P: Pausar", panel_x + 14, y, size=12); y += 16
-        renderer.draw_text("R: Reiniciar", panel_x + 14, y, size=12); y += 16
-        renderer.draw_text("W/A/S/D: Mover", panel_x + 14, y, size=12); y += 20
+        fijo.draw_text("CONTROLES", panel_x + 14, y, color=(200,200,200), size=12); y += 18
+        fijo.draw_text("P: Pausar", panel_x + 14, y, size=12); y += 16
+        fijo.draw_text("R: Reiniciar", panel_x + 14, y, size=12); y += 16
+        fijo.draw_text("W/A/S/D: Mover", panel_x + 14, y, size=12); y += 20
         # Espaciado entre bloques
         y += 8
-        renderer.draw_text("FRUTAS ESPECIALES", panel_x + 14, y, color=(200,200,200), size=12); y += 18
-        # Guía con forma y color
-        def guide_icon(icon_draw_fn, label):
-            px = panel_x + 14; py = y
-            # dibujar icono en 16x16
-            icon_draw_fn(px, py)
-            renderer.draw_text("  " + label, panel_x + 34, y-2)
-        def icon_manzana(px, py):
-            renderer.draw_circle(px+2, py+2, 12, 12, color_from_name('dorado'))
-            renderer.draw_block(px + 8, py + 0, 3, 5, (120,80,30))
-        def icon_bomba(px, py):
-            renderer.draw_circle(px+3, py+3, 10, 10, color_from_name('rojo'))
-            renderer.draw_block(px + 12, py + 2, 2, 6, (180,180,180))
-        def icon_reloj(px, py):
-            renderer.draw_circle(px+2, py+2, 12, 12, color_from_name('azul_cielo'))
-        def icon_tenis(px, py):
-            # Icono de tenis morado en miniatura
-            renderer.draw_block(px + 2, py + 12, 12, 3, (220,220,220))
-            renderer.draw_polygon([(px+3, py+12), (px+13, py+12), (px+11, py+8), (px+6, py+8), (px+4, py+10)], color_from_name('morado'))
-        guide_icon(icon_manzana, "Dorada"); y += 18
-        guide_icon(icon_bomba, "Explosiva"); y += 16
-        guide_icon(icon_reloj, "Ralentizar"); y += 16
-        guide_icon(icon_tenis, "Velocidad +"); y += 16
+        fijo.draw_text("FRUTAS ESPECIALES", panel_x + 14, y, color=(200,200,200), size=12); y += 18
+        # Guía con forma y color (iconos de 16x16)
+        for nombre, label, paso in SNAKE_GUIDE:
+            fijo.draw_sprite(sprite(('icono', nombre), lambda: SNAKE_ICONS[nombre]), panel_x + 14, y)
+            fijo.draw_text("  " + label, panel_x + 34, y-2)
+            y += paso
         if self.game_over:
-            renderer.draw_text_center("GAME OVER - Enter para reiniciar", WINDOW_SIZE[1]//2 - 10)
+            dato.draw_text_center("GAME OVER - Enter para reiniciar", WINDOW_SIZE[1]//2 - 10)
         if self.paused and not self.game_over:
-            renderer.draw_text_center("PAUSA - P/R para continuar/reiniciar", WINDOW_SIZE[1]//2 + 30)
+            dato.draw_text_center("PAUSA - P/R para continuar/reiniciar", WINDOW_SIZE[1]//2 + 30)
 
 class TetrisGame(BaseGame):
-    def __init__(self, data):
-        BaseGame.__init__(self, data)
-        gw, gh = get_dimensions(data)
-        self.grid_w, self.grid_h = gw, gh
+    DEFAULT_RULES = (
+        ('puntuacion_lineas', 'linea_completada', 'eliminar_fila', {}),
+        ('bomba_ladrillo', 'pieza_bomba', 'explotar', {}),
+        ('inversion_ladrillo', 'pieza_inversion', 'invertir_controles', {}),
+        ('ficha_congelada', 'pieza_congelada', 'congelar', {}),
+    )
+    ACTIONS = {
+        'eliminar_fila': '_accion_eliminar_fila',
+        'explotar': '_accion_explotar',
+        'invertir_controles': '_accion_invertir_controles',
+        'congelar': '_accion_congelar',
+    }
+    # Pieza especial fijada -> evento que dispara
+    PIECE_EVENTS = {
+        'bomba': 'pieza_bomba',
+        'inversion': 'pieza_inversion',
+        'congelada': 'pieza_congelada',
+    }
+
+    @classmethod
+    def resolve_config(cls, data):
+        cfg = BaseGame.resolve_config(data)
+        grid_w, grid_h = get_dimensions(data)
         available_w = max(100, WINDOW_SIZE[0] - PANEL_WIDTH - 20)
-        self.cell = max(12, min(available_w // max(self.grid_w,1), WINDOW_SIZE[1] // max(self.grid_h,1)))
-        self.neutral_color = (180,180,180)
-        self.speed_base = get_numeric_fact(data, 'juego', 'velocidad_inicial', 1.0, float)
-        self.speed = self.speed_base
-        self.score_base = next((int(r[2]) for r in data.get('regla', []) if r[0]=='puntuacion_lineas' and r[1]=='puntuacion_base'), 100)
+        cell = max(12, min(available_w // max(grid_w,1), WINDOW_SIZE[1] // max(grid_h,1)))
+        neutral_color = (180,180,180)
         mults = next((r[2] for r in data.get('regla', []) if r[0]=='puntuacion_lineas' and r[1]=='multiplicadores'), [1,3,5,8])
-        self.multiplicadores = mults if isinstance(mults, list) else [1,3,5,8]
-        self.key_cache = {
-            'izq': (self.get_key_for_action('mover_izquierda') or 'left'),
-            'der': (self.get_key_for_action('mover_derecha') or 'right'),
-            'down': (self.get_key_for_action('acelerar_abajo') or 'down'),
-            'hold': (self.get_key_for_action('evitar_caida') or 'w'),
-            'rot': (self.get_key_for_action('rotar') or 'e'),
-        }
-        self.key_pause = self.get_key_for_action('pausar') or 'p'
-        self.key_restart = self.get_key_for_action('reiniciar') or 'r'
-        self.shapes = self._load_shapes()
-        self.board = [[None]*self.grid_w for _ in range(self.grid_h)]
-        self.timer = 0.0
-        self.prob_bomba = get_rule_value(data, 'aparicion_piezas', 'probabilidad_bomba', 0.0, float) or 0.0
-        self.prob_inversion = get_rule_value(data, 'aparicion_piezas', 'probabilidad_inversion', 0.0, float) or 0.0
-        self.prob_congelada = get_rule_value(data, 'aparicion_piezas', 'probabilidad_congelada', 0.0, float) or 0.0
-        self.bomba_radio = get_rule_value(data, 'bomba_ladrillo', 'radio_destruccion', 2, int)
-        self.inversion_dur = get_rule_value(data, 'inversion_ladrillo', 'duracion_inversion', 5, int)
-        self.congelada_mult = get_rule_value(data, 'ficha_congelada', 'multiplicador_velocidad', 1.0, float)
-        self.congelada_dur = get_rule_value(data, 'ficha_congelada', 'duracion_efecto', 0, int)
-        self.congelada_active_end = 0.0
-        self.inversion_active_end = 0.0
-        self.time_total = 0.0
-        self.current = self.spawn_piece()
-        # Preparar pieza siguiente para preview en panel
-        self.next_piece = self.spawn_piece()
-        play_w = WINDOW_SIZE[0] - PANEL_WIDTH
-        self.offset_x = max(10, (play_w - self.grid_w * self.cell) // 2)
-        self.offset_y = (WINDOW_SIZE[1] - self.grid_h * self.cell) // 2
-        self.level = 1
-        self.points_per_level = get_rule_value(data, 'niveles_velocidad', 'puntos_por_nivel', 1000, int) or 1000
-        self.speed_mult_level = get_rule_value(data, 'niveles_velocidad', 'multiplicador_velocidad', 1.2, float) or 1.2
+        cfg.update(play_area(grid_w, grid_h, cell))
+        cfg.update({
+            'grid_w': grid_w,
+            'grid_h': grid_h,
+            'cell': cell,
+            'neutral_color': neutral_color,
+            'speed_base': get_numeric_fact(data, 'juego', 'velocidad_inicial', 1.0, float),
+            'score_base': next((int(r[2]) for r in data.get('regla', []) if r[0]=='puntuacion_lineas' and r[1]=='puntuacion_base'), 100),
+            'multiplicadores': mults if isinstance(mults, list) else [1,3,5,8],
+            'key_cache': {
+                'izq': (get_control_key(data, 'mover_izquierda') or 'left'),
+                'der': (get_control_key(data, 'mover_derecha') or 'right'),
+                'down': (get_control_key(data, 'acelerar_abajo') or 'down'),
+                'hold': (get_control_key(data, 'evitar_caida') or 'w'),
+                'rot': (get_control_key(data, 'rotar') or 'e'),
+                'drop': (get_control_key(data, 'caida_instantanea') or 'space'),
+            },
+            'das': get_control_number(data, 'retardo_repeticion', DAS_DEFAULT),
+            'arr': get_control_number(data, 'intervalo_repeticion', ARR_DEFAULT),
+            'key_pause': get_control_key(data, 'pausar') or 'p',
+            'key_restart': get_control_key(data, 'reiniciar') or 'r',
+            'shapes': cls._load_shapes(data, neutral_color),
+            'prob_bomba': get_rule_value(data, 'aparicion_piezas', 'probabilidad_bomba', 0.0, float) or 0.0,
+            'prob_inversion': get_rule_value(data, 'aparicion_piezas', 'probabilidad_inversion', 0.0, float) or 0.0,
+            'prob_congelada': get_rule_value(data, 'aparicion_piezas', 'probabilidad_congelada', 0.0, float) or 0.0,
+            'bomba_radio': get_rule_value(data, 'bomba_ladrillo', 'radio_destruccion', 2, int),
+            'inversion_dur': get_rule_value(data, 'inversion_ladrillo', 'duracion_inversion', 5, int),
+            'congelada_mult': get_rule_value(data, 'ficha_congelada', 'multiplicador_velocidad', 1.0, float),
+            'congelada_dur': get_rule_value(data, 'ficha_congelada', 'duracion_efecto', 0, int),
+            # Colores de especiales desde reglas para evitar fallback
+            'colores_especiales': {
+                'bomba': color_from_name(get_rule_str(data, 'bomba_ladrillo', 'color', 'rojo_especial')),
+                'inversion': color_from_name(get_rule_str(data, 'inversion_ladrillo', 'color', 'verde')),
+                'congelada': color_from_name(get_rule_str(data, 'ficha_congelada', 'color', 'celeste')),
+            },
+            'points_per_level': get_rule_value(data, 'niveles_velocidad', 'puntos_por_nivel', 1000, int) or 1000,
+            'speed_mult_level': get_rule_value(data, 'niveles_velocidad', 'multiplicador_velocidad', 1.2, float) or 1.2,
+            'fin_cond': next((r[2] for r in data.get('regla', []) if r[0]=='fin_juego' and r[1]=='condicion'), None),
+            'vict_cond': next((r[2] for r in data.get('regla', []) if r[0]=='victoria' and r[1]=='condicion'), None),
+            'vict_nivel': get_rule_value(data, 'victoria', 'nivel_objetivo', None, int),
+            # regla(aparicion_piezas, bolsa, si): piezas normales en bolsas barajadas (todas salen una vez por bolsa)
+            'piece_bag': get_rule_str(data, 'aparicion_piezas', 'bolsa', 'no') == 'si',
+        })
+        # Candidatas precalculadas (antes se reconstruían en cada spawn_piece)
+        especiales = ('bomba', 'inversion', 'congelada')
+        cfg['normal_shapes'] = tuple(p for p in cfg['shapes'] if p[0] not in especiales) or tuple(cfg['shapes'])
+        cfg['special_colors'] = dict((n, color) for (n, color, _rots) in cfg['shapes'] if n in especiales)
+        # None = pieza normal
+        cfg['piece_sampler'] = AliasSampler(especiales + (None,), chained_weights(
+            (cfg['prob_bomba'], cfg['prob_inversion'], cfg['prob_congelada'])))
+        return cfg
 
-    def _load_shapes(self):
+    @staticmethod
+    def _load_shapes(data, nc):
         shapes = []
-        nc = self.neutral_color
-        for pieza in self.data.get('pieza', []):
+        for pieza in data.get('pieza', []):
             if len(pieza) == 2:
                 nombre = pieza[0]
                 rotaciones = pieza[1]
@@ -681,55 +2251,155 @@ class TetrisGame(BaseGame):
             shapes.append((nombre, color_rgb, parsed))
         return shapes or [('dummy', nc, [[[1]]])]
 
+    def config_changed(self, clave, anterior, nuevo):
+        if clave == 'speed_base' and anterior:
+            self.speed *= nuevo / anterior
+
+    def reset(self, seed=None):
+        BaseGame.reset(self, seed)
+        self.speed = self.speed_base
+        self.repeater = KeyRepeater()
+        self.board = [[None]*self.grid_w for _ in range(self.grid_h)]
+        self.camera = Camera(self.grid_w, self.grid_h, self.view_w, self.view_h)
+        # Skyline incremental: fila más alta ocupada por columna (grid_h si vacía)
+        # y número de celdas ocupadas por fila
+        self.col_top = [self.grid_h]*self.grid_w
+        self.row_fill = [0]*self.grid_h
+        # Filas que la gravedad llenó desde la última revisión de clear_lines
+        self._dirty_rows = set()
+        # Perfil inferior por rotación, indexado por id(rots) (se guarda rots para fijar el id)
+        self._profiles = {}
+        self.timer = 0.0
+        self.time_total = 0.0
+        self._bag = []
+        # Celdas y color de la pieza activa en el último take_changes
+        self._piece_seen = None
+        self._next_seen = None
+        self.current = self.spawn_piece()
+        # Preparar pieza siguiente para preview en panel
+        self.next_piece = self.spawn_piece()
+        self.level = 1
+
     def _spawn_center_x(self, rots):
         shape = rots[0] if rots else [[1]]
         width = max(len(shape[0]), 1)
         return max(0, (self.grid_w - width) // 2)
 
     def spawn_piece(self):
-        import random
-        r = random.random()
-        limite_bomba = self.prob_bomba
-        limite_inversion = limite_bomba + self.prob_inversion
-        limite_congelada = limite_inversion + self.prob_congelada
-        if r < limite_bomba:
-            target = 'bomba'
-        elif r < limite_inversion:
-            target = 'inversion'
-        elif r < limite_congelada:
-            target = 'congelada'
-        else:
-            normales = [p for p in self.shapes if p[0] not in ('bomba', 'inversion', 'congelada')]
-            if not normales:
-                normales = self.shapes
-            nombre, _color_ignored, rots = random.choice(normales)
+        rng = self.rng
+        target = self.piece_sampler.sample(rng)
+        if target is None:
+            nombre, _color_ignored, rots = self._next_normal()
             # Piezas normales deben renderizarse en color neutro/gris
             return {'name': nombre, 'color': self.neutral_color, 'rots': rots, 'rot': 0,
                     'x': self._spawn_center_x(rots), 'y': 0}
         # Piezas especiales pueden adoptar cualquier forma de las normales
         # Determinar color de especiales desde reglas para evitar fallback
-        color_especial = None
-        if target == 'bomba':
-            cn = get_rule_str(self.data, 'bomba_ladrillo', 'color', 'rojo_especial')
-            color_especial = color_from_name(cn)
-        elif target == 'inversion':
-            cn = get_rule_str(self.data, 'inversion_ladrillo', 'color', 'verde')
-            color_especial = color_from_name(cn)
-        elif target == 'congelada':
-            cn = get_rule_str(self.data, 'ficha_congelada', 'color', 'celeste')
-            color_especial = color_from_name(cn)
-        especiales = {n: (color, rots) for (n, color, rots) in self.shapes if n in ('bomba','inversion','congelada')}
-        if target in especiales:
-            color = color_especial or especiales[target][0]
-            normales = [p for p in self.shapes if p[0] not in ('bomba', 'inversion', 'congelada')]
-            if not normales:
-                normales = self.shapes
-            _, _, rots_norm = random.choice(normales)
+        if target in self.special_colors:
+            color = self.colores_especiales.get(target) or self.special_colors[target]
+            _, _, rots_norm = rng.choice(self.normal_shapes)
             return {'name': target, 'color': color, 'rots': rots_norm, 'rot': 0,
                     'x': self._spawn_center_x(rots_norm), 'y': 0}
         return {'name': 'dummy', 'color': self.neutral_color, 'rots': [[[1]]],
                 'rot': 0, 'x': self._spawn_center_x([[[1]]]), 'y': 0}
 
+    def _next_normal(self):
+        if not self.piece_bag:
+            return self.rng.choice(self.normal_shapes)
+        if not self._bag:
+            self._bag = list(self.normal_shapes)
+            self.rng.shuffle(self._bag)
+        return self._bag.pop()
+
+    def _rebuild_skyline(self):
+        # Recalcular contadores desde cero (solo si el tablero se reemplaza externamente)
+        self.row_fill = [sum(1 for cell in row if cell is not None) for row in self.board]
+        self._dirty_rows = set(range(self.grid_h))
+        self._refresh_col_top()
+        self.changes.full = True
+
+    def piece_cells(self, piece=None):
+        p = piece or self.current
+        return frozenset((p['x'] + i, p['y'] + j)
+                         for j, fila in enumerate(p['rots'][p['rot']]) for i, val in enumerate(fila) if val)
+
+    def collect_changes(self, cambios):
+        # La pieza activa se mueve en muchos sitios (teclas, caída, IA): se compara al leer
+        actual = (self.piece_cells(), self.current['color'], self.current['name'])
+        vista = self._piece_seen
+        if vista != actual:
+            cambios.move('pieza', vista[0] if vista else None, actual[0])
+            if vista:
+                cambios.cells.update(vista[0])
+            cambios.cells.update(actual[0])
+            self._piece_seen = actual
+        if self.next_piece is not self._next_seen:
+            # Vista previa del panel
+            cambios.move('siguiente', self._next_seen, self.next_piece)
+            self._next_seen = self.next_piece
+
+    def _color_celda(self, pos):
+        # Color de una celda fija del tablero (None si está vacía), como en render()
+        val = self.board[pos[1]][pos[0]]
+        if val is None:
+            return None
+        return val[1] if isinstance(val, tuple) and len(val) == 2 else self.neutral_color
+
+    def _refresh_col_top(self, columns=None):
+        if columns is None:
+            columns = range(self.grid_w)
+        board = self.board
+        for x in columns:
+            y = 0
+            while y < self.grid_h and board[y][x] is None:
+                y += 1
+            self.col_top[x] = y
+
+    def _column_profile(self, rots, rot):
+        # Lista de (columna, fila más baja ocupada) de la forma, calculada una vez por rotación
+        entry = self._profiles.get(id(rots))
+        if entry is None:
+            perfiles = []
+            for shape in rots:
+                perfil = []
+                for i in range(max((len(r) for r in shape), default=0)):
+                    low = -1
+                    for j, row in enumerate(shape):
+                        if i < len(row) and row[i]:
+                            low = j
+                    if low >= 0:
+                        perfil.append((i, low))
+                perfiles.append(perfil)
+            entry = (rots, perfiles)
+            self._profiles[id(rots)] = entry
+        return entry[1][rot]
+
+    def landing_row(self):
+        # Fila donde se apoyaría la pieza actual: O(ancho de la pieza) usando col_top
+        cur = self.current
+        px, py = cur['x'], cur['y']
+        best = self.grid_h
+        for i, low in self._column_profile(cur['rots'], cur['rot']):
+            top = self.col_top[px + i]
+            if py + low >= top:
+                # La pieza está bajo un saliente: la superficie no sirve, bajar paso a paso
+                return self._landing_row_stepwise()
+            if top - 1 - low < best:
+                best = top - 1 - low
+        return max(py, best)
+
+    def _landing_row_stepwise(self):
+        cur = self.current
+        y = cur['y']
+        while not self.collides(cur['x'], y + 1, cur['rot']):
+            y += 1
+        return y
+
+    def hard_drop(self):
+        self.current['y'] = self.landing_row()
+        self.timer = 0.0
+        self.lock_piece()
+
     def collides(self, px, py, rot):
         shape = self.current['rots'][rot]
         for j,row in enumerate(shape):
@@ -749,44 +2419,49 @@ class TetrisGame(BaseGame):
                 x = cx + dx
                 y = cy + dy
                 if 0 <= x < self.grid_w and 0 <= y < self.grid_h:
-                    self.board[y][x] = None
-        self._settle_gravity()
+                    if self.board[y][x] is not None:
+                        self.board[y][x] = None
+                        self.row_fill[y] -= 1
+                        self.changes.cells.add((x, y))
+        # Solo las columnas dentro del radio pueden tener huecos nuevos
+        x_min = max(0, cx - self.bomba_radio)
+        x_max = min(self.grid_w - 1, cx + self.bomba_radio)
+        self._settle_gravity(range(x_min, x_max + 1))
 
     def lock_piece(self):
         shape = self.current['rots'][self.current['rot']]
         col = self.current['color']
         hit_cells = []
+        touched_rows = set()
         for j,row in enumerate(shape):
             for i,val in enumerate(row):
                 if val:
                     x = self.current['x'] + i
                     y = self.current['y'] + j
                     if 0 <= y < self.grid_h and 0 <= x < self.grid_w:
+                        if self.board[y][x] is None:
+                            self.row_fill[y] += 1
                         self.board[y][x] = (1, col)
+                        if y < self.col_top[x]:
+                            self.col_top[x] = y
                         hit_cells.append((x,y))
-        if self.current['name'] == 'bomba' and hit_cells:
-            cx, cy = hit_cells[0]
-            self._apply_bomb(cx, cy)
-        if self.current['name'] == 'inversion':
-            self.inversion_active_end = self.time_total + self.inversion_dur
-        if self.current['name'] == 'congelada':
-            self.congelada_active_end = self.time_total + self.congelada_dur
-        cleared = self.clear_lines()
+                        touched_rows.add(y)
+        self.changes.cells.update(hit_cells)
+        evento = self.PIECE_EVENTS.get(self.current['name'])
+        if evento:
+            self.fire(evento, hit_cells)
+        cleared = self.clear_lines(touched_rows)
         if self.score // self.points_per_level + 1 > self.level:
             self.level = self.score // self.points_per_level + 1
             self.speed *= self.speed_mult_level
         if cleared > 0:
             self._settle_gravity()
-        fin_cond = next((r[2] for r in self.data.get('regla', [])
-                         if r[0]=='fin_juego' and r[1]=='condicion'), None)
-        if fin_cond == 'pieza_alcanza_tope':
-            if any(cell is not None for cell in self.board[0]):
+        if self.fin_cond == 'pieza_alcanza_tope':
+            if self.row_fill[0] > 0:
                 self.game_over = True
         # Condición de victoria por nivel objetivo
-        vict_cond = next((r[2] for r in self.data.get('regla', []) if r[0]=='victoria' and r[1]=='condicion'), None)
-        vict_nivel = get_rule_value(self.data, 'victoria', 'nivel_objetivo', None, int)
-        if vict_cond == 'nivel_objetivo' and isinstance(vict_nivel, int):
-            if self.level >= vict_nivel:
+        if self.vict_cond == 'nivel_objetivo' and isinstance(self.vict_nivel, int):
+            if self.level >= self.vict_nivel:
                 self.game_over = True
         if not self.game_over:
             # Avanzar a la siguiente pieza y generar nueva siguiente
@@ -798,51 +2473,102 @@ class TetrisGame(BaseGame):
             if self.collides(self.current['x'], self.current['y'], self.current['rot']):
                 self.game_over = True
 
-    def clear_lines(self):
-        new_board = [row for row in self.board if not all(row)]
-        cleared = self.grid_h - len(new_board)
-        if cleared > 0:
-            idx = min(cleared-1, len(self.multiplicadores)-1)
-            mult = self.multiplicadores[idx]
-            self.score += self.score_base * mult
-            for _ in range(cleared):
-                new_board.insert(0, [None]*self.grid_w)
-            self.board = new_board
-        return cleared
-
-    def _settle_gravity(self):
-        moved = True
-        while moved:
-            moved = False
-            for y in range(self.grid_h-2, -1, -1):
-                for x in range(self.grid_w):
-                    if self.board[y][x] is not None and self.board[y+1][x] is None:
-                        self.board[y+1][x] = self.board[y][x]
-                        self.board[y][x] = None
-                        moved = True
+    def clear_lines(self, rows=None):
+        # rows: filas candidatas (las que tocó la pieza); None -> revisar todas.
+        # También se revisan las filas que la gravedad rellenó desde la última vez.
+        if rows is None:
+            rows = range(self.grid_h)
+        fill = self.row_fill
+        full = set(y for y in rows if fill[y] >= self.grid_w)
+        full.update(y for y in self._dirty_rows if fill[y] >= self.grid_w)
+        self._dirty_rows = set()
+        if not full or not self.fire('linea_completada', full):
+            return 0
+        return len(full)
+
+    # ----- Acciones de reglas (ver ACTIONS) -----
+    def _accion_eliminar_fila(self, params, full):
+        cleared = len(full)
+        fill = self.row_fill
+        idx = min(cleared-1, len(self.multiplicadores)-1)
+        mult = self.multiplicadores[idx]
+        self.score += self.score_base * mult
+        keep = [y for y in range(self.grid_h) if y not in full]
+        # Bajan todas las filas por encima de la última eliminada
+        self.changes.rows.update(range(max(full) + 1))
+        self.board = [[None]*self.grid_w for _ in range(cleared)] + [self.board[y] for y in keep]
+        self.row_fill = [0]*cleared + [fill[y] for y in keep]
+        self._refresh_col_top()
+
+    def _accion_explotar(self, params, hit_cells):
+        if hit_cells:
+            cx, cy = hit_cells[0]
+            self._apply_bomb(cx, cy)
+
+    # Inversión y congelación siguen activas mientras dure alguna de las piezas que las activaron
+    def _accion_invertir_controles(self, params, hit_cells):
+        if self.inversion_dur > 0:
+            self.effects.schedule(self.time_total + self.inversion_dur, 'inversion')
+
+    def _accion_congelar(self, params, hit_cells):
+        if self.congelada_dur > 0:
+            self.effects.schedule(self.time_total + self.congelada_dur, 'congelada')
+
+    def _settle_gravity(self, columns=None):
+        # Compactación en una sola pasada por columna: cada celda ocupada baja
+        # directamente a la siguiente posición libre desde el fondo.
+        # columns=None -> todas las columnas (p.ej. tras eliminar filas completas)
+        board = self.board
+        fill = self.row_fill
+        movidas = self.changes.cells
+        if columns is None:
+            columns = range(self.grid_w)
+        for x in columns:
+            write = self.grid_h - 1
+            for y in range(self.grid_h - 1, -1, -1):
+                cell = board[y][x]
+                if cell is not None:
+                    if y != write:
+                        board[write][x] = cell
+                        board[y][x] = None
+                        fill[y] -= 1
+                        fill[write] += 1
+                        self._dirty_rows.add(write)
+                        movidas.add((x, y))
+                        movidas.add((x, write))
+                    write -= 1
+            self.col_top[x] = write + 1
 
     def build_hint(self):
-        return "Mover: A/D  Caer rápido: S  Mantener: W  Rotar: E  Pausa: P  Reiniciar: R"
+        return "Mover: A/D  Caer rápido: S  Soltar: Espacio  Mantener: W  Rotar: E  Pausa: P  Reiniciar: R"
 
     def update(self, dt, input_manager):
         if self.game_over or self.paused:
             return
         k = self.key_cache
-        inverted = self.inversion_active_end and self.time_total < self.inversion_active_end
-        congelada_activa = self.congelada_active_end and self.time_total < self.congelada_active_end
+        self.effects.advance(self.time_total)
+        inverted = self.effects.active('inversion')
+        congelada_activa = self.effects.active('congelada')
         current_speed = self.speed_base * (self.congelada_mult if congelada_activa else 1.0)
-        if k['izq'] and input_manager.was_pressed(k['izq']):
-            delta = 1 if inverted else -1
-            if not self.collides(self.current['x'] + delta, self.current['y'], self.current['rot']):
-                self.current['x'] += delta
-        if k['der'] and input_manager.was_pressed(k['der']):
-            delta = -1 if inverted else 1
-            if not self.collides(self.current['x'] + delta, self.current['y'], self.current['rot']):
+        for key, delta in ((k['izq'], -1), (k['der'], 1)):
+            if not key:
+                continue
+            pasos = self.repeater.steps(key, input_manager, dt, self.das, self.arr, self.grid_w)
+            if inverted:
+                delta = -delta
+            for _ in range(pasos):
+                if self.collides(self.current['x'] + delta, self.current['y'], self.current['rot']):
+                    break
                 self.current['x'] += delta
-        if k['rot'] and input_manager.was_pressed(k['rot']):
-            nr = (self.current['rot'] + 1) % len(self.current['rots'])
-            if not self.collides(self.current['x'], self.current['y'], nr):
-                self.current['rot'] = nr
+        if k['rot']:
+            for _ in range(input_manager.press_count(k['rot'])):
+                nr = (self.current['rot'] + 1) % len(self.current['rots'])
+                if not self.collides(self.current['x'], self.current['y'], nr):
+                    self.current['rot'] = nr
+        if k['drop'] and input_manager.was_pressed(k['drop']):
+            self.hard_drop()
+            self.time_total += dt
+            return
         hold_down = self.key_cache['hold'] and input_manager.is_down(self.key_cache['hold'])
         fall_speed = max(0.05, 0.7 / max(0.001, current_speed))
         if k['down'] and input_manager.is_down(k['down']):
@@ -856,40 +2582,94 @@ class TetrisGame(BaseGame):
                 self.lock_piece()
         self.time_total += dt
 
+    def _render_fondo(self, renderer):
+        renderer.draw_playfield(self.offset_x, self.offset_y, self.view_w, self.view_h, self.cell,
+                                bg=(25,25,25), border=(180,180,180))
+        renderer.draw_grid(self.offset_x, self.offset_y, self.view_w, self.view_h, self.cell, color=(60,60,60))
+
+    def _velocidad_actual(self):
+        # velocidad actual basada en efectos
+        return self.speed_base * (self.congelada_mult if self.effects.active('congelada') else 1.0)
+
     def render(self, renderer):
         # Área de juego
-        renderer.draw_playfield(self.offset_x, self.offset_y, self.grid_w, self.grid_h, self.cell,
-                                bg=(25,25,25), border=(180,180,180))
-        renderer.draw_grid(self.offset_x, self.offset_y, self.grid_w, self.grid_h, self.cell, color=(60,60,60))
-        for y,row in enumerate(self.board):
-            for x,val in enumerate(row):
-                if val is not None:
-                    col = val[1] if isinstance(val, tuple) and len(val) == 2 else self.neutral_color
-                    renderer.draw_block(self.offset_x + x*self.cell,
-                                        self.offset_y + y*self.cell,
-                                        self.cell, self.cell, col)
+        cam = self.camera
         shape = self.current['rots'][self.current['rot']]
+        cam.follow(self.current['x'] + len(shape[0])//2, self.current['y'] + len(shape)//2)
+        renderer.retained((self, 'fondo'), (self.offset_x, self.offset_y, self.view_w, self.view_h, self.cell),
+                          self._render_fondo)
+        # Solo filas/columnas dentro de la cámara: coste acotado por la ventana, no por el tablero
+        x0 = self.offset_x - cam.x*self.cell
+        y0 = self.offset_y - cam.y*self.cell
+        capa = renderer.cell_layer((self, 'celdas'), x0, y0, self.cell)
+        cambios = self.take_changes(LECTOR_PANTALLA) if capa is not None else None
+        if capa is not None and not (capa.full or cambios.full):
+            # Capa conservada en el canvas: solo las celdas que cambiaron desde el último frame
+            for pos in cambios.dirty_cells(self.grid_w):
+                if cam.visible(*pos):
+                    capa.set(pos, self._color_celda(pos))
+        else:
+            if capa is not None:
+                capa.clear()
+            for y in range(cam.y, cam.y + cam.view_h):
+                row = self.board[y]
+                for x in range(cam.x, cam.x + cam.view_w):
+                    val = row[x]
+                    if val is not None:
+                        col = val[1] if isinstance(val, tuple) and len(val) == 2 else self.neutral_color
+                        if capa is not None:
+                            capa.set((x, y), col)
+                        else:
+                            renderer.draw_block(x0 + x*self.cell,
+                                                y0 + y*self.cell,
+                                                self.cell, self.cell, col)
+        # Pieza y fantasma: solo se recrean cuando la pieza o la cámara se mueven
+        ghost_y = None if self.game_over else self.landing_row()
+        pieza = self.current
+        renderer.retained((self, 'pieza'), (pieza['x'], pieza['y'], tuple(map(tuple, shape)), pieza.get('color'),
+                                            ghost_y, cam.x, cam.y),
+                          lambda r: self._render_pieza(r, shape, ghost_y, x0, y0))
+        # Panel lateral derecho: rótulos fijos y marcador, cada uno se redibuja solo si cambia
+        siguiente = getattr(self, 'next_piece', None)
+        renderer.retained((self, 'panel'), bool(siguiente), lambda r: self._render_panel(r, SIN_DIBUJO))
+        renderer.retained((self, 'marcador'), (self.score, round(self._velocidad_actual(),2), self.level,
+                                               tuple(map(tuple, siguiente['rots'][0])) if siguiente else None,
+                                               siguiente.get('color') if siguiente else None,
+                                               self.game_over, self.paused),
+                          lambda r: self._render_panel(SIN_DIBUJO, r))
+
+    def _render_pieza(self, renderer, shape, ghost_y, x0, y0):
+        cam = self.camera
         col = self.current.get('color') or self.neutral_color
+        # Pieza fantasma: contorno en la fila de aterrizaje
+        if ghost_y is not None and ghost_y != self.current['y']:
+            for j,r in enumerate(shape):
+                for i,val in enumerate(r):
+                    if val and cam.visible(self.current['x']+i, ghost_y+j):
+                        renderer.draw_outline(x0 + (self.current['x']+i)*self.cell,
+                                              y0 + (ghost_y+j)*self.cell,
+                                              self.cell, self.cell, col)
         for j,r in enumerate(shape):
             for i,val in enumerate(r):
-                if val:
-                    renderer.draw_block(self.offset_x + (self.current['x']+i)*self.cell,
-                                        self.offset_y + (self.current['y']+j)*self.cell,
+                if val and cam.visible(self.current['x']+i, self.current['y']+j):
+                    renderer.draw_block(x0 + (self.current['x']+i)*self.cell,
+                                        y0 + (self.current['y']+j)*self.cell,
                                         self.cell, self.cell, col)
-        # Panel lateral derecho
+
+    def _render_panel(self, fijo, dato):
+        # Mismo trazado para las dos secciones del panel: rótulos y guías (fijo) y lo
+        # que cambia durante la partida (dato); la otra parte va a SIN_DIBUJO
         panel_x = WINDOW_SIZE[0] - PANEL_WIDTH
-        renderer.draw_block(panel_x, 0, PANEL_WIDTH, WINDOW_SIZE[1], color=(20,20,20))
+        fijo.draw_block(panel_x, 0, PANEL_WIDTH, WINDOW_SIZE[1], color=(20,20,20))
         y = 20
-        renderer.draw_text("PUNTUACION", panel_x + 14, y, color=(0,200,0), size=12); y += 18
-        renderer.draw_text(str(self.score), panel_x + 14, y, size=12); y += 20
-        renderer.draw_text("VELOCIDAD", panel_x + 14, y, color=(180,180,180), size=12); y += 18
-        # velocidad actual basada en efectos
-        current_speed = self.speed_base * (self.congelada_mult if (self.congelada_active_end and self.time_total < self.congelada_active_end) else 1.0)
-        renderer.draw_text("{0}".format(round(current_speed,2)), panel_x + 14, y, size=12); y += 22
-        renderer.draw_text("NIVEL", panel_x + 14, y, color=(180,180,180), size=12); y += 18
-        renderer.draw_text(str(self.level), panel_x + 14, y, size=12); y += 26
+        fijo.draw_text("PUNTUACION", panel_x + 14, y, color=(0,200,0), size=12); y += 18
+        dato.draw_text(str(self.score), panel_x + 14, y, size=12); y += 20
+        fijo.draw_text("VELOCIDAD", panel_x + 14, y, color=(180,180,180), size=12); y += 18
+        dato.draw_text("{0}".format(round(self._velocidad_actual(),2)), panel_x + 14, y, size=12); y += 22
+        fijo.draw_text("NIVEL", panel_x + 14, y, color=(180,180,180), size=12); y += 18
+        dato.draw_text(str(self.level), panel_x + 14, y, size=12); y += 26
         # Preview de pieza siguiente
-        renderer.draw_text("SIGUIENTE", panel_x + 14, y, color=(200,200,200), size=12); y += 16
+        fijo.draw_text("SIGUIENTE", panel_x + 14, y, color=(200,200,200), size=12); y += 16
         if hasattr(self, 'next_piece') and self.next_piece:
             # Dibujar en una mini rejilla 6x6 centrada en el panel
             preview_cell = 14
@@ -897,7 +2677,7 @@ class TetrisGame(BaseGame):
             preview_h = 6
             pv_x = panel_x + (PANEL_WIDTH - preview_w*preview_cell)//2
             pv_y = y
-            renderer.draw_grid(pv_x, pv_y, preview_w, preview_h, preview_cell, color=(60,60,60))
+            fijo.draw_grid(pv_x, pv_y, preview_w, preview_h, preview_cell, color=(60,60,60))
             shape_prev = self.next_piece['rots'][0]
             col_prev = self.next_piece.get('color') or self.neutral_color
             # Calcular offset para centrar la forma dentro de la mini rejilla
@@ -908,94 +2688,408 @@ class TetrisGame(BaseGame):
             for j,row in enumerate(shape_prev):
                 for i,val in enumerate(row):
                     if val:
-                        renderer.draw_block(pv_x + (off_x+i)*preview_cell,
-                                            pv_y + (off_y+j)*preview_cell,
-                                            preview_cell, preview_cell, col_prev)
+                        dato.draw_block(pv_x + (off_x+i)*preview_cell,
+                                        pv_y + (off_y+j)*preview_cell,
+                                        preview_cell, preview_cell, col_prev)
             y = pv_y + preview_h*preview_cell + 10
         # Espaciado entre bloques
         y += 6
-        renderer.draw_text("CONTROLES", panel_x + 14, y, color=(200,200,200), size=12); y += 18
-        renderer.draw_text("P: Pausar", panel_x + 14, y, size=12); y += 16
-        renderer.draw_text("Esc: Salir", panel_x + 14, y, size=12); y += 16
-        renderer.draw_text("A/D: Mover", panel_x + 14, y, size=12); y += 16
-        renderer.draw_text("S: Caer", panel_x + 14, y, size=12); y += 16
-        renderer.draw_text("W: Mantener", panel_x + 14, y, size=12); y += 16
-        renderer.draw_text("E: Rotar", panel_x + 14, y, size=12); y += 20
+        fijo.draw_text("CONTROLES", panel_x + 14, y, color=(200,200,200), size=12); y += 18
+        fijo.draw_text("P: Pausar", panel_x + 14, y, size=12); y += 16
+        fijo.draw_text("Esc: Salir", panel_x + 14, y, size=12); y += 16
+        fijo.draw_text("A/D: Mover", panel_x + 14, y, size=12); y += 16
+        fijo.draw_text("S: Caer", panel_x + 14, y, size=12); y += 16
+        fijo.draw_text("Espacio: Soltar", panel_x + 14, y, size=12); y += 16
+        fijo.draw_text("W: Mantener", panel_x + 14, y, size=12); y += 16
+        fijo.draw_text("E: Rotar", panel_x + 14, y, size=12); y += 20
         # Espaciado entre bloques
         y += 8
-        renderer.draw_text("PIEZAS ESPECIALES", panel_x + 14, y, color=(200,200,200), size=12); y += 18
+        fijo.draw_text("PIEZAS ESPECIALES", panel_x + 14, y, color=(200,200,200), size=12); y += 18
         def _guide_t(name, color):
-            renderer.draw_block(panel_x + 14, y, 12, 12, color); renderer.draw_text("  " + name, panel_x + 30, y-2, size=12)
+            fijo.draw_block(panel_x + 14, y, 12, 12, color); fijo.draw_text("  " + name, panel_x + 30, y-2, size=12)
         _guide_t("Bomba", color_from_name('rojo_especial')); y += 16
         _guide_t("Inversion", color_from_name('verde')); y += 16
         _guide_t("Congelada", color_from_name('celeste')); y += 16
         if self.game_over:
-            renderer.draw_text_center("GAME OVER - Enter para reiniciar", WINDOW_SIZE[1]//2)
+            dato.draw_text_center("GAME OVER - Enter para reiniciar", WINDOW_SIZE[1]//2)
         if self.paused and not self.game_over:
-            renderer.draw_text_center("PAUSA - P/R para continuar/reiniciar", WINDOW_SIZE[1]//2 + 30)
+            dato.draw_text_center("PAUSA - P/R para continuar/reiniciar", WINDOW_SIZE[1]//2 + 30)
 
 class GameFactory:
     @staticmethod
-    def create(data):
+    def game_class(data):
         if 'elementos_disponibles' in data:
-            return SnakeGame(data)
+            return SnakeGame
         if 'figuras_disponibles' in data or 'pieza' in data:
-            return TetrisGame(data)
-        return SnakeGame(data)
+            return TetrisGame
+        return SnakeGame
+
+    @staticmethod
+    def build_template(data):
+        return GameFactory.game_class(data).build_template(data)
+
+    @staticmethod
+    def create(data, seed=None, template=None):
+        # Con plantilla: solo se reinicia el estado (sin volver a resolver reglas)
+        if template is None:
+            template = GameFactory.build_template(data)
+        return template.cls(template.data, seed, template)
 
 class GameEngine:
-    def __init__(self):
-        self.root = tk.Tk()
-        self.root.title(WINDOW_TITLE)
-        # Usar un Frame como contenedor para evitar discrepancias de tipos en Pylance
-        self.frame = tk.Frame(self.root)
-        self.frame.pack(fill='both', expand=True)
-        self.canvas = tk.Canvas(self.frame, width=WINDOW_SIZE[0], height=WINDOW_SIZE[1], bg=_rgb(BG_COLOR))
-        self.canvas.pack()
-        self.renderer = Renderer(self.canvas)
-        self.input = InputManager(self.root)
+    def __init__(self, seed=None, headless=False, loader_workers=LOADER_WORKERS, fast_start=False, threaded=False):
+        # headless=True -> sin ventana ni Renderer (reproducción a máxima velocidad)
+        # threaded=True -> _tick corre en un SimulationThread y dibuja en un DisplayList;
+        #   el hilo de Tk solo presenta la última FrameSnapshot (ver _present)
+        self.threaded = threaded and not headless
+        self.sim = None
+        self.frames = None
+        self.screen = None
+        self._presented = 0
+        if headless:
+            self.root = None
+            self.canvas = None
+            self.renderer = None
+        else:
+            self.root = tk.Tk()
+            self.root.title(WINDOW_TITLE)
+            # Usar un Frame como contenedor para evitar discrepancias de tipos en Pylance
+            self.frame = tk.Frame(self.root)
+            self.frame.pack(fill='both', expand=True)
+            self.canvas = tk.Canvas(self.frame, width=WINDOW_SIZE[0], height=WINDOW_SIZE[1], bg=_rgb(BG_COLOR))
+            self.canvas.pack()
+            self.renderer = BatchRenderer(self.canvas, SpriteAtlas())
+            if self.threaded:
+                self.screen = self.renderer
+                self.frames = FrameBuffer()
+                self.renderer = DisplayList(self.frames)
+            STARTUP.mark('ventana_tk')
+        self.input = InputManager(self.root, threaded=self.threaded)
+        # Semilla de sesión: de ella salen las semillas de cada partida (reinicios incluidos)
+        self.seed = seed if seed is not None else random.randrange(2**31)
+        self.rng = random.Random(self.seed)
+        self.recorder = None
+        self.replaying = False
         self.is_running = False
         self.mode = 'menu'
-        try:
-            self.games_meta = self.load_game_list()
-        except Exception:
-            self.games_meta = []
+        self.catalog = GameCatalog()
+        self.loader = BackgroundLoader(self.catalog, loader_workers)
+        # El menú se llena a medida que llegan las cabeceras desde el hilo de carga
+        self.games_meta = []
+        self.catalog_ready = False
+        self.loading = set()
+        self.load_errors = {}
+        # mtime de cada archivo al pedir su carga (para no reintentar errores)
+        self.load_mtimes = {}
+        self.pending_start = None
+        # Reproducción: mensajes del cargador se aplican en el mismo frame que en la grabación
+        self._replay_order = None
+        self._replay_gated = False
+        self._replay_marks = set()
+        self._deferred = []
+        self.loader.scan_folder()
+        # Perfil de arranque: menú completo = lista + todas las cabeceras
+        self.fast_start = fast_start
+        self.startup_report = None
+        self._headers_pending = None
+        # Recarga en caliente del .brik de la partida actual
+        self.current_path = None
+        # {ruta: mtime} del .brik y de sus incluidos (GameCatalog.watched)
+        self._watched_mtime = {}
+        self._reload_t0 = None
         self.menu_index = 0
         self.current_game = None
+        self.bot = None
+        self.attract = False
+        self.idle_time = 0.0
+        self.last_restart_ms = 0.0
+        self.frame_count = 0
+        self.profiler = None
+        # Modo versus: varias partidas a la vez, cada una con su Viewport
+        self.versus_boards = VERSUS_BOARDS
+        self.start_boards = 1
+        self.instances = []
+        self._idle_input = InputManager()
+        # Servidor de espectadores (opcional, ver espectador.py)
+        self.spectators = None
+        # Estadísticas persistentes (StatsStore) y la partida que se está midiendo
+        self.stats = None
+        self.session = None
         self._last_time = time.time()
 
-    def load_game_list(self):
-        files = list_brik_files()
-        listado = []
-        for f in files:
-            try:
-                data = BrikLoader.load(f)
-            except Exception:
-                continue
-            nombre = None
-            for j in data.get('juego', []):
-                if j[0] == 'nombre':
-                    nombre = j[1]
-            if not nombre:
-                nombre = os.path.basename(f)
-            # Quitar comillas simples si vienen del .brik
-            if isinstance(nombre, (str, unicode)) and len(nombre) >= 2:
-                if nombre[0] == '\'' and nombre[-1] == '\'':
-                    nombre = nombre[1:-1]
-            listado.append({'path': f, 'name': nombre, 'data': data})
-        return listado
-
     def start(self):
         self.is_running = True
-        self.root.after(int(1000.0/FPS), self._tick)
-        self.root.mainloop()
+        STARTUP.mark('mainloop')
+        # El primer frame se pide cuanto antes para medir/mostrar el menú sin esperar un periodo
+        if self.threaded:
+            self.sim = SimulationThread(self._tick).start()
+            self.root.after(0, self._present)
+        else:
+            self.root.after(0 if STARTUP.open else int(1000.0/FPS), self._tick)
+        try:
+            self.root.mainloop()
+        finally:
+            if self.sim:
+                self.sim.stop()
+                print("Simulación: {0} ticks, {1} descartados por atraso".format(self.sim.ticks, self.sim.skipped))
+            self.stop_profiler()
+            self.stop_recording()
+            self.loader.close()
+            if self.spectators:
+                self.spectators.close()
+            if self.stats:
+                self._end_session()
+                self.stats.close()
+
+    # ----- Perfil de arranque -----
+    def _startup_step(self):
+        if self.renderer and not STARTUP.has('primer_frame'):
+            STARTUP.mark('primer_frame')
+        if self._headers_pending == 0 and not STARTUP.has('menu_completo'):
+            STARTUP.mark('menu_completo')
+        if STARTUP.has('menu_completo') and (not self.games_meta or self.load_errors or
+                                             STARTUP.has('primer_juego_listo')):
+            self.finish_startup_profile()
+
+    def finish_startup_profile(self):
+        informe = STARTUP.report('rapido' if self.fast_start else 'normal')
+        STARTUP.open = False
+        if not self.startup_report:
+            return
+        with io.open(self.startup_report, 'w', encoding='utf-8') as f:
+            f.write(unicode(json.dumps(informe, indent=2, ensure_ascii=False)))
+        print("Arranque ({0}): {1:.1f} ms -> {2}".format(informe['modo'], informe['total_ms'], self.startup_report))
+        for fase in informe['fases']:
+            print("  {0:<22} {1:8.1f} ms".format(fase['fase'], fase['ms']))
+        for tarea in informe['tareas']:
+            print("  [hilo] {0:<30} {1:8.1f} ms".format(tarea['tarea'], tarea['ms']))
+
+    # ----- Carga en segundo plano -----
+    def _entry_index(self, path):
+        for i, g in enumerate(self.games_meta):
+            if g['path'] == path:
+                return i
+        return -1
+
+    def _loader_mark(self, msg):
+        if msg[0] == 'lista' or msg[1] is None:
+            return msg[0]
+        return '{0}:{1}'.format(msg[0], self._entry_index(msg[1]))
+
+    def _poll_loader(self):
+        mensajes = self._deferred + self.loader.poll()
+        self._deferred = []
+        for msg in mensajes:
+            marca = self._loader_mark(msg)
+            if self._replay_gated:
+                if marca not in self._replay_marks:
+                    self._deferred.append(msg)
+                    continue
+                self._replay_marks.discard(marca)
+            if self.recorder:
+                self.recorder.event('!', marca)
+            self._apply_loader_message(msg)
+
+    def _apply_loader_message(self, msg):
+        kind = msg[0]
+        if kind == 'lista':
+            files = msg[1]
+            if self._replay_order is not None:
+                por_nombre = dict((os.path.basename(f), f) for f in files)
+                faltan = [n for n in self._replay_order if n not in por_nombre]
+                if faltan:
+                    print("Advertencia: faltan juegos de la grabación: {0}".format(', '.join(faltan)))
+                files = [por_nombre[n] for n in self._replay_order if n in por_nombre] + \
+                        [f for f in files if os.path.basename(f) not in self._replay_order]
+            self.games_meta = [{'path': f, 'name': os.path.basename(f), 'dims': None} for f in files]
+            self.catalog_ready = True
+            self._headers_pending = len(files)
+            for f in files:
+                self.loader.scan_header(f)
+            return
+        path = msg[1]
+        if kind == 'cabecera':
+            i = self._entry_index(path)
+            if i >= 0:
+                self.games_meta[i].update(msg[2])
+            self._headers_pending -= 1
+        elif kind == 'listo':
+            if not STARTUP.has('primer_juego_listo'):
+                STARTUP.mark('primer_juego_listo')
+            self.loading.discard(path)
+            self.load_errors.pop(path, None)
+            if self.pending_start == path:
+                self.pending_start = None
+                if self.mode == 'menu':
+                    self._start_with(msg[2], path)
+        elif kind == 'recarga':
+            self._apply_reload(path, msg[2])
+        elif kind == 'error':
+            self.loading.discard(path)
+            self.load_errors[path] = msg[2]
+            if self.pending_start == path:
+                self.pending_start = None
+            if path == self.current_path and self._reload_t0 is not None:
+                self._reload_t0 = None
+                print("Recarga de {0} fallida: {1}".format(os.path.basename(path), msg[2]))
+
+    def _check_reload(self):
+        # Un stat por archivo vigilado y frame (el .brik y sus incluir(...)); el parseo va
+        # al hilo de carga y solo hay una recarga en curso
+        if self.current_path is None or self._reload_t0 is not None:
+            return
+        actuales = dict((ruta, _mtime(ruta)) for ruta in self._watched_mtime)
+        if actuales.get(self.current_path) is None:
+            # Archivo principal borrado o a medio guardar: se espera a que vuelva
+            return
+        if actuales != self._watched_mtime:
+            self._watched_mtime = actuales
+            self._reload_t0 = time.perf_counter()
+            self.loader.reload(self.current_path)
+
+    def _apply_reload(self, path, template):
+        t0, self._reload_t0 = self._reload_t0, None
+        cg = self.current_game
+        if cg is None or path != self.current_path:
+            return
+        # La recarga puede haber añadido o quitado incluir(...): se vigila lo que se leyó
+        guardado = max(m for m in self._watched_mtime.values() if m is not None)
+        self._watched_mtime = self.catalog.watched(path)
+        nombre = os.path.basename(path)
+        if not template.data:
+            # BrikLoader devuelve {} ante errores de sintaxis (p.ej. guardado a medias)
+            print("Recarga de {0} ignorada: no se pudo analizar el archivo".format(nombre))
+            return
+        if template.cls is not type(cg):
+            print("Recarga de {0}: cambió el tipo de juego, reinicia para aplicarlo".format(nombre))
+            return
+        aplicados, omitidos = cg.apply_template(template)
+        desde_guardado = 1000.0 * max(0.0, time.time() - guardado)
+        print("Recarga de {0}: {1} valores en {2:.1f} ms ({3:.0f} ms desde el guardado){4}{5}".format(
+            nombre, len(aplicados),
+            1000.0 * (time.perf_counter() - t0) if t0 is not None else 0.0, desde_guardado,
+            ': ' + ', '.join(aplicados) if aplicados else '',
+            '; requieren reiniciar: ' + ', '.join(omitidos) if omitidos else ''))
+
+    def request_load(self, path, retry=False):
+        # Un archivo con error no se vuelve a pedir en cada frame del menú: solo
+        # si cambió en disco o si el jugador lo elige (retry=True)
+        if path in self.loading or self.catalog.peek_template(path) is not None:
+            return
+        mtime = _mtime(path)
+        if path in self.load_errors and not retry and self.load_mtimes.get(path) == mtime:
+            return
+        self.loading.add(path)
+        self.load_mtimes[path] = mtime
+        self.load_errors.pop(path, None)
+        self.loader.load(path)
+
+    def game_state(self, game):
+        path = game['path']
+        if path in self.loading:
+            return 'cargando'
+        if path in self.load_errors:
+            return 'error'
+        if self.catalog.peek_template(path) is not None:
+            return 'listo'
+        return ''
+
+    def start_recording(self, path):
+        games = [os.path.basename(f) for f in list_brik_files()]
+        self.recorder = InputRecorder(path, self.seed, games)
+        self.input.recorder = self.recorder
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close()
+            print("Grabación: {0} frames -> {1}".format(self.recorder.frames, self.recorder.path))
+        self.recorder = None
+        self.input.recorder = None
+
+    def replay(self, path, render=True):
+        # Reproduce una grabación a máxima velocidad a través de InputManager y _tick
+        header, frames = load_recording(path)
+        self.seed = header['seed']
+        self.rng = random.Random(self.seed)
+        # Cargador en línea: los resultados se aplican donde la grabación los marcó ('!')
+        self.loader.close()
+        self.catalog = GameCatalog()
+        self.loader = BackgroundLoader(self.catalog, 0)
+        self.games_meta = []
+        self.catalog_ready = False
+        self.loading = set()
+        self.load_errors = {}
+        self.load_mtimes = {}
+        self.pending_start = None
+        self._deferred = []
+        self._replay_marks = set()
+        self._replay_order = header.get('games') or []
+        self._replay_gated = header.get('version', 1) >= 2
+        self.loader.scan_folder()
+        renderer = self.renderer
+        if not render:
+            self.renderer = None
+        self.mode = 'menu'
+        self.menu_index = 0
+        self.current_game = None
+        self.idle_time = 0.0
+        self.attract = False
+        self.set_bot(False)
+        self.is_running = True
+        self.replaying = True
+        t0 = time.perf_counter()
+        try:
+            for dt, events in frames:
+                for ev in events:
+                    if ev[0] == '+':
+                        self.input.press(ev[1:])
+                    elif ev[0] == '-':
+                        self.input.release(ev[1:])
+                    else:
+                        self._replay_marks.add(ev[1:])
+                self._tick(dt)
+                if self.renderer and self.root is not None:
+                    self.root.update()
+                if not self.is_running:
+                    break
+        finally:
+            self.replaying = False
+            self._replay_gated = False
+            self._replay_order = None
+            self.renderer = renderer
+        elapsed = time.perf_counter() - t0
+        cg = self.current_game
+        return {
+            'frames': len(frames),
+            'segundos': elapsed,
+            'fps': len(frames) / max(elapsed, 1e-9),
+            'juego': type(cg).__name__ if cg else None,
+            'score': cg.score if cg else None,
+            'game_over': cg.game_over if cg else None,
+        }
 
-    def _tick(self):
+    def _tick(self, dt=None):
         if not self.is_running:
             return
-        now = time.time()
-        dt = max(0.0, now - self._last_time)
-        self._last_time = now
+        if dt is None:
+            now = time.time()
+            dt = max(0.0, now - self._last_time)
+            self._last_time = now
+        t_tick = time.perf_counter()
+        self.input.begin_frame()
+        self._poll_loader()
+        if self.mode == 'menu':
+            self.idle_time = 0.0 if self.input.keys_pressed else self.idle_time + dt
+            if self.idle_time >= ATTRACT_IDLE_SECONDS:
+                self.idle_time = 0.0
+                self.start_attract()
+        if self.mode == 'juego' and self.attract:
+            # Modo demo: cualquier tecla vuelve al menú; al terminar se reinicia solo
+            if self.input.keys_pressed:
+                self.stop_attract()
+                # Consumir la tecla para que no actúe también en el menú
+                self.input.end_frame()
+            elif self.current_game and self.current_game.game_over:
+                self.restart_current_game()
         if self.mode == 'menu':
             if self.input.was_pressed('down') or self.input.was_pressed('s'):
                 if self.games_meta:
@@ -1005,6 +3099,12 @@ class GameEngine:
                     self.menu_index = (self.menu_index - 1) % len(self.games_meta)
             if self.input.was_pressed('return') or self.input.was_pressed('space'):
                 self.start_game()
+            elif self.input.was_pressed(VERSUS_KEY):
+                self.start_game(self.versus_boards)
+            # Precargar el juego resaltado para poder empezar sin esperas
+            # (en arranque rápido, solo cuando el menú ya está completo)
+            if self.games_meta and self.mode == 'menu' and not (self.fast_start and self._headers_pending):
+                self.request_load(self.games_meta[self.menu_index]['path'])
         elif self.mode == 'juego':
             cg = self.current_game
             if cg:
@@ -1013,50 +3113,306 @@ class GameEngine:
                         cg.paused = not cg.paused
                 if cg.key_restart and self.input.was_pressed(cg.key_restart):
                     self.restart_current_game()
+                if self.input.was_pressed(BOT_KEY):
+                    self.set_bot(self.bot is None)
+                if self.input.was_pressed(PROFILE_KEY):
+                    self.toggle_profiler()
                 if self.input.was_pressed('escape'):
+                    self.set_bot(False)
                     self.mode = 'menu'
                     self.current_game = None
                 if cg and cg.game_over and self.input.was_pressed('return'):
                     # Reiniciar el juego con Enter en Game Over
                     self.restart_current_game()
+                if self.current_game and not self.replaying:
+                    self._check_reload()
+                if self.profiler and self.mode == 'juego':
+                    self.profiler.begin()
                 if self.current_game and not self.current_game.paused:
+                    if self.bot:
+                        self.bot.update(dt)
                     self.current_game.update(dt, self.input)
-        self.renderer.clear()
-        if self.mode == 'menu':
-            self.render_menu()
-        elif self.mode == 'juego' and self.current_game:
-            self.current_game.render(self.renderer)
+        elif self.mode == 'versus':
+            self._tick_versus(dt)
+        if self.profiler and self.mode != 'juego':
+            self.stop_profiler()
+        if self.renderer:
+            self.renderer.clear()
+            if self.mode == 'menu':
+                self.render_menu()
+            elif self.mode == 'versus':
+                for i, inst in enumerate(self.instances):
+                    inst.game.render(inst.viewport)
+                    inst.viewport.draw_text("IA" if i else "JUGADOR", 8, 8, (255, 200, 80), 16)
+            elif self.mode == 'juego' and self.current_game:
+                self.current_game.render(self.renderer)
+                if self.attract:
+                    self.renderer.draw_text("DEMO - pulsa una tecla", 8, 8, (255, 200, 80))
+                elif self.bot:
+                    self.renderer.draw_text("IA ({0}) {1:.1f} ms".format(BOT_KEY.upper(), self.bot.last_search_ms), 8, 8, (255, 200, 80))
+                if self.profiler:
+                    self.renderer.draw_text("PERFIL ({0}) {1} frames".format(PROFILE_KEY.upper(), len(self.profiler.frame_ms)),
+                                            8, WINDOW_SIZE[1] - 20, (255, 120, 120))
+            self.renderer.flush()
+        if self.profiler and self.profiler.active:
+            self.profiler.end(dt)
+        if self.stats:
+            self._track_session(dt, 1000.0 * (time.perf_counter() - t_tick))
+        if self.spectators:
+            if self.mode == 'versus':
+                self.spectators.publish(self.instances[0].game, self.frame_count)
+            else:
+                self.spectators.publish(self.current_game if self.mode == 'juego' else None, self.frame_count)
+        self.frame_count += 1
+        if STARTUP.open:
+            self._startup_step()
+        # La línea del frame incluye las teclas previas y las marcas del cargador de este tick
+        if self.recorder:
+            self.recorder.frame(dt)
         # Limpiar eventos discretos al final del frame
         self.input.end_frame()
-        self.root.after(int(1000.0/FPS), self._tick)
+        if self.root is not None and not self.replaying and not self.threaded:
+            self.root.after(int(1000.0/FPS), self._tick)
+
+    def _present(self):
+        # Hilo de Tk en modo threaded: dibuja la instantánea más reciente si hay una nueva;
+        # las intermedias que no dio tiempo a presentar se descartan
+        if not self.is_running or not self.sim.alive():
+            self.root.quit()
+            return
+        n, snapshot = self.frames.latest()
+        if snapshot is not None and n != self._presented:
+            self._presented = n
+            self.screen.present(snapshot)
+        self.root.after(int(1000.0/FPS), self._present)
 
     def render_menu(self):
         self.renderer.draw_text_center("SELECCIONA UN JUEGO", 50)
+        if not self.catalog_ready:
+            self.renderer.draw_text("Buscando juegos...", 50, 100, (150, 150, 150))
+        estados = {'cargando': (230, 200, 80), 'listo': (80, 200, 80), 'error': (220, 60, 60)}
         for i, game in enumerate(self.games_meta):
             nombre = game['name']
             y = 100 + i * 30
             color = TEXT_COLOR if i == self.menu_index else (150, 150, 150)
             self.renderer.draw_text(nombre, 50, y, color)
+            if game.get('dims'):
+                self.renderer.draw_text("{0}x{1}".format(*game['dims']), 320, y, (120, 120, 120))
+            estado = self.game_state(game)
+            if estado:
+                self.renderer.draw_text(estado, 420, y, estados[estado])
+        if self.pending_start:
+            self.renderer.draw_text("Cargando {0}...".format(os.path.basename(self.pending_start)), 50, 320, (230, 200, 80))
         self.renderer.draw_text("Usa flechas o W/S y Enter", 50, 350, (200, 200, 200))
+        self.renderer.draw_text("{0}: versus Tetris ({1} tableros, jugador contra IA)".format(
+            VERSUS_KEY.upper(), self.versus_boards), 50, 375, (200, 200, 200))
+        if self.stats and self.games_meta:
+            nombre = self.session_name(self.games_meta[self.menu_index]['path'])
+            records = self.stats.leaderboard(nombre)
+            if records is not None:
+                self.renderer.draw_text("RECORDS", 50, 405, (0, 200, 0), 12)
+                if not records:
+                    self.renderer.draw_text("(sin partidas)", 140, 405, (150, 150, 150), 12)
+                for i, (score, level, duracion, _fecha) in enumerate(records[:MENU_RECORDS]):
+                    self.renderer.draw_text("{0}. {1}  nivel {2}  {3:.0f} s".format(i + 1, score, level, duracion),
+                                            140, 405 + i * 20, (200, 200, 200), 12)
 
-    def start_game(self):
+    def start_game(self, boards=1):
         if not self.games_meta:
             return
-        game_data = self.games_meta[self.menu_index]
-        data = game_data['data']
-        self.current_game = GameFactory.create(data)
+        self.start_boards = boards
+        path = self.games_meta[self.menu_index]['path']
+        template = self.catalog.peek_template(path)
+        if path in self.loading or template is None:
+            # Arranca cuando el hilo de carga entregue la plantilla (_apply_loader_message)
+            self.pending_start = path
+            self.request_load(path, retry=True)
+            return
+        self._start_with(template, path)
+
+    def _start_with(self, template, path):
+        # Versus solo con IA para los demás tableros (TetrisBot); sin ella, partida normal
+        if self.start_boards > 1 and template.cls is TetrisGame and load_ia_tetris():
+            self.start_versus(template, self.start_boards)
+            return
+        self.current_game = self.new_game(template)
         if self.current_game:
             self.mode = 'juego'
+            self.watch(path)
         else:
             self.mode = 'menu'
 
+    def watch(self, path):
+        self.current_path = path
+        self._watched_mtime = self.catalog.watched(path)
+        self._reload_t0 = None
+
     def restart_current_game(self):
         if not self.current_game:
             return
-        data_ref = self.current_game.data
-        self.current_game = GameFactory.create(data_ref)
+        t0 = time.perf_counter()
+        template = self.current_game.template
+        had_bot = self.bot is not None
+        self.set_bot(False)
+        self.current_game = self.new_game(template)
+        self.set_bot(had_bot)
+        self.last_restart_ms = 1000.0 * (time.perf_counter() - t0)
+
+    # ----- Estadísticas -----
+    def session_name(self, path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def _track_session(self, dt, ms):
+        # Solo partidas jugadas (ni demo ni reproducción); el disco lo toca el hilo de StatsStore
+        cg = self.current_game if self.mode == 'juego' and not self.attract and not self.replaying else None
+        if self.session is not None and self.session.game is not cg:
+            self._end_session()
+        if self.session is None:
+            if cg is None or cg.game_over or self.current_path is None:
+                return
+            self.session = estadisticas.SessionStats(self.session_name(self.current_path), cg)
+        if not cg.paused:
+            self.session.frame(dt, ms, 1000.0/FPS)
+        if self.bot:
+            self.session.ia = True
+        if cg.game_over:
+            self._end_session()
+
+    def _end_session(self):
+        s, self.session = self.session, None
+        if s is not None and s.frames:
+            self.stats.record(s.fila())
+
+    def new_game(self, template):
+        # Cada partida recibe una semilla derivada de la sesión (reproducible)
+        return GameFactory.create(template.data, self.rng.randrange(2**31), template)
+
+    def toggle_profiler(self):
+        if self.profiler:
+            self.stop_profiler()
+            return
+        nombre = os.path.splitext(os.path.basename(self.current_path))[0] if self.current_path \
+            else type(self.current_game).__name__
+        self.profiler = FrameProfiler(nombre, self.frame_count)
+        print("Perfilando {0} desde el frame {1} ({2} para parar)".format(nombre, self.frame_count, PROFILE_KEY.upper()))
+
+    def stop_profiler(self):
+        prof, self.profiler = self.profiler, None
+        if prof is None or not prof.frame_ms:
+            return
+        ruta, resumen = prof.save(PROFILE_DIR, self.frame_count)
+        ur = resumen['update_render']
+        print("Perfil -> {0}: {1} frames, media {2:.2f} ms, p95 {3:.2f} ms, max {4:.2f} ms".format(
+            ruta, ur['frames'], ur['media_ms'], ur['p95_ms'], ur['max_ms']))
+
+    def set_bot(self, active):
+        if self.bot:
+            self.bot.close()
+            self.bot = None
+        if active and isinstance(self.current_game, TetrisGame) and load_ia_tetris():
+            self.bot = ia_tetris.TetrisBot(self.current_game, workers=BOT_WORKERS,
+                                           piezas_por_segundo=BOT_PIECES_PER_SECOND)
+
+    def start_attract(self):
+        # Solo con plantillas ya cargadas; si falta alguna se pide en segundo plano
+        for game_data in self.games_meta:
+            template = self.catalog.peek_template(game_data['path'])
+            if template is None:
+                self.request_load(game_data['path'])
+            elif template.cls is TetrisGame:
+                self.current_game = self.new_game(template)
+                self.watch(game_data['path'])
+                self.mode = 'juego'
+                self.attract = True
+                self.set_bot(True)
+                return
+
+    def stop_attract(self):
+        self.attract = False
+        self.set_bot(False)
+        self.mode = 'menu'
+        self.current_game = None
+
+    # ----- Modo versus -----
+    def start_versus(self, template, boards):
+        # Misma semilla para todos: mismas piezas/frutas, comparación justa jugador vs IA
+        self.stop_versus()
+        seed = self.rng.randrange(2**31)
+        views = split_viewports(self.renderer, boards) if self.renderer else [None] * boards
+        for i in range(boards):
+            game = GameFactory.create(template.data, seed, template)
+            bot = None
+            if i > 0 and isinstance(game, TetrisGame) and load_ia_tetris():
+                bot = ia_tetris.TetrisBot(game, workers=BOT_WORKERS, piezas_por_segundo=BOT_PIECES_PER_SECOND)
+            self.instances.append(GameInstance(game, views[i], bot))
+        self.mode = 'versus'
+
+    def stop_versus(self):
+        for inst in self.instances:
+            if inst.bot:
+                inst.bot.close()
+        self.instances = []
+        if self.mode == 'versus':
+            self.mode = 'menu'
+
+    def _tick_versus(self, dt):
+        jugador = self.instances[0].game
+        if self.input.was_pressed('escape'):
+            self.stop_versus()
+            return
+        terminado = all(inst.game.game_over for inst in self.instances)
+        if (jugador.key_restart and self.input.was_pressed(jugador.key_restart)) or \
+                (terminado and self.input.was_pressed('return')):
+            self.start_versus(jugador.template, len(self.instances))
+            return
+        if jugador.key_pause and self.input.was_pressed(jugador.key_pause):
+            pausa = not jugador.paused
+            for inst in self.instances:
+                inst.game.paused = pausa and not inst.game.game_over
+        for inst in self.instances:
+            if inst.game.paused:
+                continue
+            if inst.bot:
+                inst.bot.update(dt)
+            # Solo el primer tablero es del jugador: los demás nunca leen sus teclas
+            inst.game.update(dt, self.input if inst is self.instances[0] else self._idle_input)
 
 # ---------- Entrada punto de ejecución ----------
 if __name__ == "__main__":
-    engine = GameEngine()
-    engine.start()
+    import argparse
+    ap = argparse.ArgumentParser(description=WINDOW_TITLE)
+    ap.add_argument('--semilla', type=int, default=None, help='semilla de la sesión')
+    ap.add_argument('--grabar', metavar='ARCHIVO', help='grabar semilla, teclas y dt por frame')
+    ap.add_argument('--reproducir', metavar='ARCHIVO', help='reproducir una grabación a máxima velocidad')
+    ap.add_argument('--sin-render', action='store_true', help='reproducir sin ventana ni dibujo')
+    ap.add_argument('--perfil-arranque', metavar='ARCHIVO', nargs='?', const='perfil_arranque.json',
+                    help='medir el arranque y escribir un informe JSON')
+    ap.add_argument('--tableros', type=int, default=VERSUS_BOARDS,
+                    help='tableros del modo versus ({0} en el menú)'.format(VERSUS_KEY.upper()))
+    ap.add_argument('--arranque-rapido', action='store_true',
+                    help='diferir todo lo que no necesita el primer frame del menú')
+    ap.add_argument('--sin-estadisticas', action='store_true',
+                    help='no guardar partidas ni mostrar récords ({0})'.format(STATS_DB))
+    ap.add_argument('--hilo-simulacion', action='store_true',
+                    help='lógica a paso fijo en un hilo aparte; Tk solo dibuja la última instantánea')
+    ap.add_argument('--espectadores', metavar='PUERTO', type=int, nargs='?', const=SPECTATOR_PORT,
+                    help='transmitir la partida a clientes de espectador.py')
+    args = ap.parse_args()
+    if args.reproducir:
+        engine = GameEngine(headless=args.sin_render)
+        res = engine.replay(args.reproducir, render=not args.sin_render)
+        engine.loader.close()
+        print("Reproducción: {frames} frames en {segundos:.3f} s ({fps:.0f} fps) juego={juego} "
+              "score={score} game_over={game_over}".format(**res))
+    else:
+        engine = GameEngine(seed=args.semilla, fast_start=args.arranque_rapido, threaded=args.hilo_simulacion)
+        engine.startup_report = args.perfil_arranque
+        engine.versus_boards = max(1, args.tableros)
+        if args.grabar:
+            engine.start_recording(args.grabar)
+        if estadisticas is not None and not args.sin_estadisticas:
+            engine.stats = estadisticas.StatsStore(STATS_DB, top_n=MENU_RECORDS)
+        if args.espectadores is not None:
+            import espectador
+            engine.spectators = espectador.SpectatorServer(port=args.espectadores).start()
+        engine.start()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# Regresiones de latencia y memoria del bucle de juego, sin ventana.
+# Cada juego corre un número fijo de frames con semilla y entrada guionizada;
+# se mide por frame el tiempo de update y de render (percentiles) y, en una
+# segunda pasada con tracemalloc, la memoria de cada fase: bloques netos que
+# quedan vivos al terminarla (asignados menos liberados, no el total de
+# asignaciones) y pico de bytes temporales.
+# Uso:
+#   (Dentro de la carpeta Entrega1_Proyecto_Practico)
+#       python regresion.py                    -> compara con regresion_base.json (sale con 1 si empeora)
+#       python regresion.py --guardar          -> mide y guarda la base
+#       python regresion.py --umbral 0.5       -> tolerancia relativa (por defecto 0.25 = +25 %)
+# Los tiempos dependen de la máquina: la base se guarda y compara en la misma.
+import sys
+import os
+import io
+import json
+import time
+import random
+import tracemalloc
+
+REG_DIR = os.path.dirname(os.path.abspath(__file__))
+if REG_DIR not in sys.path:
+    sys.path.insert(0, REG_DIR)
+
+import motor
+from benchmark import _CanvasNulo
+
+BASE_PATH = os.path.join(REG_DIR, 'regresion_base.json')
+FRAMES = 600
+SEMILLA = 7
+UMBRAL = 0.25
+# Margen absoluto para no fallar por ruido en valores muy pequeños
+HOLGURA = {'ms': 0.05, 'bloques': 2.0, 'bytes': 256.0}
+# Frames con snapshot de tracemalloc (caro) para ver qué líneas retienen bloques
+MUESTRAS_SNAPSHOT = 20
+# tracemalloc.reset_peak es de Python 3.9: sin él no se mide el pico por fase
+_reset_peak = getattr(tracemalloc, 'reset_peak', None)
+# El máximo es una sola muestra: se informa pero no se compara
+SIN_COMPARAR = ('max_ms',)
+
+# ---------- Entrada guionizada ----------
+def _entrada_snake(game, im, frame):
+    # Hacia la fruta, soltando las teclas en frames alternos
+    if frame % 2:
+        for tecla in list(im.keys_down):
+            im.release(tecla)
+        return
+    k = game.key_cache
+    hx, hy = game.snake[0]
+    fx, fy = game.fruit
+    im.press(k['der'] if fx > hx else k['izq'] if fx < hx else k['aba'] if fy > hy else k['arr'])
+
+def _entrada_tetris(rng):
+    def entrada(game, im, frame):
+        for tecla in list(im.keys_down):
+            im.release(tecla)
+        k = game.key_cache
+        r = rng.random()
+        if r < 0.15:
+            im.press(k['izq'])
+        elif r < 0.30:
+            im.press(k['der'])
+        elif r < 0.40 and k['rot']:
+            im.press(k['rot'])
+        elif r < 0.43 and k['drop']:
+            im.press(k['drop'])
+    return entrada
+
+def _preparar(brik):
+    data = dict(motor.BrikLoader.load(os.path.join(REG_DIR, brik)))
+    # Sin victoria para que la partida no termine antes de tiempo
+    data['regla'] = [r for r in data.get('regla', []) if r[0] != 'victoria']
+    return data
+
+ESCENARIOS = (
+    ('snake', 'Snake.brik', lambda: _entrada_snake),
+    ('tetris', 'Tetris.brik', lambda: _entrada_tetris(random.Random(SEMILLA))),
+)
+
+def _frames(data, entrada, frames, medir):
+    # Recorre los frames llamando medir(fase, fn) para 'update' y 'render'
+    game = motor.GameFactory.create(data, SEMILLA)
+    im = motor.InputManager()
+    renderer = motor.BatchRenderer(_CanvasNulo())
+    dt = 1.0 / motor.FPS
+    for frame in range(frames):
+        im.begin_frame()
+        entrada(game, im, frame)
+        if game.game_over:
+            game.reset(SEMILLA + frame)
+        medir(frame, 'update', lambda: game.update(dt, im))
+        def dibujar():
+            renderer.clear()
+            game.render(renderer)
+            return renderer
+        medir(frame, 'render', dibujar)
+        renderer.flush()
+        im.end_frame()
+
+def _percentiles(valores):
+    v = sorted(valores)
+    def p(q):
+        return v[min(len(v) - 1, int(q * len(v)))]
+    return {'p50_ms': p(0.50), 'p95_ms': p(0.95), 'p99_ms': p(0.99), 'max_ms': v[-1]}
+
+def medir_escenario(brik, entrada, frames=FRAMES):
+    data = _preparar(brik)
+    # Pasada 1: tiempos (sin tracemalloc, que ralentiza todo)
+    tiempos = {'update': [], 'render': []}
+    def cronometrar(_frame, fase, fn):
+        t0 = time.perf_counter()
+        fn()
+        tiempos[fase].append(1000.0 * (time.perf_counter() - t0))
+    _frames(data, entrada(), frames, cronometrar)
+    # Pasada 2: memoria. Diferencia neta de bloques vivos que deja cada fase (lo de
+    # render sigue en el BatchRenderer hasta flush): lo que una fase asigna y libera
+    # dentro de ella no cuenta aquí, solo en el pico de bytes temporales
+    memoria = {'update': {'bloques': [], 'pico': []}, 'render': {'bloques': [], 'pico': []}}
+    muestras = set(range(0, frames, max(1, frames // MUESTRAS_SNAPSHOT)))
+    lineas = {}
+    def asignaciones(frame, fase, fn):
+        # Los snapshots van fuera de la zona medida para no contar su propia memoria
+        antes = tracemalloc.take_snapshot() if frame in muestras else None
+        bloques0 = sys.getallocatedblocks()
+        actual0 = tracemalloc.get_traced_memory()[0]
+        if _reset_peak is not None:
+            _reset_peak()
+        fn()
+        _actual, pico = tracemalloc.get_traced_memory()
+        memoria[fase]['bloques'].append(sys.getallocatedblocks() - bloques0)
+        if _reset_peak is not None:
+            memoria[fase]['pico'].append(pico - actual0)
+        if antes is not None:
+            despues = tracemalloc.take_snapshot()
+            for st in despues.compare_to(antes, 'lineno'):
+                if st.count_diff > 0:
+                    clave = (fase, str(st.traceback[0]))
+                    lineas[clave] = lineas.get(clave, 0) + st.count_diff
+    filtro = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    tracemalloc.start()
+    try:
+        inicio = tracemalloc.get_traced_memory()[0]
+        _frames(data, entrada(), frames, lambda f, fase, fn: asignaciones(f, fase, fn))
+        retenido = tracemalloc.get_traced_memory()[0] - inicio
+    finally:
+        tracemalloc.stop()
+    resultado = {}
+    for fase in ('update', 'render'):
+        fila = _percentiles(tiempos[fase])
+        fila['bloques_netos_por_frame'] = float(sum(memoria[fase]['bloques'])) / frames
+        if memoria[fase]['pico']:
+            fila['pico_bytes_por_frame'] = float(sum(memoria[fase]['pico'])) / frames
+        resultado[fase] = fila
+    resultado['retenido_bytes'] = retenido
+    n = float(len(muestras))
+    top = sorted(((c / n, f, l) for (f, l), c in lineas.items()
+                  if not any(flt.filename_pattern in l for flt in filtro)), reverse=True)[:5]
+    resultado['principales'] = [{'fase': f, 'linea': l, 'bloques_netos_por_frame': round(c, 1)} for c, f, l in top]
+    return resultado
+
+def medir_todo(frames=FRAMES):
+    return dict((nombre, medir_escenario(brik, entrada, frames)) for nombre, brik, entrada in ESCENARIOS)
+
+def _holgura(metrica):
+    if metrica.endswith('_ms'):
+        return HOLGURA['ms']
+    if 'bloques' in metrica:
+        return HOLGURA['bloques']
+    return HOLGURA['bytes']
+
+def comparar(base, actual, umbral=UMBRAL):
+    # Lista de (escenario, fase, métrica, base, actual) que superan base*(1+umbral)+holgura
+    regresiones = []
+    for nombre, fases in actual.items():
+        for fase in ('update', 'render'):
+            previo = base.get(nombre, {}).get(fase, {})
+            for metrica, valor in sorted(fases[fase].items()):
+                ref = previo.get(metrica)
+                if metrica in SIN_COMPARAR:
+                    continue
+                if ref is not None and valor > ref * (1.0 + umbral) + _holgura(metrica):
+                    regresiones.append((nombre, fase, metrica, ref, valor))
+    return regresiones
+
+def imprimir(resultados, base=None):
+    for nombre, fases in sorted(resultados.items()):
+        print('== {0} ({1} frames) =='.format(nombre, FRAMES))
+        for fase in ('update', 'render'):
+            f = fases[fase]
+            pico = f.get('pico_bytes_por_frame')
+            print("  {0:<7} p50 {1:6.3f}  p95 {2:6.3f}  p99 {3:6.3f}  max {4:7.3f} ms   "
+                  "{5:+7.1f} bloques netos/frame  pico {6:>8} B/frame".format(
+                      fase, f['p50_ms'], f['p95_ms'], f['p99_ms'], f['max_ms'],
+                      f['bloques_netos_por_frame'], 'n/d' if pico is None else '{0:.0f}'.format(pico)))
+        print("  retenido al final: {0} B".format(fases['retenido_bytes']))
+        for p in fases['principales']:
+            print("    {0:<7} {1:+6.1f} bloques netos/frame  {2}".format(p['fase'], p['bloques_netos_por_frame'], p['linea']))
+
+def main():
+    args = sys.argv[1:]
+    umbral = UMBRAL
+    if '--umbral' in args:
+        umbral = float(args[args.index('--umbral') + 1])
+    resultados = medir_todo()
+    imprimir(resultados)
+    if '--guardar' in args:
+        with io.open(BASE_PATH, 'w', encoding='utf-8') as f:
+            f.write(motor.unicode(json.dumps(resultados, indent=2, sort_keys=True)))
+        print("Base guardada en {0}".format(BASE_PATH))
+        return 0
+    if not os.path.exists(BASE_PATH):
+        print("Sin base ({0}): ejecuta con --guardar".format(BASE_PATH))
+        return 0
+    with io.open(BASE_PATH, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    regresiones = comparar(base, resultados, umbral)
+    for nombre, fase, metrica, ref, valor in regresiones:
+        print("REGRESION {0}.{1}.{2}: {3:.3f} -> {4:.3f} (+{5:.0f} %)".format(
+            nombre, fase, metrica, ref, valor, 100.0 * (valor / ref - 1.0) if ref else float('inf')))
+    if regresiones:
+        return 1
+    print("Sin regresiones (umbral +{0:.0f} %)".format(100.0 * umbral))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())